@@ -1,12 +1,33 @@
 import cv2
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from PIL import Image, ImageTk
 import threading
 import time
 import traceback # Do śledzenia błędów
 import os # Do operacji na plikach i katalogach
 import json # Dodano do obsługi JSON
+import numpy as np
+
+import detection_core
+import detectors
+import batch_engine
+import frame_pipeline
+import async_writer
+import tracking
+import motion
+import pipeline_metrics
+import multi_camera
+import hot_folder
+import detection_store
+import crop_archive
+import latency_tuner
+import regions
+import tiled_detection
+
+# Maks. czas, przez jaki quit_app czeka na zapis bieżącego wyniku przetwarzania wsadowego
+BATCH_THREAD_JOIN_TIMEOUT_SECONDS = 30.0
+
 
 class CameraApp:
     def __init__(self, window, window_title):
@@ -20,6 +41,12 @@ class CameraApp:
         self.target_plate_width = 720
         self.face_save_padding = 50
         self.plate_save_padding = 1
+        self.face_crop_format = "png" # Format wycinków twarzy: png, jpg lub webp
+        self.face_crop_quality = 90 # Jakość JPEG/WebP wycinków twarzy (0-100)
+        self.face_crop_png_compression = 1 # Poziom kompresji PNG wycinków twarzy (0-9, wyższy = wolniej, mniejszy plik)
+        self.plate_crop_format = "png" # Format wycinków tablic: png, jpg lub webp
+        self.plate_crop_quality = 90 # Jakość JPEG/WebP wycinków tablic (0-100)
+        self.plate_crop_png_compression = 1 # Poziom kompresji PNG wycinków tablic (0-9)
         self.image_save_interval_seconds = 1.0
         self.min_face_size = (100, 100)
         self.min_plate_size = (50, 20)
@@ -30,6 +57,9 @@ class CameraApp:
         self.face_confidence_threshold = 5.0
         self.plate_confidence_threshold = 1.0
         self.roi_size_percentage = 0.9
+        self.face_detection_regions = "" # Strefy twarzy per kamera, np. "*:+0.1,0.1,0.9,0.9; 2:-0,0,0.2,0.3" (puste = centralne ROI)
+        self.plate_detection_regions = "" # Strefy tablic per kamera, np. "*:+0,0.55,1,1" (puste = cała klatka)
+        self.enabled_detectors = "face,plate" # Detektory z rejestru (detectors.DETECTORS) uruchamiane na każdej klatce, np. "face,plate,eye"
         self.font_face_val = "FONT_HERSHEY_SIMPLEX"
         self.font_scale_info = 0.6
         self.font_scale_confidence = 0.5
@@ -41,14 +71,81 @@ class CameraApp:
         self.rect_roi_color_default = (0, 255, 0)
         self.rect_roi_color_face_detected = (255, 0, 0)
         self.rect_roi_thickness = 2
+        self.rect_exclusion_color = (128, 128, 128)
         self.rect_face_color = (0, 0, 255)
         self.rect_face_thickness = 2
         self.rect_plate_color = (0, 255, 255)
         self.rect_plate_thickness = 2
         self.max_camera_check_index = 3
+        self.batch_worker_processes = 0 # 0 = liczba rdzeni CPU
+        self.frame_drop_policy = "latest" # "latest" lub "skip_if_busy"
+        self.max_frame_age_seconds = 0.0 # 0 = bez limitu wieku klatki
+        self.writer_threads = 2 # Wątki zapisu wycinków w tle
+        self.writer_queue_size = 32 # Maks. liczba oczekujących zapisów (nadmiar jest odrzucany)
+        self.writer_submit_timeout_seconds = 0.05 # Ile detekcja czeka na miejsce w pełnej kolejce zapisu, zanim odrzuci wycinek (0 = od razu)
+        self.shared_pyramid_enabled = False # Współdzielone pomniejszone poziomy szarości dla kaskad (zmienia siatkę skal)
+        self.face_detection_width = 0 # Szerokość obrazu dla kaskady twarzy (0 = pełna rozdzielczość)
+        self.plate_detection_width = 0 # Szerokość obrazu dla kaskady tablic (0 = pełna rozdzielczość)
+        self.tiled_detection_enabled = False # Równoległa detekcja na zachodzących kafelkach dużych klatek
+        self.tiled_detection_min_width = 1920 # Kafelki tylko dla obszarów co najmniej tak szerokich (px)
+        self.tiled_detection_object_factor = 2.0 # Zakładka kafelków = tyle x min. rozmiar obiektu (większe: jeden przebieg zgrubny)
+        self.tiled_detection_threads = 0 # Wątki kafelków (0 = liczba rdzeni CPU)
+        self.tracking_enabled = False # Pełne kaskady tylko co N klatek, pomiędzy nimi śledzenie ramek
+        self.tracking_keyframe_interval = 5 # Co ile klatek uruchamiać pełną detekcję
+        self.tracking_keyframe_max_seconds = 0.5 # Maks. czas między pełnymi detekcjami (0 = bez limitu)
+        self.tracking_min_points_ratio = 0.5 # Min. odsetek punktów, które muszą przetrwać śledzenie
+        self.motion_gate_enabled = False # Pomijaj kaskady, gdy scena się nie zmienia
+        self.motion_changed_fraction_threshold = 0.01 # Min. odsetek zmienionych pikseli uruchamiający detekcję
+        self.motion_pixel_threshold = 25 # Min. różnica jasności piksela uznawana za zmianę
+        self.motion_max_idle_seconds = 10.0 # Wymuś detekcję co tyle sekund nawet bez ruchu (0 = nigdy)
+        self.motion_proposals_enabled = False # Kaskady tylko wokół plam ruchu i poprzednich detekcji
+        self.motion_proposal_padding = 0.25 # Poszerzenie prostokąta propozycji (x większy bok plamy)
+        self.motion_proposal_full_scan_seconds = 5.0 # Pełny skan klatki co tyle sekund (0 = tylko gdy brak referencji)
+        self.latency_tuner_enabled = False # Dostrajaj parametry kaskad do budżetu czasu (podgląd na żywo)
+        self.latency_tuner_target_ms = 50.0 # Budżet czasu kaskad na klatkę (ms)
+        self.latency_tuner_target_fps = 0.0 # Docelowy FPS detekcji (> 0 zastępuje budżet w ms)
+        self.latency_tuner_steps = 4 # Liczba poziomów między wartościami z konfiguracji a granicami
+        self.latency_tuner_max_scale_factor = 1.3 # Granica: największy krok skali kaskad
+        self.latency_tuner_min_neighbors_floor = 3 # Granica: najmniejsze minNeighbors
+        self.latency_tuner_max_min_size_factor = 2.0 # Granica: mnożnik minimalnego rozmiaru obiektu
+        self.latency_tuner_min_roi_percentage = 0.6 # Granica: najmniejsze ROI twarzy
+        self.latency_tuner_release_ratio = 0.6 # Powrót o poziom, gdy mediana kaskad < tyle x budżet
+        self.latency_tuner_hold_seconds = 3.0 # Min. czas na poziomie przed kolejną zmianą
+        self.latency_tuner_log_path = "latency_tuner_log.jsonl" # Dziennik zmian wprowadzonych przez regulator
+        self.dedup_enabled = False # Pomijaj powtórzone pliki i prawie identyczne wycinki w trybie wsadowym
+        self.dedup_cache_path = "dedup_cache.json" # Plik pamięci deduplikacji
+        self.dedup_max_entries = 100000 # Maks. liczba zapamiętanych skrótów (LRU)
+        self.dedup_crop_hamming_distance = 4 # Maks. odległość Hamminga dHash uznawana za duplikat wycinka
+        self.video_frame_step = 1 # Analizuj co N-tą klatkę pliku wideo (1 = każdą)
+        self.video_segment_seconds = 60.0 # Długość odcinka filmu przetwarzanego przez jeden proces (0 = cały plik)
+        self.batch_resume_enabled = True # Pomijaj pliki przetworzone już z tymi samymi parametrami (wznawianie)
+        self.batch_manifest_path = "batch_manifest.json" # Plik manifestu przetworzonych plików
+        self.hot_folder_paths = "" # Obserwowane katalogi oddzielone ';' (puste = 'images')
+        self.hot_folder_poll_seconds = 1.0 # Co ile sekund skanować obserwowane katalogi
+        self.hot_folder_settle_seconds = 1.0 # Plik jest gotowy, gdy nie zmienia się przez tyle sekund
+        self.hot_folder_queue_size = 64 # Maks. liczba plików czekających na detekcję
+        self.hot_folder_workers = 1 # Procesy detekcji obserwowanych katalogów (obok podglądu na żywo)
+        self.detection_metadata_format = "sqlite" # Metadane detekcji: "sqlite" (baza), "json" (plik na detekcję) lub "both"
+        self.detection_store_path = "detections.db" # Plik bazy detekcji (SQLite)
+        self.crop_output = "files" # Zapis wycinków: "files" (plik na wycinek) lub "archive" (rotowane archiwa tar z indeksem)
+        self.crop_archive_dir = "crop_archive" # Katalog archiwów wycinków
+        self.crop_archive_shard_mb = 256.0 # Nowe archiwum po przekroczeniu tylu MB (0 = bez limitu)
+        self.crop_archive_shard_seconds = 3600.0 # Nowe archiwum co tyle sekund (0 = bez limitu)
+        self.multi_camera_enabled = False # Uruchom od razu wszystkie kamery jednocześnie
+        self.multi_camera_indices = "" # Kamery trybu wielokamerowego, np. "0,2" (puste = wszystkie wykryte)
+        self.multi_camera_detection_workers = 2 # Wątki detekcji wspólne dla wszystkich kamer (0 = po jednym na kamerę)
+        self.multi_camera_preview = -1 # Podgląd: -1 = kafelki wszystkich kamer, inaczej indeks kamery
+        self.camera_save_intervals = "" # Interwały zapisu per kamera, np. "0:1.0,2:5.0" (reszta: image_save_interval_seconds)
+        self.metrics_enabled = True # Pomiary czasów etapów pętli na żywo (koszt pomijalny)
+        self.metrics_overlay_enabled = False # Pokazuj p50/p95/p99 etapów na podglądzie
+        self.metrics_window_size = 512 # Liczba ostatnich próbek, z których liczone są percentyle
+        self.display_fps = 30.0 # Maks. częstotliwość odświeżania podglądu (niezależna od FPS detekcji)
         
         self.is_batch_processing = False
+        self.batch_thread = None # Wątek przetwarzania folderu lub pliku wideo (quit_app czeka na jego zapisy)
+        self.is_closing = False
         self.camera_index_to_resume = -1 
+        self.detector_params = {} # Parametry detektorów z rejestru bez własnych atrybutów (np. eye_*), nadpisane w config.json
 
         # Wczytaj parametry z pliku, jeśli istnieje
         self._load_parameters_from_file() # WAŻNE: przed dynamicznym self.font_face
@@ -65,13 +162,47 @@ class CameraApp:
         self.camera_name_info = "N/A"
         self.camera_index_used = -1 
 
-        self.last_face_save_time = 0
-        self.last_plate_save_time = 0
+        self.last_save_times = {} # {detektor: czas ostatniego zapisu na żywo}
+        self.detected_types = set() # Detektory, które znalazły obiekty w bieżącej klatce
+        self.dropped_frames_count = 0
+
+        self.detection_tracker = tracking.DetectionTracker(min_tracked_ratio=self.tracking_min_points_ratio)
+        self.frames_since_keyframe = 0
+        self.last_keyframe_time = 0
+        self.tracking_early_redetections = 0
+        self.motion_gate = motion.MotionGate()
+        self.motion_proposer = motion.MotionRegionProposer()
+        self.last_live_detections = {}
+        self.detector_costs = detectors.DetectorCostReport() # Koszt każdego detektora na żywo (nakładka i podsumowanie)
+        self.latency_tuners = {} # Regulatory budżetu czasu per kamera (indeks kamery -> LatencyTuner)
+        self.region_drawing = None # Stan rysowania strefy myszą na podglądzie
+        self.tile_runner = None # Pula wątków detekcji na kafelkach (tworzona przy pierwszym użyciu)
+        self.tile_runner_lock = threading.Lock()
+
+        self.pipeline_metrics = pipeline_metrics.PipelineMetrics(self.metrics_window_size, self.metrics_enabled)
+        self.multi_camera_pipeline = None
+        self.resume_multi_camera = False
+        self.hot_folder_ingest = None
+        self.metrics_overlay_lines = []
+        # Podgląd: wątek detekcji zostawia tu najnowszą klatkę z nakładkami, a wątek Tk pobiera ją
+        # we własnym tempie (display_fps). Klatki, których Tk nie zdążył pokazać, są nadpisywane.
+        # Bufory: surowa klatka z kamery (tylko do odczytu, źródło wycinków) i osobny bufor podglądu z nakładkami.
+        # Oba wracają do pul po użyciu, a wycinki są kopiowane dopiero przy zapisie.
+        self.capture_buffers = frame_pipeline.FrameBufferPool()
+        self.display_buffers = frame_pipeline.FrameBufferPool()
+        self.display_slot = frame_pipeline.LatestFrameSlot("latest", on_drop=lambda item: self.display_buffers.release(item[0]))
 
-        os.makedirs("faces", exist_ok=True)
-        os.makedirs("plates", exist_ok=True)
         os.makedirs("images", exist_ok=True) 
-        print("Utworzono/sprawdzono katalogi 'faces', 'plates' i 'images'.")
+        print("Utworzono/sprawdzono katalog 'images'.")
+
+        # Zapis PNG/JSON odbywa się w tle, aby pętla detekcji nie czekała na dysk
+        # Metadane detekcji trafiają do indeksowanej bazy SQLite (zapis wsadowy w tle) zamiast do osobnych plików JSON
+        # Przy crop_output = "archive" wycinki są dopisywane do archiwów zamiast tworzyć plik na każdy wycinek
+        self.detection_store = detection_store.open_detection_store(self._get_configurable_params_dict())
+        self.crop_output_writer = crop_archive.open_crop_output(self._get_configurable_params_dict())
+        self.detection_writer = async_writer.DetectionWriter(self.writer_threads, self.writer_queue_size,
+                                                             self.detection_store, self.detection_metadata_format,
+                                                             self.crop_output_writer, self.writer_submit_timeout_seconds)
 
         self.menubar = tk.Menu(self.window)
         self.camera_menu = tk.Menu(self.menubar, tearoff=0)
@@ -87,9 +218,29 @@ class CameraApp:
         
         if not self.available_cameras:
             self.camera_menu.add_command(label="Brak wykrytych kamer", state="disabled")
+        else:
+            self.camera_menu.add_command(label="Wszystkie kamery naraz", command=self.start_multi_camera)
+            self.preview_menu = tk.Menu(self.camera_menu, tearoff=0)
+            self.preview_menu.add_command(label="Kafelki", command=lambda: self._select_multi_camera_preview(-1))
+            for i in self.available_cameras:
+                self.preview_menu.add_command(label=f"Kamera {i}", command=lambda idx=i: self._select_multi_camera_preview(idx))
+            self.camera_menu.add_cascade(label="Podgląd wielu kamer", menu=self.preview_menu)
         
         self.camera_menu.add_separator()
         self.camera_menu.add_command(label="Przetwórz folder 'images'", command=self.start_batch_processing)
+        self.camera_menu.add_command(label="Przetwórz plik wideo...", command=self.start_video_processing)
+        self.hot_folder_var = tk.BooleanVar(value=False)
+        self.camera_menu.add_checkbutton(label="Obserwuj folder 'images' na bieżąco", variable=self.hot_folder_var,
+                                         command=self.toggle_hot_folder_ingest)
+        self.regions_menu = tk.Menu(self.camera_menu, tearoff=0)
+        for detection_type in detectors.DETECTORS:
+            self.regions_menu.add_command(label=f"Dodaj obszar ({detection_type})",
+                                          command=lambda t=detection_type: self._begin_region_drawing(t, False))
+            self.regions_menu.add_command(label=f"Dodaj strefę wykluczoną ({detection_type})",
+                                          command=lambda t=detection_type: self._begin_region_drawing(t, True))
+        self.regions_menu.add_separator()
+        self.regions_menu.add_command(label="Usuń strefy bieżącej kamery", command=self._clear_camera_regions)
+        self.camera_menu.add_cascade(label="Strefy detekcji", menu=self.regions_menu)
         self.camera_menu.add_separator()
         self.camera_menu.add_command(label="Edytuj Parametry", command=self._open_settings_dialog) 
         self.camera_menu.add_command(label="Zapisz Parametry do Pliku", command=self._save_parameters_to_file) 
@@ -97,25 +248,8 @@ class CameraApp:
         self.menubar.add_cascade(label="Opcje", menu=self.camera_menu) 
         self.window.config(menu=self.menubar)
 
-        self.face_cascade = None
-        face_cascade_path = 'haarcascade_frontalface_default.xml'
-        if os.path.exists(face_cascade_path):
-            self.face_cascade = cv2.CascadeClassifier(face_cascade_path)
-            if self.face_cascade.empty():
-                messagebox.showerror("Błąd modelu", f"Nie można załadować kaskady dla twarzy: {face_cascade_path}")
-                self.face_cascade = None
-        else:
-            messagebox.showwarning("Brak modelu", f"Nie znaleziono pliku dla detekcji twarzy: {face_cascade_path}\nUmieść go w katalogu ze skryptem.")
-
-        self.plate_cascade = None
-        plate_cascade_path = 'haarcascade_russian_plate_number.xml'
-        if os.path.exists(plate_cascade_path):
-            self.plate_cascade = cv2.CascadeClassifier(plate_cascade_path)
-            if self.plate_cascade.empty():
-                messagebox.showerror("Błąd modelu", f"Nie można załadować kaskady dla tablic rej.: {plate_cascade_path}")
-                self.plate_cascade = None
-        else:
-            messagebox.showwarning("Brak modelu", f"Nie znaleziono pliku dla detekcji tablic rej.: {plate_cascade_path}\nUmieść go w katalogu ze skryptem.")
+        self.cascades = {}
+        self._load_cascades()
 
         initial_cam_idx_to_try = self.available_cameras[0] if self.available_cameras else 0 
         
@@ -151,9 +285,12 @@ class CameraApp:
             self._update_camera_info_string()
 
         self._setup_ui_elements() 
+        self.window.after(0, self._display_tick)
 
         self.running = True 
-        if self.vid and self.vid.isOpened(): 
+        if self.multi_camera_enabled:
+            self.window.after(0, self.start_multi_camera)
+        elif self.vid and self.vid.isOpened(): 
             self.capture_thread = threading.Thread(target=self.video_capture_loop, daemon=True)
             self.capture_thread.start()
         else:
@@ -176,8 +313,12 @@ class CameraApp:
                     "min_face_size": tuple, "min_plate_size": tuple,
                     "font_color_info": tuple, "confidence_text_color": tuple,
                     "rect_roi_color_default": tuple, "rect_roi_color_face_detected": tuple,
-                    "rect_face_color": tuple, "rect_plate_color": tuple
+                    "rect_face_color": tuple, "rect_plate_color": tuple, "rect_exclusion_color": tuple
                 }
+                registry_params = detectors.with_detector_defaults({}) # Parametry pozostałych detektorów z rejestru
+                # ...i ich strefy (np. eye_detection_regions) - używane tylko w podglądzie na żywo
+                registry_params.update({f"{name}_detection_regions": "" for name in detectors.DETECTORS
+                                        if not hasattr(self, f"{name}_detection_regions")})
 
                 for key, value in loaded_params.items():
                     if hasattr(self, key):
@@ -196,6 +337,15 @@ class CameraApp:
                                 print(f"  Wczytano '{key}': {getattr(self, key)}")
                         except (ValueError, TypeError) as e_type:
                             print(f"  Ostrzeżenie: Niepoprawny typ/wartość dla parametru '{key}' w config.json: {value}. Używanie wartości domyślnej. Błąd: {e_type}")
+                    elif key in registry_params:
+                        default_value = registry_params[key]
+                        try:
+                            if key.endswith("_detection_regions"):
+                                regions.parse_region_spec(value)
+                            self.detector_params[key] = tuple(value) if isinstance(default_value, tuple) else type(default_value)(value)
+                            print(f"  Wczytano '{key}': {self.detector_params[key]}")
+                        except (ValueError, TypeError) as e_type:
+                            print(f"  Ostrzeżenie: Niepoprawny typ/wartość dla parametru '{key}' w config.json: {value}. Używanie wartości domyślnej. Błąd: {e_type}")
                     else:
                         print(f"  Ostrzeżenie: Nieznany parametr '{key}' w config.json. Pomijanie.")
                 print("Wczytywanie parametrów zakończone.")
@@ -215,6 +365,12 @@ class CameraApp:
             "target_plate_width": self.target_plate_width,
             "face_save_padding": self.face_save_padding,
             "plate_save_padding": self.plate_save_padding,
+            "face_crop_format": self.face_crop_format,
+            "face_crop_quality": self.face_crop_quality,
+            "face_crop_png_compression": self.face_crop_png_compression,
+            "plate_crop_format": self.plate_crop_format,
+            "plate_crop_quality": self.plate_crop_quality,
+            "plate_crop_png_compression": self.plate_crop_png_compression,
             "image_save_interval_seconds": self.image_save_interval_seconds,
             "min_face_size": list(self.min_face_size), 
             "min_plate_size": list(self.min_plate_size), 
@@ -225,6 +381,9 @@ class CameraApp:
             "face_confidence_threshold": self.face_confidence_threshold,
             "plate_confidence_threshold": self.plate_confidence_threshold,
             "roi_size_percentage": self.roi_size_percentage,
+            "face_detection_regions": self.face_detection_regions,
+            "plate_detection_regions": self.plate_detection_regions,
+            "enabled_detectors": self.enabled_detectors,
             "font_face_val": self.font_face_val, 
             "font_scale_info": self.font_scale_info,
             "font_scale_confidence": self.font_scale_confidence,
@@ -240,9 +399,104 @@ class CameraApp:
             "rect_face_thickness": self.rect_face_thickness,
             "rect_plate_color": list(self.rect_plate_color),
             "rect_plate_thickness": self.rect_plate_thickness,
-            "max_camera_check_index": self.max_camera_check_index
+            "rect_exclusion_color": list(self.rect_exclusion_color),
+            "max_camera_check_index": self.max_camera_check_index,
+            "batch_worker_processes": self.batch_worker_processes,
+            "frame_drop_policy": self.frame_drop_policy,
+            "max_frame_age_seconds": self.max_frame_age_seconds,
+            "writer_threads": self.writer_threads,
+            "writer_queue_size": self.writer_queue_size,
+            "writer_submit_timeout_seconds": self.writer_submit_timeout_seconds,
+            "shared_pyramid_enabled": self.shared_pyramid_enabled,
+            "face_detection_width": self.face_detection_width,
+            "plate_detection_width": self.plate_detection_width,
+            "tiled_detection_enabled": self.tiled_detection_enabled,
+            "tiled_detection_min_width": self.tiled_detection_min_width,
+            "tiled_detection_object_factor": self.tiled_detection_object_factor,
+            "tiled_detection_threads": self.tiled_detection_threads,
+            "tracking_enabled": self.tracking_enabled,
+            "tracking_keyframe_interval": self.tracking_keyframe_interval,
+            "tracking_keyframe_max_seconds": self.tracking_keyframe_max_seconds,
+            "tracking_min_points_ratio": self.tracking_min_points_ratio,
+            "motion_gate_enabled": self.motion_gate_enabled,
+            "motion_changed_fraction_threshold": self.motion_changed_fraction_threshold,
+            "motion_pixel_threshold": self.motion_pixel_threshold,
+            "motion_max_idle_seconds": self.motion_max_idle_seconds,
+            "motion_proposals_enabled": self.motion_proposals_enabled,
+            "motion_proposal_padding": self.motion_proposal_padding,
+            "motion_proposal_full_scan_seconds": self.motion_proposal_full_scan_seconds,
+            "latency_tuner_enabled": self.latency_tuner_enabled,
+            "latency_tuner_target_ms": self.latency_tuner_target_ms,
+            "latency_tuner_target_fps": self.latency_tuner_target_fps,
+            "latency_tuner_steps": self.latency_tuner_steps,
+            "latency_tuner_max_scale_factor": self.latency_tuner_max_scale_factor,
+            "latency_tuner_min_neighbors_floor": self.latency_tuner_min_neighbors_floor,
+            "latency_tuner_max_min_size_factor": self.latency_tuner_max_min_size_factor,
+            "latency_tuner_min_roi_percentage": self.latency_tuner_min_roi_percentage,
+            "latency_tuner_release_ratio": self.latency_tuner_release_ratio,
+            "latency_tuner_hold_seconds": self.latency_tuner_hold_seconds,
+            "latency_tuner_log_path": self.latency_tuner_log_path,
+            "dedup_enabled": self.dedup_enabled,
+            "dedup_cache_path": self.dedup_cache_path,
+            "dedup_max_entries": self.dedup_max_entries,
+            "dedup_crop_hamming_distance": self.dedup_crop_hamming_distance,
+            "video_frame_step": self.video_frame_step,
+            "video_segment_seconds": self.video_segment_seconds,
+            "batch_resume_enabled": self.batch_resume_enabled,
+            "batch_manifest_path": self.batch_manifest_path,
+            "hot_folder_paths": self.hot_folder_paths,
+            "hot_folder_poll_seconds": self.hot_folder_poll_seconds,
+            "hot_folder_settle_seconds": self.hot_folder_settle_seconds,
+            "hot_folder_queue_size": self.hot_folder_queue_size,
+            "hot_folder_workers": self.hot_folder_workers,
+            "detection_metadata_format": self.detection_metadata_format,
+            "detection_store_path": self.detection_store_path,
+            "crop_output": self.crop_output,
+            "crop_archive_dir": self.crop_archive_dir,
+            "crop_archive_shard_mb": self.crop_archive_shard_mb,
+            "crop_archive_shard_seconds": self.crop_archive_shard_seconds,
+            "multi_camera_enabled": self.multi_camera_enabled,
+            "multi_camera_indices": self.multi_camera_indices,
+            "multi_camera_detection_workers": self.multi_camera_detection_workers,
+            "multi_camera_preview": self.multi_camera_preview,
+            "camera_save_intervals": self.camera_save_intervals,
+            "metrics_enabled": self.metrics_enabled,
+            "metrics_overlay_enabled": self.metrics_overlay_enabled,
+            "metrics_window_size": self.metrics_window_size,
+            "display_fps": self.display_fps,
+            **{key: list(value) if isinstance(value, tuple) else value for key, value in self.detector_params.items()}
         }
 
+    def _detection_params(self):
+        """Parametry detekcji: konfiguracja uzupełniona wartościami domyślnymi detektorów z rejestru."""
+        return detectors.with_detector_defaults(self._get_configurable_params_dict())
+
+    def _load_cascades(self):
+        """Ładuje kaskady detektorów z enabled_detectors (w tej kolejności) i tworzy ich katalogi wycinków."""
+        try:
+            detectors.parse_enabled_detectors(self.enabled_detectors)
+        except ValueError as e:
+            print(f"Ostrzeżenie: {e} Używanie '{detection_core.DEFAULT_DETECTION_PARAMS['enabled_detectors']}'.")
+            self.enabled_detectors = detection_core.DEFAULT_DETECTION_PARAMS["enabled_detectors"]
+        cascades = {}
+        for spec in detectors.configured_detectors({"enabled_detectors": self.enabled_detectors}):
+            os.makedirs(spec.save_dir, exist_ok=True)
+            if not os.path.exists(spec.cascade_path):
+                messagebox.showwarning("Brak modelu", f"Nie znaleziono pliku dla detektora '{spec.name}': {spec.cascade_path}\nUmieść go w katalogu ze skryptem.")
+                continue
+            cascade = cv2.CascadeClassifier(spec.cascade_path)
+            if cascade.empty():
+                messagebox.showerror("Błąd modelu", f"Nie można załadować kaskady dla detektora '{spec.name}': {spec.cascade_path}")
+                continue
+            cascades[spec.name] = cascade
+        # Wątek detekcji bierze referencję do słownika na początku klatki, więc podmiana jest bezpieczna
+        self.cascades = cascades
+        print(f"Detektory: {', '.join(cascades) or 'brak'}.")
+
+    def _cascade_paths(self):
+        """Ścieżki kaskad załadowanych detektorów {detektor: ścieżka} - dla procesów wsadowych i wątków detekcji."""
+        return {name: detectors.DETECTORS[name].cascade_path for name in self.cascades}
+
     def _save_parameters_to_file(self):
         """Zapisuje aktualne parametry konfiguracyjne do pliku config.json."""
         if self.is_batch_processing:
@@ -297,6 +551,12 @@ class CameraApp:
             ("target_plate_width", "Docelowa szer. tablicy (px)", "int"),
             ("face_save_padding", "Padding zapisu twarzy (px)", "int"),
             ("plate_save_padding", "Padding zapisu tablicy (px)", "int"),
+            ("face_crop_format", "Format wycinków twarzy (png/jpg/webp)", "str"),
+            ("face_crop_quality", "Jakość JPEG/WebP twarzy (0-100)", "int"),
+            ("face_crop_png_compression", "Kompresja PNG twarzy (0-9)", "int"),
+            ("plate_crop_format", "Format wycinków tablic (png/jpg/webp)", "str"),
+            ("plate_crop_quality", "Jakość JPEG/WebP tablic (0-100)", "int"),
+            ("plate_crop_png_compression", "Kompresja PNG tablic (0-9)", "int"),
             ("image_save_interval_seconds", "Interwał zapisu (s)", "float"),
             ("min_face_size", "Min. rozmiar twarzy (szer,wys)", "tuple_int"),
             ("min_plate_size", "Min. rozmiar tablicy (szer,wys)", "tuple_int"),
@@ -307,6 +567,54 @@ class CameraApp:
             ("face_confidence_threshold", "Próg pewności twarzy (float)", "float"),
             ("plate_confidence_threshold", "Próg pewności tablicy (float)", "float"),
             ("roi_size_percentage", "Rozmiar ROI (% całości, 0.1-1.0)", "float"),
+            ("enabled_detectors", "Detektory (np. face,plate,eye)", "str"),
+            ("face_detection_regions", "Strefy twarzy ([kam:]+/-x1,y1,x2,y2;...)", "str"),
+            ("plate_detection_regions", "Strefy tablic ([kam:]+/-x1,y1,x2,y2;...)", "str"),
+            ("face_detection_width", "Szer. detekcji twarzy (px, 0 = pełna)", "int"),
+            ("plate_detection_width", "Szer. detekcji tablic (px, 0 = pełna)", "int"),
+            ("tiled_detection_enabled", "Detekcja na kafelkach (tak/nie)", "bool"),
+            ("tiled_detection_min_width", "Kafelki od szerokości (px)", "int"),
+            ("tiled_detection_object_factor", "Zakładka kafelków (x min. rozmiar)", "float"),
+            ("tiled_detection_threads", "Wątki kafelków (0 = wszystkie rdzenie)", "int"),
+            ("tracking_enabled", "Śledzenie między detekcjami (tak/nie)", "bool"),
+            ("tracking_keyframe_interval", "Pełna detekcja co N klatek", "int"),
+            ("tracking_keyframe_max_seconds", "Maks. czas między detekcjami (s)", "float"),
+            ("tracking_min_points_ratio", "Min. odsetek śledzonych punktów", "float"),
+            ("motion_gate_enabled", "Detekcja tylko przy ruchu (tak/nie)", "bool"),
+            ("motion_changed_fraction_threshold", "Próg ruchu (odsetek pikseli)", "float"),
+            ("motion_pixel_threshold", "Próg zmiany piksela (0-255)", "int"),
+            ("motion_max_idle_seconds", "Wymuś detekcję co (s, 0 = nigdy)", "float"),
+            ("motion_proposals_enabled", "Kaskady tylko w obszarach ruchu (tak/nie)", "bool"),
+            ("motion_proposal_padding", "Obszary ruchu: poszerzenie (x rozmiar)", "float"),
+            ("motion_proposal_full_scan_seconds", "Obszary ruchu: pełny skan co (s)", "float"),
+            ("latency_tuner_enabled", "Autostrojenie kaskad (tak/nie)", "bool"),
+            ("latency_tuner_target_ms", "Autostrojenie: budżet kaskad (ms)", "float"),
+            ("latency_tuner_target_fps", "Autostrojenie: cel FPS (0 = budżet ms)", "float"),
+            ("latency_tuner_steps", "Autostrojenie: liczba poziomów", "int"),
+            ("latency_tuner_max_scale_factor", "Autostrojenie: maks. skala det.", "float"),
+            ("latency_tuner_min_neighbors_floor", "Autostrojenie: min. sąsiedzi", "int"),
+            ("latency_tuner_max_min_size_factor", "Autostrojenie: maks. mnożnik min. rozmiaru", "float"),
+            ("latency_tuner_min_roi_percentage", "Autostrojenie: min. ROI (0.1-1.0)", "float"),
+            ("latency_tuner_release_ratio", "Autostrojenie: powrót poniżej (x budżet)", "float"),
+            ("latency_tuner_hold_seconds", "Autostrojenie: min. czas poziomu (s)", "float"),
+            ("display_fps", "Odświeżanie podglądu (FPS)", "float"),
+            ("metrics_enabled", "Pomiary etapów (tak/nie)", "bool"),
+            ("metrics_overlay_enabled", "Nakładka z czasami etapów (tak/nie)", "bool"),
+            ("dedup_enabled", "Deduplikacja wsadowa (tak/nie)", "bool"),
+            ("dedup_crop_hamming_distance", "Próg podobieństwa wycinków (bity)", "int"),
+            ("batch_worker_processes", "Procesy wsadowe (0 = wszystkie rdzenie)", "int"),
+            ("batch_resume_enabled", "Pomijaj już przetworzone pliki (tak/nie)", "bool"),
+            ("hot_folder_paths", "Obserwowane katalogi (a;b; puste = images)", "str"),
+            ("hot_folder_poll_seconds", "Obserwacja: skanowanie co (s)", "float"),
+            ("hot_folder_settle_seconds", "Obserwacja: plik gotowy po (s)", "float"),
+            ("hot_folder_workers", "Obserwacja: procesy detekcji", "int"),
+            ("video_frame_step", "Wideo: co N-ta klatka", "int"),
+            ("video_segment_seconds", "Wideo: długość odcinka (s, 0 = cały plik)", "float"),
+            ("frame_drop_policy", "Odrzucanie klatek (latest/skip_if_busy)", "str"),
+            ("multi_camera_indices", "Kamery naraz (np. 0,2; puste = wszystkie)", "str"),
+            ("multi_camera_detection_workers", "Wątki detekcji wielu kamer (0 = po 1)", "int"),
+            ("camera_save_intervals", "Interwały zapisu per kamera (0:1.0,2:5.0)", "str"),
+            ("max_frame_age_seconds", "Maks. wiek klatki (s, 0 = bez limitu)", "float"),
         ]
 
         param_entries = {} 
@@ -319,6 +627,8 @@ class CameraApp:
             current_value = getattr(self, attr_name)
             if data_type == "tuple_int":
                 entry.insert(0, f"{current_value[0]},{current_value[1]}")
+            elif data_type == "bool":
+                entry.insert(0, "tak" if current_value else "nie")
             else:
                 entry.insert(0, str(current_value))
             param_entries[attr_name] = (entry, data_type)
@@ -346,8 +656,16 @@ class CameraApp:
                 value_str = entry_widget.get()
                 if data_type == "int":
                     val = int(value_str)
-                    if "min_neighbors" in attr_name and val < 0:
+                    if ("min_neighbors" in attr_name or "detection_width" in attr_name or attr_name.startswith("tiled_detection_")) and val < 0:
                         raise ValueError(f"Wartość dla '{attr_name}' musi być nieujemna.")
+                    if attr_name == "dedup_crop_hamming_distance" and not (0 <= val <= 64):
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być między 0 a 64.")
+                    if attr_name.endswith("_crop_quality") and not (0 <= val <= 100):
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być między 0 a 100.")
+                    if attr_name.endswith("_crop_png_compression") and not (0 <= val <= 9):
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być między 0 a 9.")
+                    if attr_name in ("tracking_keyframe_interval", "video_frame_step", "hot_folder_workers", "latency_tuner_steps") and val < 1:
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być co najmniej 1.")
                     new_settings[attr_name] = val
                 elif data_type == "float":
                     val = float(value_str)
@@ -355,7 +673,21 @@ class CameraApp:
                          raise ValueError(f"Wartość dla '{attr_name}' musi być większa niż 1.0.")
                     if "roi_size_percentage" in attr_name and not (0.0 < val <= 1.0):
                         raise ValueError(f"Wartość dla '{attr_name}' musi być między 0.0 a 1.0.")
+                    if attr_name in ("video_segment_seconds", "hot_folder_settle_seconds", "latency_tuner_target_fps",
+                                     "latency_tuner_hold_seconds", "motion_proposal_padding", "motion_proposal_full_scan_seconds") and val < 0:
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być nieujemna.")
+                    if attr_name in ("latency_tuner_min_roi_percentage", "latency_tuner_release_ratio") and not (0.0 < val <= 1.0):
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być między 0.0 a 1.0.")
+                    if attr_name in ("latency_tuner_max_min_size_factor", "tiled_detection_object_factor") and val < 1.0:
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być co najmniej 1.0.")
+                    if attr_name in ("display_fps", "latency_tuner_target_ms") and val <= 0:
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być dodatnia.")
                     new_settings[attr_name] = val
+                elif data_type == "bool":
+                    normalized_value = value_str.strip().lower()
+                    if normalized_value not in ("tak", "nie", "true", "false", "1", "0"):
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być 'tak' lub 'nie'.")
+                    new_settings[attr_name] = normalized_value in ("tak", "true", "1")
                 elif data_type == "tuple_int":
                     parts = value_str.split(',')
                     if len(parts) != 2:
@@ -366,14 +698,48 @@ class CameraApp:
                         raise ValueError(f"Wymiary dla '{attr_name}' muszą być dodatnie.")
                     new_settings[attr_name] = (val1, val2)
                 else: 
+                    if attr_name.endswith("_crop_format") and value_str not in detection_core.CROP_FORMATS:
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być jedną z: {', '.join(detection_core.CROP_FORMATS)}.")
+                    if attr_name == "frame_drop_policy" and value_str not in frame_pipeline.FRAME_DROP_POLICIES:
+                        raise ValueError(f"Wartość dla '{attr_name}' musi być jedną z: {', '.join(frame_pipeline.FRAME_DROP_POLICIES)}.")
+                    if attr_name == "multi_camera_indices":
+                        multi_camera.parse_camera_indices(value_str, self.available_cameras)
+                    if attr_name == "camera_save_intervals":
+                        multi_camera.parse_camera_save_intervals(value_str)
+                    if attr_name.endswith("_detection_regions"):
+                        regions.parse_region_spec(value_str)
+                    if attr_name == "enabled_detectors":
+                        value_str = ",".join(detectors.parse_enabled_detectors(value_str))
                     new_settings[attr_name] = value_str
             
+            previous_enabled_detectors = self.enabled_detectors
             for attr_name, value in new_settings.items():
                 setattr(self, attr_name, value)
                 print(f"Zaktualizowano parametr '{attr_name}' na: {value}")
             
             # Po udanej aktualizacji parametrów, zaktualizuj font_face
             self.font_face = getattr(cv2, self.font_face_val, cv2.FONT_HERSHEY_SIMPLEX)
+            self.pipeline_metrics.enabled = self.metrics_enabled
+            # Wyłączony regulator zapomina poziomy - po ponownym włączeniu startuje od wartości z konfiguracji
+            for tuner in self.latency_tuners.values():
+                tuner.log_path = self.latency_tuner_log_path
+            if not self.latency_tuner_enabled:
+                detection_params = self._detection_params()
+                for tuner in self.latency_tuners.values():
+                    tuner.reset(detection_params)
+                self.latency_tuners = {}
+            # Nowa liczba wątków kafelków: pulę utworzy następna detekcja. Starej nie zamykamy - wątek detekcji
+            # może jej jeszcze używać; jej wątki kończą się, gdy zniknie ostatnia referencja.
+            detectors_changed = self.enabled_detectors != previous_enabled_detectors
+            if detectors_changed:
+                # Nowy zestaw działa od następnej klatki; tryb wielu kamer i procesy wsadowe - od ponownego uruchomienia
+                self._load_cascades()
+                self.detector_costs.reset()
+            if self.tile_runner is not None and (not self.tiled_detection_enabled or detectors_changed or
+                                                 self.tile_runner.thread_count != self._tile_thread_count()):
+                self.tile_runner = None
+            if not self.metrics_overlay_enabled:
+                self.metrics_overlay_lines = []
 
 
             messagebox.showinfo("Zapisano", "Parametry zostały zaktualizowane.", parent=dialog_window)
@@ -385,6 +751,33 @@ class CameraApp:
             messagebox.showerror("Błąd", f"Wystąpił nieoczekiwany błąd: {e}", parent=dialog_window)
 
 
+    def _save_detection_json(self, data_dict, json_filepath):
+        """Zapisuje dane detekcji do pliku JSON."""
+        detection_core.save_detection_json(data_dict, json_filepath)
+
+
+    def _flush_detection_writer(self):
+        """Czeka na zakończenie wszystkich zleconych zapisów wycinków."""
+        if hasattr(self, 'detection_writer'):
+            self.detection_writer.flush()
+        if getattr(self, 'detection_store', None) is not None:
+            if not self.detection_store.flush():
+                print("Ostrzeżenie: Nie wszystkie detekcje zostały zapisane w bazie przed upływem limitu czasu.")
+            self._print_writer_stats()
+
+    def _print_detector_costs(self, cost_report, title):
+        cost_lines = cost_report.lines()
+        if cost_lines:
+            print(title)
+            for line in cost_lines:
+                print(f"  {line}")
+
+    def _print_writer_stats(self):
+        writer_stats = self.detection_writer.stats()
+        print(f"Zapis w tle: zapisano {writer_stats['written']}, odrzucono {writer_stats['dropped']}, błędy {writer_stats['failed']}, "
+              f"maks. kolejka {writer_stats['max_queue_depth']}/{writer_stats['queue_capacity']}, śr. czas zapisu {writer_stats['avg_write_ms']:.1f} ms")
+
+
     def _update_camera_info_string(self):
         if self.vid and self.vid.isOpened():
             try:
@@ -438,6 +831,7 @@ class CameraApp:
         if new_camera_index == self.camera_index_used and self.vid and self.vid.isOpened():
             print("Wybrana kamera jest już aktywna.")
             return
+        self.stop_multi_camera()
 
         self.running = False 
         if hasattr(self, 'capture_thread') and self.capture_thread and self.capture_thread.is_alive():
@@ -446,6 +840,7 @@ class CameraApp:
             if self.capture_thread.is_alive():
                 print("Ostrzeżenie: Poprzedni wątek kamery nie zakończył się w wyznaczonym czasie.")
         self.capture_thread = None 
+        self._flush_detection_writer()
 
         if hasattr(self, 'vid') and self.vid and self.vid.isOpened():
             print(f"Zwalnianie kamery {self.camera_index_used}...")
@@ -475,10 +870,18 @@ class CameraApp:
             self.fps_start_time = time.time()
             self.fps_counter = 0
             self.current_fps = 0
-            self.last_face_save_time = 0
-            self.last_plate_save_time = 0
-            self.face_detected_in_roi_flag = False
-            self.plate_detected_flag = False
+            self.last_save_times = {}
+            self.dropped_frames_count = 0
+            self.detection_tracker.reset(None, {})
+            self.last_keyframe_time = 0
+            self.tracking_early_redetections = 0
+            self.motion_gate.reset()
+            self.motion_proposer.reset()
+            self.last_live_detections = {}
+            self.pipeline_metrics.reset()
+            self.detector_costs.reset()
+            self.metrics_overlay_lines = []
+            self.detected_types = set()
             
             self.running = True
             self.capture_thread = threading.Thread(target=self.video_capture_loop, daemon=True)
@@ -495,20 +898,93 @@ class CameraApp:
         if self.is_batch_processing:
             messagebox.showinfo("Informacja", "Przetwarzanie folderu obrazów już trwa.")
             return
+        if self.hot_folder_ingest is not None:
+            messagebox.showinfo("Informacja", "Folder 'images' jest już obserwowany - nowe obrazy są przetwarzane na bieżąco.")
+            return
 
         images_folder_path = "images"
         if not os.path.isdir(images_folder_path):
             messagebox.showerror("Błąd folderu", f"Folder '{images_folder_path}' nie istnieje. Utwórz go i dodaj obrazy.")
             return
         
-        image_files = [f for f in os.listdir(images_folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+        image_files = detection_core.list_image_files(images_folder_path)
         if not image_files:
             messagebox.showinfo("Informacja", f"Brak plików .png lub .jpg w folderze '{images_folder_path}'.")
             return
 
         messagebox.showinfo("Rozpoczęto przetwarzanie", f"Rozpoczynam przetwarzanie obrazów z folderu '{images_folder_path}'.\nTo może chwilę potrwać. Strumień z kamery zostanie wstrzymany.")
-        
+        self._enter_batch_mode("Przetwarzanie folderu obrazów...")
+
+        self.batch_thread = threading.Thread(target=self._process_image_folder_thread_worker, daemon=True)
+        self.batch_thread.start()
+
+    def toggle_hot_folder_ingest(self):
+        """Włącza lub wyłącza ciągłe przetwarzanie obserwowanych katalogów (podgląd kamery działa dalej)."""
+        if self.hot_folder_ingest is not None:
+            self.stop_hot_folder_ingest()
+            return
+        if self.is_batch_processing:
+            messagebox.showwarning("Przetwarzanie", "Nie można włączyć obserwacji folderu podczas przetwarzania wsadowego.")
+            self.hot_folder_var.set(False)
+            return
+        params = self._detection_params()
+        folders = hot_folder.parse_folder_list(self.hot_folder_paths)
+        missing_folders = [folder for folder in folders if not os.path.isdir(folder)]
+        if missing_folders:
+            messagebox.showerror("Błąd folderu", f"Nie istnieją katalogi: {', '.join(missing_folders)}.")
+            self.hot_folder_var.set(False)
+            return
+
+        dedup = batch_engine.open_dedup_cache(params)
+        manifest = batch_engine.open_batch_manifest(params)
+        # Jeden wątek OpenCV na proces: podgląd na żywo zachowuje pozostałe rdzenie
+        self.hot_folder_ingest = hot_folder.HotFolderIngest(
+            folders, params, self._cascade_paths(), self.hot_folder_workers,
+            lambda result: batch_engine.write_batch_result(result, params, dedup=dedup, store=self.detection_store,
+                                                           crop_output=self.crop_output_writer),
+            manifest, dedup, opencv_threads=1)
+        self.hot_folder_ingest.start()
+        self.hot_folder_var.set(True)
+        print(f"Obserwowanie katalogów: {', '.join(folders)} (procesy: {self.hot_folder_workers}).")
+
+    def stop_hot_folder_ingest(self):
+        """Zatrzymuje obserwację katalogów (jeśli aktywna) i zapisuje manifest."""
+        if self.hot_folder_ingest is None:
+            return
+        print("Zatrzymywanie obserwacji katalogów...")
+        ingest = self.hot_folder_ingest
+        self.hot_folder_ingest = None
+        ingest.stop()
+        stats = ingest.stats()
+        print(f"Obserwacja zakończona. Przetworzono plików: {stats['processed']} (błędy: {stats['failed']}), zapisano detekcji: {stats['saved']}.")
+        if hasattr(self, 'hot_folder_var'):
+            self.hot_folder_var.set(False)
+
+    def start_video_processing(self):
+        if self.is_batch_processing:
+            messagebox.showinfo("Informacja", "Przetwarzanie wsadowe już trwa.")
+            return
+
+        video_patterns = " ".join(f"*{extension}" for extension in detection_core.VIDEO_EXTENSIONS)
+        video_path = filedialog.askopenfilename(title="Wybierz plik wideo",
+                                                filetypes=[("Pliki wideo", video_patterns), ("Wszystkie pliki", "*.*")])
+        if not video_path:
+            return
+        if batch_engine.probe_video(video_path) is None:
+            messagebox.showerror("Błąd pliku", f"Nie można otworzyć pliku wideo '{video_path}'.")
+            return
+
+        messagebox.showinfo("Rozpoczęto przetwarzanie", f"Rozpoczynam przetwarzanie pliku wideo '{os.path.basename(video_path)}'.\nTo może chwilę potrwać. Strumień z kamery zostanie wstrzymany.")
+        self._enter_batch_mode("Przetwarzanie pliku wideo...")
+
+        self.batch_thread = threading.Thread(target=self._process_video_file_thread_worker, args=(video_path,), daemon=True)
+        self.batch_thread.start()
+
+    def _enter_batch_mode(self, status_text):
+        """Wstrzymuje kamerę na żywo i blokuje menu na czas przetwarzania wsadowego (obrazy lub wideo)."""
         self.camera_index_to_resume = self.camera_index_used 
+        self.resume_multi_camera = self.multi_camera_pipeline is not None
+        self.stop_multi_camera()
         
         if self.running and hasattr(self, 'capture_thread') and self.capture_thread and self.capture_thread.is_alive():
             print("Wstrzymywanie kamery na żywo na czas przetwarzania wsadowego...")
@@ -528,312 +1004,710 @@ class CameraApp:
 
         if hasattr(self, 'canvas') and self.canvas:
             self.canvas.delete("all") 
+            self.canvas_image_item = None
+            self.photo = None
             canvas_center_x = self.width / 2 if self.width > 0 else 320
             canvas_center_y = self.height / 2 if self.height > 0 else 240
             self.canvas.create_text(canvas_center_x, canvas_center_y, 
-                                   text="Przetwarzanie folderu obrazów...", fill="white", font=("Helvetica", 16))
+                                   text=status_text, fill="white", font=("Helvetica", 16))
         if hasattr(self, 'info_label_text'):
-             self.info_label_text.set("Przetwarzanie folderu obrazów...")
+             self.info_label_text.set(status_text)
 
         self.is_batch_processing = True
         self.camera_menu.entryconfig("Przetwórz folder 'images'", state="disabled")
+        self.camera_menu.entryconfig("Przetwórz plik wideo...", state="disabled")
         if self.available_cameras: 
             for i in self.available_cameras:
                  self.camera_menu.entryconfig(f"Kamera {i}", state="disabled")
 
-        batch_thread = threading.Thread(target=self._process_image_folder_thread_worker, daemon=True)
-        batch_thread.start()
-
     def _process_and_draw_detections(self, frame, frame_for_saving, current_time, is_live_feed, source_details=None):
         current_frame_height, current_frame_width = frame.shape[:2]
-        
-        roi_x1, roi_y1, roi_x2, roi_y2 = 0, 0, current_frame_width, current_frame_height 
-        offset_x_roi, offset_y_roi = 0, 0
-        frame_roi_for_face_detection = frame 
-
-        if self.face_cascade:
-            if is_live_feed: 
-                temp_roi_w = int(current_frame_width * self.roi_size_percentage)
-                temp_roi_h = int(current_frame_height * self.roi_size_percentage)
-                
-                if temp_roi_w > 0 and temp_roi_h > 0 and current_frame_width > 0 and current_frame_height > 0:
-                    roi_x1 = int((current_frame_width - temp_roi_w) / 2)
-                    roi_y1 = int((current_frame_height - temp_roi_h) / 2)
-                    roi_x2 = roi_x1 + temp_roi_w 
-                    roi_y2 = roi_y1 + temp_roi_h
-                    offset_x_roi, offset_y_roi = roi_x1, roi_y1                     
-
-                    slice_roi_x1 = max(0, roi_x1)
-                    slice_roi_y1 = max(0, roi_y1)
-                    slice_roi_x2 = min(current_frame_width, roi_x2)
-                    slice_roi_y2 = min(current_frame_height, roi_y2)
-
-                    if slice_roi_x2 > slice_roi_x1 and slice_roi_y2 > slice_roi_y1:
-                        frame_roi_for_face_detection = frame[slice_roi_y1:slice_roi_y2, slice_roi_x1:slice_roi_x2]
-                    else:
-                        frame_roi_for_face_detection = frame[0:0, 0:0] 
-                else: 
-                    frame_roi_for_face_detection = frame[0:0, 0:0]
-            
-            if frame_roi_for_face_detection.size > 0 and \
-               frame_roi_for_face_detection.shape[0] >= self.min_face_size[1] and \
-               frame_roi_for_face_detection.shape[1] >= self.min_face_size[0]:
-                gray_roi_for_face = cv2.cvtColor(frame_roi_for_face_detection, cv2.COLOR_BGR2GRAY)
-                try:
-                    faces, _, level_weights = self.face_cascade.detectMultiScale3(
-                        gray_roi_for_face,
-                        scaleFactor=self.face_detection_scale_factor,
-                        minNeighbors=self.face_detection_min_neighbors,
-                        minSize=self.min_face_size,
-                        outputRejectLevels=True
-                    )
-                    if faces is not None and len(faces) > 0:
-                        self.face_detected_in_roi_flag = True 
-                        processed_one_save_this_cycle = False
-                        for i, (x, y, w, h) in enumerate(faces):
-                            face_x1_global = offset_x_roi + x
-                            face_y1_global = offset_y_roi + y
-                            face_x2_global = offset_x_roi + x + w
-                            face_y2_global = offset_y_roi + y + h
-                            cv2.rectangle(frame, (face_x1_global, face_y1_global), (face_x2_global, face_y2_global), self.rect_face_color, self.rect_face_thickness)
-                            
-                            confidence = 0.0
-                            if level_weights is not None and i < len(level_weights):
-                                confidence = level_weights[i]
-                                cv2.putText(frame, f"{confidence:.2f}", (face_x1_global, face_y1_global - 10), self.font_face, self.font_scale_confidence, self.confidence_text_color, self.line_type_info)
-
-                            can_save_time = not is_live_feed or (current_time - self.last_face_save_time > self.image_save_interval_seconds)
-                            if not processed_one_save_this_cycle and can_save_time and confidence >= self.face_confidence_threshold:
-                                fs_x1 = max(0, face_x1_global - self.face_save_padding)
-                                fs_y1 = max(0, face_y1_global - self.face_save_padding)
-                                fs_x2 = min(current_frame_width, face_x2_global + self.face_save_padding)
-                                fs_y2 = min(current_frame_height, face_y2_global + self.face_save_padding)
-                                image_crop_to_save = frame_for_saving[fs_y1:fs_y2, fs_x1:fs_x2]
-
-                                if image_crop_to_save.size > 0:
-                                    orig_h_crop, orig_w_crop = image_crop_to_save.shape[:2]
-                                    resized_img = image_crop_to_save
-                                    saved_w, saved_h = orig_w_crop, orig_h_crop
-                                    if orig_w_crop > 0 and orig_h_crop > 0:
-                                        ratio = self.target_face_width / float(orig_w_crop)
-                                        new_h = int(orig_h_crop * ratio)
-                                        if new_h > 0:
-                                            resized_img = cv2.resize(image_crop_to_save, (self.target_face_width, new_h), interpolation=cv2.INTER_AREA if ratio < 1.0 else cv2.INTER_LINEAR)
-                                            saved_w, saved_h = resized_img.shape[1], resized_img.shape[0]
-                                    
-                                    base_name = os.path.splitext(source_details["original_filename"])[0] if source_details else f"live"
-                                    png_filename = f"{base_name}_face_{i if source_details else self.camera_index_used}_{int(current_time)}.png"
-                                    png_filepath = os.path.join("faces", png_filename)
-                                    json_filepath = os.path.join("faces", os.path.splitext(png_filename)[0] + ".json")
-
-                                    try:
-                                        cv2.imwrite(png_filepath, resized_img)
-                                        print(f"  Zapisano twarz: {png_filepath} (pewność: {confidence:.2f})")
-                                        if is_live_feed: self.last_face_save_time = current_time
-                                        processed_one_save_this_cycle = True
-                                        if not is_live_feed and 'saved_detections_count_ref' in source_details: source_details['saved_detections_count_ref'][0] +=1
-
-
-                                        json_data = {
-                                            "detection_type": "face", "confidence_score": float(f"{confidence:.2f}"),
-                                            "original_detected_object": {"width": int(w), "height": int(h)},
-                                            "saved_image_details": {"png_filename": png_filename, "saved_width": int(saved_w), "saved_height": int(saved_h), "padding_applied": self.face_save_padding},
-                                            "source_info": source_details if source_details else {"source_type": "live_camera", "timestamp": int(current_time), "camera_index": self.camera_index_used},
-                                            "normalization": {"target_width": self.target_face_width}
-                                        }
-                                        self._save_detection_json(json_data, json_filepath)
-                                    except Exception as e_save: print(f"  Błąd zapisu twarzy: {e_save}")
-                except cv2.error as e_cv:
-                    print(f"  Błąd OpenCV (twarz) {'w pliku ' + source_details['original_filename'] if source_details else 'na żywo'}: {e_cv}")
-            
-            if is_live_feed: 
-                current_roi_color_display = self.rect_roi_color_face_detected if self.face_detected_in_roi_flag else self.rect_roi_color_default
-                cv2.rectangle(frame, (roi_x1, roi_y1), (roi_x2, roi_y2), current_roi_color_display, self.rect_roi_thickness)
-
-
-        if self.plate_cascade:
-            gray_frame_for_plate = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) 
-            if gray_frame_for_plate.shape[0] >= self.min_plate_size[1] and gray_frame_for_plate.shape[1] >= self.min_plate_size[0]:
-                try:
-                    plates, _, level_weights_plate = self.plate_cascade.detectMultiScale3(
-                        gray_frame_for_plate,
-                        scaleFactor=self.plate_detection_scale_factor,
-                        minNeighbors=self.plate_detection_min_neighbors,
-                        minSize=self.min_plate_size,
-                        outputRejectLevels=True
-                    )
-                    if plates is not None and len(plates) > 0:
-                        self.plate_detected_flag = True
-                        processed_one_save_this_cycle = False
-                        for i, (x_p, y_p, w_p, h_p) in enumerate(plates):
-                            cv2.rectangle(frame, (x_p, y_p), (x_p + w_p, y_p + h_p), self.rect_plate_color, self.rect_plate_thickness)
-                            confidence_plate = 0.0
-                            if level_weights_plate is not None and i < len(level_weights_plate):
-                                confidence_plate = level_weights_plate[i]
-                                cv2.putText(frame, f"{confidence_plate:.2f}", (x_p, y_p - 10), self.font_face, self.font_scale_confidence, self.confidence_text_color, self.line_type_info)
-
-                            can_save_time_plate = not is_live_feed or (current_time - self.last_plate_save_time > self.image_save_interval_seconds)
-                            if not processed_one_save_this_cycle and can_save_time_plate and confidence_plate >= self.plate_confidence_threshold:
-                                ps_x1 = max(0, x_p - self.plate_save_padding)
-                                ps_y1 = max(0, y_p - self.plate_save_padding)
-                                ps_x2 = min(current_frame_width, x_p + w_p + self.plate_save_padding)
-                                ps_y2 = min(current_frame_height, y_p + h_p + self.plate_save_padding)
-                                plate_image_to_save = frame_for_saving[ps_y1:ps_y2, ps_x1:ps_x2]
-
-                                if plate_image_to_save.size > 0:
-                                    orig_h_p, orig_w_p = plate_image_to_save.shape[:2]
-                                    resized_plate = plate_image_to_save
-                                    saved_w_p, saved_h_p = orig_w_p, orig_h_p
-                                    if orig_w_p > 0 and orig_h_p > 0:
-                                        ratio_p = self.target_plate_width / float(orig_w_p)
-                                        new_h_p = int(orig_h_p * ratio_p)
-                                        if new_h_p > 0:
-                                            resized_plate = cv2.resize(plate_image_to_save, (self.target_plate_width, new_h_p), interpolation=cv2.INTER_AREA if ratio_p < 1.0 else cv2.INTER_LINEAR)
-                                            saved_w_p, saved_h_p = resized_plate.shape[1], resized_plate.shape[0]
-
-                                    base_name_p = os.path.splitext(source_details["original_filename"])[0] if source_details else f"live"
-                                    png_filename_p = f"{base_name_p}_plate_{i if source_details else self.camera_index_used}_{int(current_time)}.png"
-                                    png_filepath_p = os.path.join("plates", png_filename_p)
-                                    json_filepath_p = os.path.join("plates", os.path.splitext(png_filename_p)[0] + ".json")
-                                    
-                                    try:
-                                        cv2.imwrite(png_filepath_p, resized_plate)
-                                        print(f"  Zapisano tablicę: {png_filepath_p} (pewność: {confidence_plate:.2f})")
-                                        if is_live_feed: self.last_plate_save_time = current_time
-                                        processed_one_save_this_cycle = True
-                                        if not is_live_feed and 'saved_detections_count_ref' in source_details: source_details['saved_detections_count_ref'][0] +=1
-
-
-                                        json_data_p = {
-                                            "detection_type": "plate", "confidence_score": float(f"{confidence_score_plate:.2f}"),
-                                            "original_detected_object": {"width": int(w_p), "height": int(h_p)},
-                                            "saved_image_details": {"png_filename": png_filename_p, "saved_width": int(saved_w_p), "saved_height": int(saved_h_p), "padding_applied": self.plate_save_padding},
-                                            "source_info": source_details if source_details else {"source_type": "live_camera", "timestamp": int(current_time), "camera_index": self.camera_index_used},
-                                            "normalization": {"target_width": self.target_plate_width}
-                                        }
-                                        self._save_detection_json(json_data_p, json_filepath_p)
-                                    except Exception as e_save: print(f"  Błąd zapisu tablicy: {e_save}")
-                except cv2.error as e_cv_plate:
-                     print(f"  Błąd OpenCV (tablica) {'w pliku ' + source_details['original_filename'] if source_details else 'na żywo'}: {e_cv_plate}")
+        params = self._detection_params()
+        tile_runner = self._tile_runner_for_detection()
+        # Autostrojenie: kaskady dostają parametry bieżącego poziomu regulatora, a regulator - wartości bazowe
+        tuner = self._latency_tuner_for_camera(self.camera_index_used) if is_live_feed and self.latency_tuner_enabled else None
+        if tuner is not None:
+            base_params, params = params, tuner.apply(params)
+        cascade_time = 0.0
+        metrics = self.pipeline_metrics
+        # Czas etapów mierzonych osobno; reszta czasu funkcji to rysowanie (etap "draw")
+        process_start = time.perf_counter()
+        # Skala szarości liczona raz, przed rysowaniem nakładek, i współdzielona przez wszystkie detektory
+        prepared_frame = detection_core.prepare_frame(frame)
+        measured_time = time.perf_counter() - process_start
+        metrics.record("preprocess", measured_time)
+
+        # Bramka ruchu: na statycznej scenie kaskady nie są uruchamiane, a poprzedni wynik jest używany ponownie
+        reused_detections = None
+        if is_live_feed and self.motion_gate_enabled:
+            stage_start = time.perf_counter()
+            if not self._motion_gate_allows_detection(prepared_frame, current_time):
+                reused_detections = self.last_live_detections
+            stage_time = time.perf_counter() - stage_start
+            metrics.record("motion_gate", stage_time)
+            measured_time += stage_time
+        # Tryb śledzenia: pełne kaskady tylko na klatkach kluczowych, pomiędzy nimi ramki przesuwa tracker
+        if reused_detections is None and is_live_feed and self.tracking_enabled:
+            stage_start = time.perf_counter()
+            reused_detections = self._track_between_keyframes(prepared_frame, current_time)
+            stage_time = time.perf_counter() - stage_start
+            metrics.record("tracking", stage_time)
+            measured_time += stage_time
+        is_keyframe = reused_detections is None
+        # Propozycje z ruchu: kaskady skanują tylko okolice plam ruchu i poprzednich detekcji (None = cała klatka)
+        proposals = None
+        if is_keyframe and is_live_feed and self.motion_proposals_enabled:
+            stage_start = time.perf_counter()
+            proposals = self._motion_proposals(prepared_frame, current_time, params)
+            stage_time = time.perf_counter() - stage_start
+            metrics.record("motion_proposals", stage_time)
+            measured_time += stage_time
+        # Detektory z rejestru po kolei na wspólnym PreprocessedFrame - kolejny detektor to tylko jego kaskada
+        cascades = self.cascades
+        camera_index = self.camera_index_used if is_live_feed else -1
+        detections_by_type = {}
+        detector_areas = []
+        for detection_type, cascade in cascades.items():
+            spec = detectors.DETECTORS[detection_type]
+            detection_regions, roi, can_scan = self._detector_area(spec, camera_index, current_frame_width, current_frame_height, params)
+            detector_areas.append((spec, detection_regions, roi))
+            detections = []
+            try:
+                if not is_keyframe:
+                    detections = reused_detections.get(detection_type, [])
+                elif can_scan:
+                    stage_start = time.perf_counter()
+                    detections = self._run_detector(spec, cascade, prepared_frame, params, detection_regions, roi, tile_runner, proposals)
+                    stage_time = time.perf_counter() - stage_start
+                    metrics.record(f"{detection_type}_cascade", stage_time)
+                    self.detector_costs.record(detection_type, stage_time, len(detections))
+                    measured_time += stage_time
+                    cascade_time += stage_time
+                if detections:
+                    self.detected_types.add(detection_type)
+                    processed_one_save_this_cycle = False
+                    for i, (x, y, w, h, confidence) in enumerate(detections):
+                        self._draw_detection_box(frame, detection_type, (x, y, w, h), confidence)
+
+                        can_save_time = not is_live_feed or (current_time - self.last_save_times.get(detection_type, 0) > self.image_save_interval_seconds)
+                        # Zapis tylko z pełnej detekcji - ramki ze śledzenia mogą dryfować
+                        if is_keyframe and not processed_one_save_this_cycle and can_save_time and confidence >= params[f"{detection_type}_confidence_threshold"]:
+                            stage_start = time.perf_counter()
+                            if self._save_detection_crop(detection_type, (x, y, w, h), confidence, i, frame_for_saving, current_time, is_live_feed, source_details):
+                                if is_live_feed: self.last_save_times[detection_type] = current_time
+                                processed_one_save_this_cycle = True
+                            stage_time = time.perf_counter() - stage_start
+                            metrics.record("save_submit", stage_time)
+                            measured_time += stage_time
+            except cv2.error as e_cv:
+                print(f"  Błąd OpenCV ({detection_type}) {'w pliku ' + source_details['original_filename'] if source_details else 'na żywo'}: {e_cv}")
+            detections_by_type[detection_type] = detections
+
+        if is_live_feed:
+            self._draw_detector_areas(frame, detector_areas, detections_by_type)
+        if tuner is not None and is_keyframe:
+            tuner.record(cascade_time, base_params, current_time)
+        if is_live_feed and self.tracking_enabled and is_keyframe:
+            self.detection_tracker.reset(prepared_frame.gray, detections_by_type)
+            self.frames_since_keyframe = 0
+            self.last_keyframe_time = current_time
+        if is_live_feed:
+            self.last_live_detections = detections_by_type
 
         if is_live_feed:
-            text_lines = [f"FPS: {self.current_fps:.1f}", f"{self.camera_name_info}", f"Rozdz: {self.width}x{self.height}"]
-            if self.face_detected_in_roi_flag: text_lines.append("TWARZ W ROI!")
-            if self.plate_detected_flag: text_lines.append("TABLICA REJ.!")
+            text_lines = [f"FPS: {self.current_fps:.1f}", f"{self.camera_name_info}", f"Rozdz: {self.width}x{self.height}", f"Pominiete klatki: {self.dropped_frames_count}"]
+            if self.tracking_enabled:
+                tracking_state = "detekcja" if is_keyframe else f"{self.frames_since_keyframe}/{self.tracking_keyframe_interval}"
+                text_lines.append(f"Sledzenie: {tracking_state} (wczesne detekcje: {self.tracking_early_redetections})")
+            if self.motion_gate_enabled:
+                gate_stats = self.motion_gate.stats()
+                text_lines.append(f"Bramka ruchu: pominieto {gate_stats['gated']}, detekcje {gate_stats['ungated']} (zmiana {gate_stats['last_changed_fraction'] * 100:.1f}%)")
+            if self.motion_proposals_enabled:
+                proposal_stats = self.motion_proposer.stats()
+                text_lines.append(f"Obszary ruchu: {proposal_stats['last_proposals']}, pominieto {proposal_stats['last_skipped_fraction'] * 100:.0f}% "
+                                  f"pikseli (sr. {proposal_stats['skipped_fraction'] * 100:.0f}%), pelne skany {proposal_stats['full_scans']}")
+            if tuner is not None:
+                text_lines.append(tuner.overlay_line(base_params))
+            alert_lines = [f"{detectors.DETECTORS[name].alert_text}!" for name, detections in detections_by_type.items() if detections]
+            text_lines.extend(alert_lines)
+            if self.metrics_overlay_enabled:
+                text_lines.extend(self.metrics_overlay_lines)
             
             current_y_text = self.text_y_offset
             for i, line in enumerate(text_lines):
-                color = self.font_color_info
-                if "TWARZ W ROI!" in line: color = (0, 255, 255) 
-                if "TABLICA REJ.!" in line: color = (0, 255, 255) 
+                color = (0, 255, 255) if line in alert_lines else self.font_color_info
                 cv2.putText(frame, line, (10, current_y_text + i * self.line_spacing), self.font_face, self.font_scale_info, color, self.line_type_info)
-        
+
+        metrics.record("draw", time.perf_counter() - process_start - measured_time)
         return frame 
 
+    def get_pipeline_metrics(self):
+        """Zwraca bieżące metryki pętli na żywo: czasy etapów (p50/p95/p99 w ms) i wskaźniki kolejek."""
+        return self.pipeline_metrics.snapshot()
+
+    def _refresh_metrics_overlay(self):
+        """Odświeża linie nakładki z metrykami (raz na sekundę, razem z FPS - nie przy każdej klatce)."""
+        if self.metrics_overlay_enabled:
+            stage_order = pipeline_metrics.live_stage_order(spec.name for spec in detectors.configured_detectors({"enabled_detectors": self.enabled_detectors}))
+            self.metrics_overlay_lines = (pipeline_metrics.format_overlay_lines(self.pipeline_metrics.snapshot(), stage_order)
+                                          + self.detector_costs.lines())
+
+    def _draw_detection_box(self, frame, detection_type, box, confidence):
+        """Rysuje ramkę detekcji z wartością pewności."""
+        x, y, w, h = box
+        color = self._detector_color(detectors.DETECTORS[detection_type])
+        thickness = getattr(self, f"rect_{detection_type}_thickness", self.rect_face_thickness)
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, thickness)
+        cv2.putText(frame, f"{confidence:.2f}", (x, y - 10), self.font_face, self.font_scale_confidence, self.confidence_text_color, self.line_type_info)
+
+    def _process_camera_stream_frame(self, stream, frame, capture_time, cascades):
+        """Detekcja dla jednej klatki w trybie wielu kamer (wątek z puli detekcji). Zwraca klatkę podglądu.
+
+        Kaskady ({detektor: CascadeClassifier}) należą do wątku wywołującego; czasy zapisów są liczone osobno dla każdej kamery.
+        """
+        params = self._detection_params()
+        tile_runner = self._tile_runner_for_detection()
+        tuner = self._latency_tuner_for_camera(stream.camera_index) if self.latency_tuner_enabled else None
+        if tuner is not None:
+            base_params, params = params, tuner.apply(params)
+        frame_height, frame_width = frame.shape[:2]
+        prepared_frame = detection_core.prepare_frame(frame)
+        detections_by_type = {}
+        detector_areas = []
+        cascade_start = time.perf_counter()
+        for detection_type, cascade in cascades.items():
+            spec = detectors.DETECTORS[detection_type]
+            detection_regions, roi, can_scan = self._detector_area(spec, stream.camera_index, frame_width, frame_height, params)
+            detector_areas.append((spec, detection_regions, roi))
+            detections_by_type[detection_type] = []
+            if not can_scan:
+                continue
+            stage_start = time.perf_counter()
+            try:
+                detections_by_type[detection_type] = self._run_detector(spec, cascade, prepared_frame, params, detection_regions, roi, tile_runner)
+            except cv2.error as e_cv:
+                print(f"  Błąd OpenCV ({detection_type}, kamera {stream.camera_index}): {e_cv}")
+            self.detector_costs.record(detection_type, time.perf_counter() - stage_start, len(detections_by_type[detection_type]))
+        if tuner is not None:
+            tuner.record(time.perf_counter() - cascade_start, base_params, capture_time)
+
+        # Wycinki pochodzą z surowej klatki (kopiowane tylko przy zapisie), nakładki trafiają do kopii podglądu
+        display_frame = frame.copy()
+        save_interval = self.camera_save_interval(stream.camera_index)
+        for detection_type, detections in detections_by_type.items():
+            threshold = params[f"{detection_type}_confidence_threshold"]
+            can_save_time = capture_time - stream.last_save_times.get(detection_type, 0) > save_interval
+            for i, (x, y, w, h, confidence) in enumerate(detections):
+                self._draw_detection_box(display_frame, detection_type, (x, y, w, h), confidence)
+                if can_save_time and confidence >= threshold:
+                    if self._save_detection_crop(detection_type, (x, y, w, h), confidence, i, frame, capture_time, True, None, camera_index=stream.camera_index):
+                        stream.last_save_times[detection_type] = capture_time
+                        can_save_time = False
+
+        self._draw_detector_areas(display_frame, detector_areas, detections_by_type)
+        text_lines = [f"Kamera {stream.camera_index} | FPS: {stream.current_fps:.1f}", f"Pominiete klatki: {stream.frame_slot.dropped_frames_count}"]
+        if tuner is not None:
+            text_lines.append(tuner.overlay_line(base_params))
+        info_lines_count = len(text_lines)
+        text_lines.extend(f"{detectors.DETECTORS[name].alert_text}!" for name, detections in detections_by_type.items() if detections)
+        for i, line in enumerate(text_lines):
+            color = self.font_color_info if i < info_lines_count else (0, 255, 255)
+            cv2.putText(display_frame, line, (10, self.text_y_offset + i * self.line_spacing), self.font_face, self.font_scale_info, color, self.line_type_info)
+        return display_frame
+
+    def _detector_color(self, spec):
+        """Kolor ramek detektora: atrybut rect_{detektor}_color (twarze, tablice) lub kolor z rejestru."""
+        return getattr(self, f"rect_{spec.name}_color", spec.color)
+
+    def _detector_area(self, spec, camera_index, frame_width, frame_height, params):
+        """Obszar detektora dla kamery: (strefy, ROI, czy skanować).
+
+        Strefy z konfiguracji mają pierwszeństwo; bez nich detektor z polityką ROI_CENTER skanuje centralne ROI,
+        a pozostałe całą klatkę. Pliki (camera_index < 0) są zawsze skanowane w całości.
+        """
+        if camera_index < 0:
+            return None, None, True
+        detection_regions = self._detection_regions(spec.name, camera_index)
+        if detection_regions is None and spec.roi_policy == detectors.ROI_CENTER:
+            roi = detection_core.compute_face_roi(frame_width, frame_height, params["roi_size_percentage"])
+            return None, roi, roi is not None
+        return detection_regions, None, True
+
+    def _run_detector(self, spec, cascade, prepared_frame, params, detection_regions, roi, tile_runner, proposals=None):
+        """Detekcje jednego detektora w strefach, w ROI lub w całej klatce (roi=None); proposals zawęża skan do obszarów ruchu."""
+        def detect(area):
+            return motion.detect_in_proposals(
+                lambda rect: detection_core.detect_objects(spec.name, cascade, prepared_frame, params, rect, tile_runner), proposals, area)
+
+        if detection_regions is not None:
+            return regions.detect_in_regions(detect, prepared_frame, detection_regions)
+        return detect(roi)
+
+    def _draw_detector_areas(self, frame, detector_areas, detections_by_type):
+        """Rysuje obszary detektorów: centralne ROI (kolor zależny od detekcji) oraz strefy z konfiguracji."""
+        frame_height, frame_width = frame.shape[:2]
+        center_roi, center_detected = None, False
+        for spec, detection_regions, roi in detector_areas:
+            detected = bool(detections_by_type.get(spec.name))
+            roi_color = self.rect_roi_color_face_detected if detected else self.rect_roi_color_default
+            if detection_regions is not None:
+                self._draw_detection_regions(frame, detection_regions, roi_color if spec.roi_policy == detectors.ROI_CENTER else self._detector_color(spec))
+            elif spec.roi_policy == detectors.ROI_CENTER:
+                # Detektory z centralnym ROI dzielą ten sam prostokąt - rysowany raz
+                center_roi = roi if roi is not None else (0, 0, frame_width, frame_height)
+                center_detected = center_detected or detected
+        if center_roi is not None:
+            cv2.rectangle(frame, center_roi[:2], center_roi[2:], self.rect_roi_color_face_detected if center_detected else self.rect_roi_color_default,
+                          self.rect_roi_thickness)
+
+    def _detection_regions(self, detection_type, camera_index):
+        """Strefy detektora dla kamery z konfiguracji (None = domyślny obszar według polityki ROI detektora)."""
+        return regions.regions_for_camera(self._region_spec(detection_type), camera_index)
+
+    def _region_spec(self, detection_type):
+        """Tekst stref detektora: atrybut (twarze, tablice) albo wpis detector_params (pozostałe detektory z rejestru)."""
+        attr_name = f"{detection_type}_detection_regions"
+        return getattr(self, attr_name) if hasattr(self, attr_name) else self.detector_params.get(attr_name, "")
+
+    def _set_region_spec(self, detection_type, text):
+        attr_name = f"{detection_type}_detection_regions"
+        if hasattr(self, attr_name):
+            setattr(self, attr_name, text)
+        else:
+            self.detector_params[attr_name] = text
+        print(f"Zaktualizowano parametr '{attr_name}' na: {text} (zapisz parametry do pliku, aby zachować strefy)")
+
+    def _draw_detection_regions(self, frame, detection_regions, color):
+        """Rysuje obszary skanowane w kolorze detektora i strefy wykluczone w kolorze rect_exclusion_color."""
+        frame_height, frame_width = frame.shape[:2]
+        include, exclude = detection_regions.outlines(frame_width, frame_height)
+        cv2.polylines(frame, include, True, color, self.rect_roi_thickness)
+        if exclude:
+            cv2.polylines(frame, exclude, True, self.rect_exclusion_color, self.rect_roi_thickness)
+
+    def _begin_region_drawing(self, detection_type, is_exclusion):
+        """Włącza rysowanie prostokątnej strefy myszą na podglądzie bieżącej kamery (tryb jednej kamery)."""
+        if self.multi_camera_pipeline is not None or self.camera_index_used < 0:
+            messagebox.showinfo("Strefy detekcji", "Rysowanie stref działa w podglądzie jednej kamery.\n"
+                                "W trybie wielu kamer strefy można wpisać w oknie 'Edytuj Parametry'.")
+            return
+        self.region_drawing = {"detection_type": detection_type, "is_exclusion": is_exclusion, "start": None, "item": None}
+        self.canvas.config(cursor="crosshair")
+        self.canvas.bind("<ButtonPress-1>", self._on_region_press)
+        self.canvas.bind("<B1-Motion>", self._on_region_drag)
+        self.canvas.bind("<ButtonRelease-1>", self._on_region_release)
+        print(f"Rysowanie strefy ({'wykluczona' if is_exclusion else 'obszar'}, {detection_type}) dla kamery {self.camera_index_used}: "
+              f"przeciągnij myszą po podglądzie.")
+
+    def _on_region_press(self, event):
+        start = (self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        self.region_drawing["start"] = start
+        self.region_drawing["item"] = self.canvas.create_rectangle(*start, *start, outline="yellow", dash=(4, 2), width=2)
+
+    def _on_region_drag(self, event):
+        if self.region_drawing and self.region_drawing["item"] is not None:
+            self.canvas.coords(self.region_drawing["item"], *self.region_drawing["start"],
+                               self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+
+    def _on_region_release(self, event):
+        drawing, self.region_drawing = self.region_drawing, None
+        for sequence in ("<ButtonPress-1>", "<B1-Motion>", "<ButtonRelease-1>"):
+            self.canvas.unbind(sequence)
+        self.canvas.config(cursor="")
+        if drawing is None or drawing["start"] is None:
+            return
+        self.canvas.delete(drawing["item"])
+        if self.photo is None:
+            return
+        # Płótno pokazuje klatkę od lewego górnego rogu (ewentualnie pomniejszoną) - ułamki liczymy względem jej rozmiaru
+        shown_w, shown_h = self.photo.width(), self.photo.height()
+        (x1, y1), (x2, y2) = drawing["start"], (self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        if abs(x2 - x1) < 5 or abs(y2 - y1) < 5:
+            print("Strefa zbyt mała - pominięto.")
+            return
+        rectangle = (min(max(min(x1, x2) / shown_w, 0.0), 1.0), min(max(min(y1, y2) / shown_h, 0.0), 1.0),
+                     min(max(max(x1, x2) / shown_w, 0.0), 1.0), min(max(max(y1, y2) / shown_h, 0.0), 1.0))
+        detection_type = drawing["detection_type"]
+        self._set_region_spec(detection_type, regions.append_region_entry(self._region_spec(detection_type), self.camera_index_used,
+                                                                          rectangle, drawing["is_exclusion"]))
+
+    def _clear_camera_regions(self):
+        """Usuwa strefy bieżącej kamery (wszystkich detektorów); wpisy '*' dla wszystkich kamer pozostają."""
+        camera_index = self.multi_camera_preview if self.multi_camera_pipeline is not None else self.camera_index_used
+        if camera_index < 0:
+            return
+        for detection_type in detectors.DETECTORS:
+            region_spec = self._region_spec(detection_type)
+            if region_spec:
+                self._set_region_spec(detection_type, regions.remove_camera_entries(region_spec, camera_index))
+        print(f"Usunięto strefy kamery {camera_index}.")
+
+    def _latency_tuner_for_camera(self, camera_index):
+        """Regulator budżetu czasu danej kamery (tworzony przy pierwszym użyciu; kamera zachowuje poziom po przełączeniu)."""
+        tuner = self.latency_tuners.get(camera_index)
+        if tuner is None:
+            tuner = self.latency_tuners.setdefault(camera_index, latency_tuner.LatencyTuner(camera_index, self.latency_tuner_log_path))
+        return tuner
+
+    def _tile_thread_count(self):
+        return self.tiled_detection_threads if self.tiled_detection_threads > 0 else (os.cpu_count() or 1)
+
+    def _tile_runner_for_detection(self):
+        """Pula detekcji na kafelkach, gdy tryb jest włączony (inaczej None)."""
+        if not self.tiled_detection_enabled:
+            return None
+        with self.tile_runner_lock:
+            if self.tile_runner is None:
+                self.tile_runner = tiled_detection.TiledCascadeRunner(self._cascade_paths(), self._tile_thread_count())
+                print(f"Detekcja na kafelkach: {self.tile_runner.thread_count} wątków.")
+            return self.tile_runner
+
+    def camera_save_interval(self, camera_index):
+        """Interwał zapisu dla kamery: z camera_save_intervals lub domyślny image_save_interval_seconds."""
+        try:
+            return multi_camera.parse_camera_save_intervals(self.camera_save_intervals).get(camera_index, self.image_save_interval_seconds)
+        except ValueError:
+            return self.image_save_interval_seconds
+
+    def start_multi_camera(self):
+        """Zatrzymuje podgląd pojedynczej kamery i uruchamia jednoczesny odczyt z wielu kamer."""
+        if self.is_batch_processing:
+            messagebox.showwarning("Przetwarzanie", "Nie można zmienić kamery podczas przetwarzania wsadowego.")
+            return
+        if self.multi_camera_pipeline is not None:
+            print("Tryb wielu kamer jest już aktywny.")
+            return
+        try:
+            camera_indices = multi_camera.parse_camera_indices(self.multi_camera_indices, self.available_cameras)
+        except ValueError:
+            messagebox.showerror("Błąd parametrów", f"Nieprawidłowa lista kamer: '{self.multi_camera_indices}'.")
+            return
+        if not camera_indices:
+            messagebox.showerror("Błąd kamery", "Brak kamer do uruchomienia w trybie wielu kamer.")
+            return
+
+        self.running = False
+        if hasattr(self, 'capture_thread') and self.capture_thread and self.capture_thread.is_alive():
+            print("Oczekiwanie na zakończenie bieżącego wątku kamery...")
+            self.capture_thread.join(timeout=2.0)
+        self.capture_thread = None
+        self._flush_detection_writer()
+        if hasattr(self, 'vid') and self.vid and self.vid.isOpened():
+            print(f"Zwalnianie kamery {self.camera_index_used}...")
+            self.vid.release()
+        self.vid = None
+        self.camera_index_used = -1
+
+        print(f"Uruchamianie trybu wielu kamer: {camera_indices} (wątki detekcji: {self.multi_camera_detection_workers or len(camera_indices)}).")
+        self.multi_camera_pipeline = multi_camera.MultiCameraPipeline(
+            camera_indices, self._cascade_paths(), self.multi_camera_detection_workers, self._process_camera_stream_frame,
+            self.frame_drop_policy if self.frame_drop_policy in frame_pipeline.FRAME_DROP_POLICIES else "latest",
+            self.max_frame_age_seconds)
+        failed_indices = self.multi_camera_pipeline.start()
+        if failed_indices:
+            messagebox.showwarning("Błąd kamery", f"Nie można otworzyć kamer: {', '.join(str(i) for i in failed_indices)}.")
+        if not self.multi_camera_pipeline.streams:
+            self.stop_multi_camera()
+            return
+        self.camera_name_info = f"Kamery: {', '.join(str(stream.camera_index) for stream in self.multi_camera_pipeline.streams)}"
+        self.running = True
+
+    def stop_multi_camera(self):
+        """Zatrzymuje tryb wielu kamer (jeśli aktywny) i czeka na zapisy w tle."""
+        if self.multi_camera_pipeline is None:
+            return
+        print("Zatrzymywanie trybu wielu kamer...")
+        pipeline = self.multi_camera_pipeline
+        self.multi_camera_pipeline = None
+        pipeline.stop()
+        for camera_index, camera_stats in pipeline.stats().items():
+            print(f"  Kamera {camera_index}: przetworzono {camera_stats['processed']} klatek, pominięto {camera_stats['dropped']}.")
+        self._flush_detection_writer()
+
+    def _select_multi_camera_preview(self, camera_index):
+        self.multi_camera_preview = camera_index
+        print(f"Podgląd wielu kamer: {'kafelki' if camera_index < 0 else f'kamera {camera_index}'}")
+
+    def _multi_camera_preview_frame(self, pipeline):
+        """Klatka podglądu trybu wielu kamer: kafelki wszystkich kamer lub wybrana kamera (już w rozmiarze płótna)."""
+        selected_stream = pipeline.stream_for_camera(self.multi_camera_preview) if self.multi_camera_preview >= 0 else None
+        if selected_stream is not None:
+            if selected_stream.display_frame is None:
+                return None
+            return multi_camera.compose_tiled_preview([selected_stream.display_frame], self.width, self.height)
+        return multi_camera.compose_tiled_preview(pipeline.display_frames(), self.width, self.height)
+
+    def _display_tick(self):
+        """Pętla podglądu w wątku Tk (co 1/display_fps s): pokazuje najnowszą klatkę, jeśli pojawiła się nowa."""
+        if not hasattr(self, 'window') or not self.window.winfo_exists():
+            return
+        if self.running:
+            pipeline = self.multi_camera_pipeline
+            if pipeline is not None:
+                preview_frame = self._multi_camera_preview_frame(pipeline)
+                if preview_frame is not None:
+                    self._update_canvas(preview_frame)
+            else:
+                slot_item = self.display_slot.get(timeout=0)
+                if slot_item is not None:
+                    (display_frame, capture_time), queued_time = slot_item
+                    self.pipeline_metrics.record("ui_delay", time.time() - queued_time)
+                    self._update_canvas(display_frame, capture_time)
+                    self.display_buffers.release(display_frame)
+        self.window.after(max(1, int(1000.0 / max(self.display_fps, 1.0))), self._display_tick)
+
+    def _motion_gate_allows_detection(self, prepared_frame, current_time):
+        """Sprawdza bramkę ruchu z bieżącymi progami; True oznacza, że scena się zmieniła i trzeba wykryć obiekty."""
+        self.motion_gate.changed_fraction_threshold = self.motion_changed_fraction_threshold
+        self.motion_gate.pixel_threshold = self.motion_pixel_threshold
+        self.motion_gate.max_idle_seconds = self.motion_max_idle_seconds
+        return self.motion_gate.check(prepared_frame, current_time)
+
+    def _motion_proposals(self, prepared_frame, current_time, params):
+        """Prostokąty do przeskanowania (z bieżącymi ustawieniami) lub None, gdy przypada pełny skan klatki."""
+        self.motion_proposer.pixel_threshold = self.motion_pixel_threshold
+        self.motion_proposer.padding = self.motion_proposal_padding
+        self.motion_proposer.full_scan_seconds = self.motion_proposal_full_scan_seconds
+        keep_boxes = [box for boxes in self.last_live_detections.values() for box in boxes]
+        min_padding = max([size for name in self.cascades for size in params[f"min_{name}_size"]], default=0)
+        return self.motion_proposer.propose(prepared_frame, current_time, keep_boxes, min_padding)
+
+    def _track_between_keyframes(self, prepared_frame, current_time):
+        """Zwraca detekcje przesunięte trackerem lub None, gdy trzeba uruchomić pełne kaskady (klatka kluczowa)."""
+        self.frames_since_keyframe += 1
+        if self.frames_since_keyframe >= self.tracking_keyframe_interval:
+            return None
+        if self.tracking_keyframe_max_seconds > 0 and current_time - self.last_keyframe_time >= self.tracking_keyframe_max_seconds:
+            return None
+        self.detection_tracker.min_tracked_ratio = self.tracking_min_points_ratio
+        tracked_detections = self.detection_tracker.update(prepared_frame.gray)
+        if tracked_detections is None:
+            # Ramka zgubiona lub dryfuje - wymuszamy wcześniejszą pełną detekcję
+            self.tracking_early_redetections += 1
+        return tracked_detections
+
+    def _save_detection_crop(self, detection_type, box, confidence, detection_index, frame_for_saving, current_time, is_live_feed, source_details, camera_index=None):
+        """Wycina i normalizuje detekcję, a zapis PNG + JSON zleca wątkom w tle. Zwraca True, jeśli zapis przyjęto do kolejki.
+
+        camera_index (tryb wielu kamer) zastępuje indeks aktywnej kamery w nazwie pliku i metadanych.
+        """
+        if camera_index is None:
+            camera_index = self.camera_index_used
+        spec = detectors.DETECTORS[detection_type]
+        params = self._detection_params()
+        padding, target_width, output_dir, label = params[f"{detection_type}_save_padding"], params[f"target_{detection_type}_width"], spec.save_dir, spec.label
+
+        normalized = detection_core.crop_and_normalize(frame_for_saving, box, padding, target_width)
+        if normalized is None:
+            return False
+        resized_img, saved_w, saved_h = normalized
+
+        try:
+            extension, encode_params, image_encoding = detection_core.crop_encoding(params, detection_type)
+        except ValueError as e:
+            print(f"  Ostrzeżenie: {e} Używanie PNG.")
+            extension, encode_params, image_encoding = ".png", [], {"format": "png"}
+
+        base_name = os.path.splitext(source_details["original_filename"])[0] if source_details else "live"
+        png_filename = f"{base_name}_{detection_type}_{detection_index if source_details else camera_index}_{int(current_time)}{extension}"
+        png_filepath = os.path.join(output_dir, png_filename)
+        json_filepath = os.path.join(output_dir, os.path.splitext(png_filename)[0] + ".json")
+
+        if source_details:
+            source_info = {k: v for k, v in source_details.items() if k != 'saved_detections_count_ref'}
+        else:
+            source_info = {"source_type": "live_camera", "timestamp": int(current_time), "camera_index": camera_index}
+        json_data = detection_core.build_detection_json(detection_type, confidence, box, png_filename, saved_w, saved_h, padding, source_info, target_width, image_encoding)
+
+        # Kodowanie (PNG/JPEG/WebP) odbywa się w wątkach zapisu, nie w pętli detekcji
+        if not self.detection_writer.submit(png_filepath, resized_img, json_filepath, json_data, encode_params):
+            return False
+        print(f"  Zapisano {label} (w tle): {png_filepath} (pewność: {confidence:.2f})")
+        if not is_live_feed and 'saved_detections_count_ref' in source_details: source_details['saved_detections_count_ref'][0] +=1
+        return True
+
 
     def _process_image_folder_thread_worker(self):
         print("Rozpoczęto wątek przetwarzania folderu obrazów.")
         images_folder_path = "images"
         processed_files_count = 0 
-        saved_detections_count_batch = [0] 
+        saved_detections_count_batch = 0
         e_batch_to_report = None 
+        dedup = None
+        manifest = None
+        detector_costs = detectors.DetectorCostReport()
 
         try:
-            image_files = [f for f in os.listdir(images_folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
-            total_files = len(image_files)
-            print(f"Znaleziono {total_files} obrazów do przetworzenia.")
-
-            for file_idx, filename in enumerate(image_files):
-                try: 
-                    if not self.is_batch_processing: 
+            image_files = detection_core.list_image_files(images_folder_path)
+            params = self._detection_params()
+            image_paths = [os.path.join(images_folder_path, f) for f in image_files]
+            manifest = batch_engine.open_batch_manifest(params)
+            if manifest is not None:
+                image_paths = manifest.pending_tasks(image_paths)
+            total_files = len(image_paths)
+            print(f"Znaleziono {len(image_files)} obrazów, do przetworzenia: {total_files}.")
+
+            if total_files > 0:
+                worker_count = batch_engine.resolve_worker_count(self.batch_worker_processes, total_files)
+                dedup = batch_engine.open_dedup_cache(params)
+                results = batch_engine.process_files_in_pool(
+                    image_paths, params, self._cascade_paths(), worker_count, should_continue=lambda: self.is_batch_processing, dedup=dedup)
+
+                # Jedyny wątek piszący: zapis wycinków i JSON oraz liczniki są obsługiwane tylko tutaj.
+                for result in results:
+                    processed_files_count += 1
+                    batch_engine.record_detector_costs(detector_costs, result)
+                    print(f"\nPrzetworzono obraz ({processed_files_count}/{total_files}): {result['filename']}")
+                    if result["error"]:
+                        print(f"  !! Błąd podczas przetwarzania pliku {result['filename']}: {result['error']}")
+                    else:
+                        saved_detections_count_batch += batch_engine.write_batch_result(
+                            result, params, dedup=dedup, store=self.detection_store, crop_output=self.crop_output_writer)
+                        if manifest is not None:
+                            manifest.mark_processed(result["image_path"], batch_engine.saved_counts_by_detector(result))
+                    if not self.is_batch_processing:
                         print("Przetwarzanie wsadowe przerwane.")
                         break
-                    
-                    image_path = os.path.join(images_folder_path, filename)
-                    print(f"\nPrzetwarzanie obrazu ({file_idx+1}/{total_files}): {filename}")
-                    
-                    frame = cv2.imread(image_path)
-                    if frame is None or frame.size == 0: 
-                        print(f"  Nie można wczytać obrazu lub obraz jest pusty: {filename}")
-                        continue 
-                    
-                    frame_for_saving = frame.copy()
-                    current_image_height, current_image_width = frame.shape[:2]
-                    current_processing_time = time.time() 
-
-                    source_details_batch = {
-                        "source_type": "image_file", 
-                        "original_filename": filename,
-                        "original_image_width": current_image_width,
-                        "original_image_height": current_image_height,
-                        "timestamp": int(current_processing_time), 
-                        "camera_index": -1,
-                        "saved_detections_count_ref": saved_detections_count_batch 
-                    }
-                    
-                    self.face_detected_in_roi_flag = False 
-                    self.plate_detected_flag = False
-                    
-                    _ = self._process_and_draw_detections(frame, frame_for_saving, current_processing_time, is_live_feed=False, source_details=source_details_batch)
-                    
-                except Exception as e_file_processing: 
-                    print(f"  !! Ogólny błąd podczas przetwarzania pliku {filename}: {e_file_processing}")
-                    traceback.print_exc() 
-                finally:
-                    processed_files_count +=1 
         
         except Exception as e_batch_outer: 
             e_batch_to_report = e_batch_outer 
             print(f"Poważny błąd podczas przetwarzania wsadowego: {e_batch_to_report}")
             traceback.print_exc()
         finally:
+            self._flush_detection_writer()
             self.is_batch_processing = False
-            final_message = f"Zakończono przetwarzanie folderu 'images'.\nPrzetworzono plików: {processed_files_count}.\nZapisano detekcji: {saved_detections_count_batch[0]}." 
+            final_message = f"Zakończono przetwarzanie folderu 'images'.\nPrzetworzono plików: {processed_files_count}.\nZapisano detekcji: {saved_detections_count_batch}." 
+            if dedup is not None:
+                dedup.save()
+                final_message += f"\nPominięto duplikatów plików: {dedup.skipped_inputs_count}, wycinków: {dedup.skipped_crops_count}."
+            if manifest is not None:
+                manifest.save()
+                if manifest.skipped_files_count:
+                    final_message += f"\nPominięto plików przetworzonych wcześniej: {manifest.skipped_files_count}."
             print(final_message)
-            
-            if hasattr(self, 'window') and self.window.winfo_exists():
-                self.window.after(0, lambda: self.camera_menu.entryconfig("Przetwórz folder 'images'", state="normal"))
-                if self.available_cameras:
-                     for i_cam in self.available_cameras:
-                        self.window.after(0, lambda cam_idx=i_cam: self.camera_menu.entryconfig(f"Kamera {cam_idx}", state="normal"))
-                
-                if e_batch_to_report: 
-                     self.window.after(0, lambda err=e_batch_to_report: messagebox.showerror("Błąd przetwarzania", f"Wystąpił błąd: {err}"))
-                
-                self.window.after(0, lambda: messagebox.showinfo("Zakończono", final_message))
+            self._print_detector_costs(detector_costs, "Koszt detektorów (folder 'images'):")
+            self._leave_batch_mode(final_message, e_batch_to_report)
+
+    def _process_video_file_thread_worker(self, video_path):
+        print(f"Rozpoczęto wątek przetwarzania pliku wideo: {video_path}")
+        processed_segments_count = 0
+        processed_frames_count = 0
+        stream_seconds = 0.0
+        saved_detections_count_video = 0
+        e_video_to_report = None
+        start_time = time.time()
+        detector_costs = detectors.DetectorCostReport()
 
-                if self.camera_index_to_resume != -1:
-                    print(f"Wznawianie kamery {self.camera_index_to_resume}...")
-                    self.window.after(100, lambda idx=self.camera_index_to_resume: self.switch_camera(idx))
-                else:
-                    if hasattr(self, 'info_label_text'):
-                        self.info_label_text.set("Przetwarzanie zakończone. Wybierz kamerę z menu.")
-                    if hasattr(self, 'canvas') and self.canvas: 
-                        self.canvas.delete("all")
-                        self.canvas.config(bg="black") 
+        try:
+            params = self._detection_params()
+            segment_results = batch_engine.process_videos_in_pool(
+                [video_path], params, self._cascade_paths(), self.batch_worker_processes, should_continue=lambda: self.is_batch_processing)
+
+            # Odcinki przychodzą po kolei (process_videos_in_pool buforuje te ukończone wcześniej); zapis i liczniki tylko w tym wątku.
+            for result in segment_results:
+                processed_segments_count += 1
+                processed_frames_count += result["frames_processed"]
+                batch_engine.record_detector_costs(detector_costs, result)
+                stream_seconds += result["frames_read"] / result["fps"]
+                print(f"\nPrzetworzono odcinek {result['segment_index']} pliku {result['filename']} "
+                      f"(klatki {result['start_frame']}-{result['start_frame'] + result['frames_read']}, analizowanych: {result['frames_processed']})")
+                if result["error"]:
+                    print(f"  !! Błąd podczas przetwarzania odcinka {result['segment_index']}: {result['error']}")
+                saved_detections_count_video += batch_engine.write_video_segment_result(
+                    result, params, store=self.detection_store, crop_output=self.crop_output_writer)
+                if not self.is_batch_processing:
+                    print("Przetwarzanie wideo przerwane.")
+                    break
+
+        except Exception as e_video_outer:
+            e_video_to_report = e_video_outer
+            print(f"Poważny błąd podczas przetwarzania wideo: {e_video_to_report}")
+            traceback.print_exc()
+        finally:
+            self.is_batch_processing = False
+            elapsed = time.time() - start_time
+            final_message = (f"Zakończono przetwarzanie pliku '{os.path.basename(video_path)}'.\n"
+                             f"Odcinków: {processed_segments_count}, analizowanych klatek: {processed_frames_count}.\n"
+                             f"Nagranie: {stream_seconds:.1f} s, czas przetwarzania: {elapsed:.1f} s.\n"
+                             f"Zapisano detekcji: {saved_detections_count_video}.")
+            print(final_message)
+            self._print_detector_costs(detector_costs, "Koszt detektorów (wideo):")
+            self._leave_batch_mode(final_message, e_video_to_report)
+
+    def _leave_batch_mode(self, final_message, error_to_report):
+        """Odblokowuje menu, pokazuje podsumowanie i wznawia kamerę po przetwarzaniu wsadowym."""
+        if self.is_closing:
+            # quit_app czeka na ten wątek w wątku Tk - wywołania Tk stąd blokowałyby się do końca limitu czasu
+            return
+        if hasattr(self, 'window') and self.window.winfo_exists():
+            self.window.after(0, lambda: self.camera_menu.entryconfig("Przetwórz folder 'images'", state="normal"))
+            self.window.after(0, lambda: self.camera_menu.entryconfig("Przetwórz plik wideo...", state="normal"))
+            if self.available_cameras:
+                 for i_cam in self.available_cameras:
+                    self.window.after(0, lambda cam_idx=i_cam: self.camera_menu.entryconfig(f"Kamera {cam_idx}", state="normal"))
+            
+            if error_to_report: 
+                 self.window.after(0, lambda err=error_to_report: messagebox.showerror("Błąd przetwarzania", f"Wystąpił błąd: {err}"))
+            
+            self.window.after(0, lambda: messagebox.showinfo("Zakończono", final_message))
+
+            if self.resume_multi_camera:
+                print("Wznawianie trybu wielu kamer...")
+                self.window.after(100, self.start_multi_camera)
+            elif self.camera_index_to_resume != -1:
+                print(f"Wznawianie kamery {self.camera_index_to_resume}...")
+                self.window.after(100, lambda idx=self.camera_index_to_resume: self.switch_camera(idx))
+            else:
+                if hasattr(self, 'info_label_text'):
+                    self.info_label_text.set("Przetwarzanie zakończone. Wybierz kamerę z menu.")
+                if hasattr(self, 'canvas') and self.canvas: 
+                    self.canvas.delete("all")
+                    self.canvas.config(bg="black") 
 
 
-    def _update_canvas(self, cv2image_rgb_with_info): 
+    def _update_canvas(self, frame_bgr, capture_time=None): 
+        """Pokazuje klatkę BGR na płótnie: skaluje do rozmiaru płótna przed konwersją i wykorzystuje ponownie jeden PhotoImage."""
         if not self.running or not hasattr(self, 'canvas') or not self.canvas.winfo_exists():
             return
         try:
-            self.photo = ImageTk.PhotoImage(image=Image.fromarray(cv2image_rgb_with_info))
-            if self.canvas_image_item is None: 
-                self.canvas_image_item = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+            update_start = time.perf_counter()
+            frame_h, frame_w = frame_bgr.shape[:2]
+            ratio = min(self.width / float(frame_w), self.height / float(frame_h)) if self.width > 0 and self.height > 0 else 1.0
+            if ratio < 1.0:
+                frame_bgr = cv2.resize(frame_bgr, (max(1, int(frame_w * ratio)), max(1, int(frame_h * ratio))), interpolation=cv2.INTER_AREA)
+            convert_start = time.perf_counter()
+            preview_image = Image.fromarray(cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB))
+            self.pipeline_metrics.record("to_rgb", time.perf_counter() - convert_start)
+            if self.photo is not None and (self.photo.width(), self.photo.height()) == preview_image.size:
+                self.photo.paste(preview_image)
             else:
-                self.canvas.itemconfig(self.canvas_image_item, image=self.photo)
-            self.canvas.update_idletasks()
+                self.photo = ImageTk.PhotoImage(image=preview_image)
+                if self.canvas_image_item is None: 
+                    self.canvas_image_item = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+                else:
+                    self.canvas.itemconfig(self.canvas_image_item, image=self.photo)
             
-            info_str_label = f"FPS: {self.current_fps:.1f} | {self.camera_name_info} | Rozdz: {self.width}x{self.height}"
-            detection_info = []
-            if hasattr(self, 'face_detected_in_roi_flag') and self.face_detected_in_roi_flag:
-                detection_info.append("TWARZ W ROI")
-            if hasattr(self, 'plate_detected_flag') and self.plate_detected_flag:
-                detection_info.append("TABLICA REJ.")
+            if self.multi_camera_pipeline is not None:
+                camera_stats = self.multi_camera_pipeline.stats()
+                info_str_label = f"{self.camera_name_info} | " + " | ".join(
+                    f"Kam. {i}: {stats['fps']:.1f} FPS, pominięte {stats['dropped']}" for i, stats in camera_stats.items())
+            else:
+                info_str_label = f"FPS: {self.current_fps:.1f} | {self.camera_name_info} | Rozdz: {self.width}x{self.height} | Pominięte: {self.dropped_frames_count}"
+            detected_types = self.detected_types
+            detection_info = [detectors.DETECTORS[name].alert_text for name in self.cascades if name in detected_types]
             
             if detection_info:
                 info_str_label += " | " + " & ".join(detection_info) + "!"
+            ingest = self.hot_folder_ingest
+            if ingest is not None:
+                ingest_stats = ingest.stats()
+                info_str_label += f" | Folder: przetworzono {ingest_stats['processed']}, kolejka {ingest_stats['queued']}/{ingest_stats['queue_capacity']}"
+            writer_stats = self.detection_writer.stats()
+            info_str_label += f" | Zapis: kolejka {writer_stats['queue_depth']}/{writer_stats['queue_capacity']}, odrzucone {writer_stats['dropped']}"
             self.info_label_text.set(info_str_label)
+            self.pipeline_metrics.record("ui_update", time.perf_counter() - update_start)
+            if capture_time is not None:
+                self.pipeline_metrics.record("end_to_end", time.time() - capture_time)
 
         except Exception as e:
             if isinstance(e, tk.TclError) and "invalid command name" in str(e):
@@ -843,14 +1717,12 @@ class CameraApp:
                 traceback.print_exc()
 
 
-    def video_capture_loop(self):
-        print(f"Rozpoczęto pętlę przechwytywania wideo dla kamery {self.camera_index_used}.")
-        
-        self.face_detected_in_roi_flag = False
-        self.plate_detected_flag = False
-        
+    def _frame_grab_loop(self, frame_slot):
+        """Wątek przechwytywania: odczytuje klatki z kamery i umieszcza najnowszą w slocie detekcji."""
+        print(f"Rozpoczęto wątek odczytu klatek dla kamery {self.camera_index_used}.")
+        capture_shape = None
         try:
-            while self.running: 
+            while self.running:
                 if not self.vid or not self.vid.isOpened():
                     if self.running: 
                         if hasattr(self, 'window') and self.window.winfo_exists():
@@ -858,7 +1730,12 @@ class CameraApp:
                     time.sleep(0.5) 
                     continue 
 
-                ret, frame = self.vid.read()
+                read_start = time.perf_counter()
+                if capture_shape is not None:
+                    ret, frame = self.vid.read(self.capture_buffers.acquire(capture_shape))
+                else:
+                    ret, frame = self.vid.read()
+                self.pipeline_metrics.record("capture_read", time.perf_counter() - read_start)
                 if not ret: 
                     if self.running:
                         print(f"Błąd odczytu klatki z kamery {self.camera_index_used} (ret=False).")
@@ -867,12 +1744,47 @@ class CameraApp:
                     time.sleep(0.1)
                     continue
 
-                frame_for_saving = frame.copy() 
-                current_time_for_saving = time.time()
+                capture_shape = frame.shape
+                frame.flags.writeable = False # Surowa klatka: nakładki trafiają wyłącznie do bufora podglądu
+                frame_slot.put(frame, time.time())
+        except Exception as e:
+            print(f"Błąd w wątku odczytu klatek kamery {self.camera_index_used}: {e}")
+            traceback.print_exc()
+        finally:
+            frame_slot.close()
+
+
+    def video_capture_loop(self):
+        print(f"Rozpoczęto pętlę przechwytywania wideo dla kamery {self.camera_index_used}.")
+        
+        self.detected_types = set()
+
+        # Odczyt z kamery działa we własnym wątku; detekcja zawsze bierze najświeższą klatkę ze slotu.
+        if self.vid and self.vid.isOpened():
+            self.vid.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Nie wszystkie backendy to obsługują - wtedy ignorowane
+        if self.frame_drop_policy not in frame_pipeline.FRAME_DROP_POLICIES:
+            print(f"Ostrzeżenie: Nieznana polityka odrzucania klatek '{self.frame_drop_policy}'. Używanie 'latest'.")
+            self.frame_drop_policy = "latest"
+        frame_slot = frame_pipeline.LatestFrameSlot(self.frame_drop_policy, self.max_frame_age_seconds, on_drop=self.capture_buffers.release)
+        self.frame_slot = frame_slot
+        frame_grab_thread = threading.Thread(target=self._frame_grab_loop, args=(frame_slot,), daemon=True)
+        frame_grab_thread.start()
+        
+        try:
+            while self.running: 
+                slot_item = frame_slot.get(timeout=0.5)
+                if slot_item is None:
+                    continue
+                frame_for_saving, current_time_for_saving = slot_item
+                self.pipeline_metrics.record("frame_age", time.time() - current_time_for_saving)
+
+                # Nakładki rysujemy na buforze podglądu; surowa klatka pozostaje nietknięta dla zapisu wycinków
+                frame = self.display_buffers.acquire(frame_for_saving.shape)
+                np.copyto(frame, frame_for_saving)
                 
                 self.fps_counter += 1
-                self.face_detected_in_roi_flag = False 
-                self.plate_detected_flag = False
+                self.detected_types = set()
+                self.dropped_frames_count = frame_slot.dropped_frames_count
 
 
                 elapsed_time = time.time() - self.fps_start_time
@@ -880,29 +1792,64 @@ class CameraApp:
                     self.current_fps = self.fps_counter / elapsed_time
                     self.fps_counter = 0
                     self.fps_start_time = time.time()
+                    self._refresh_metrics_overlay()
                 
                 frame = self._process_and_draw_detections(frame, frame_for_saving, current_time_for_saving, is_live_feed=True)
+                # Zapisy mają już własne kopie wycinków, więc surowy bufor może wrócić do puli
+                self.capture_buffers.release(frame_for_saving)
 
-                cv2image_rgb_with_info = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                
-                if self.running and hasattr(self, 'window') and self.window.winfo_exists():
-                    self.window.after(0, self._update_canvas, cv2image_rgb_with_info.copy())
+                # Bez konwersji i kopii: wątek Tk pobierze najnowszą klatkę i przeskaluje ją przed konwersją do RGB
+                self.display_slot.put((frame, current_time_for_saving), time.time())
+
+                self.pipeline_metrics.set_gauge("dropped_frames", frame_slot.dropped_frames_count)
+                writer_stats = self.detection_writer.stats()
+                self.pipeline_metrics.set_gauge("writer_queue", writer_stats["queue_depth"])
+                self.pipeline_metrics.set_gauge("writer_dropped", writer_stats["dropped"])
+                self.pipeline_metrics.set_gauge("display_skipped_frames", self.display_slot.dropped_frames_count)
             
-            print(f"Pętla przechwytywania wideo dla kamery {self.camera_index_used} zakończona (self.running={self.running}).")
+            print(f"Pętla przechwytywania wideo dla kamery {self.camera_index_used} zakończona (self.running={self.running}). Pominięte klatki: {frame_slot.dropped_frames_count}/{frame_slot.captured_frames_count}.")
 
         except Exception as e:
             print(f"Wystąpił krytyczny błąd w wątku kamery {self.camera_index_used}: {e}")
             traceback.print_exc()
             if self.running and hasattr(self, 'window') and self.window.winfo_exists(): 
                  self.window.after(0, messagebox.showerror, "Błąd wątku kamery", f"Krytyczny błąd w wątku kamery: {e}")
+        finally:
+            # Zatrzymanie wątku odczytu razem z pętlą detekcji - switch_camera/quit_app czekają tylko na capture_thread
+            frame_grab_thread.join(timeout=1.0)
 
     def quit_app(self):
         print("Zamykanie aplikacji...")
+        self.is_closing = True
         self.running = False 
         self.is_batch_processing = False 
         if hasattr(self, 'capture_thread') and self.capture_thread and self.capture_thread.is_alive():
             print("Oczekiwanie na zakończenie wątku kamery przy zamykaniu...")
             self.capture_thread.join(timeout=1.0) 
+        self.stop_multi_camera()
+        self.stop_hot_folder_ingest()
+        if self.batch_thread is not None and self.batch_thread.is_alive():
+            # Bieżący wynik jest jeszcze zapisywany (wycinki, metadane, manifest) - baza i archiwum muszą być otwarte
+            print("Oczekiwanie na zakończenie przetwarzania wsadowego...")
+            self.batch_thread.join(timeout=BATCH_THREAD_JOIN_TIMEOUT_SECONDS)
+            if self.batch_thread.is_alive():
+                print("Ostrzeżenie: Przetwarzanie wsadowe nie zakończyło się w czasie - ostatnie wyniki mogą nie zostać zapisane.")
+        self._print_detector_costs(self.detector_costs, "Koszt detektorów (podgląd na żywo):")
+        if hasattr(self, 'detection_writer'):
+            print("Oczekiwanie na zakończenie zapisów w tle...")
+            self.detection_writer.close()
+            self._print_writer_stats()
+            dropped_count = self.detection_writer.stats()["dropped"]
+            if dropped_count and hasattr(self, 'window') and self.window.winfo_exists():
+                messagebox.showwarning("Zapis w tle", f"Kolejka zapisu była pełna: odrzucono {dropped_count} wycinków (bez zapisu wycinka i metadanych).\n"
+                                       "Zwiększ writer_queue_size, writer_threads lub writer_submit_timeout_seconds w config.json.")
+        if getattr(self, 'detection_store', None) is not None:
+            self.detection_store.close()
+            print(f"Baza detekcji {self.detection_store.db_path}: zapisano {self.detection_store.inserted_count} detekcji.")
+        if getattr(self, 'crop_output_writer', None) is not None:
+            self.crop_output_writer.close()
+        if self.tile_runner is not None:
+            self.tile_runner.close()
         if hasattr(self, 'vid') and self.vid and self.vid.isOpened(): 
             print("Zwalnianie kamery przy zamykaniu...")
             self.vid.release()
@@ -0,0 +1,119 @@
+import os
+import queue
+import threading
+import time
+
+import crop_archive
+import detection_core
+import detection_store
+
+# Asynchroniczne kodowanie i zapis wycinków (PNG/JPEG/WebP; pliki lub archiwum crop_archive) i metadanych (baza detekcji i/lub JSON) poza wątkiem detekcji.
+# Wątki zapisu tworzą pulę koderów: cv2.imencode zwalnia GIL, więc kodowanie kilku wycinków przebiega równolegle.
+# Kolejka jest ograniczona: gdy jest pełna, submit czeka najwyżej submit_timeout sekund na miejsce, a potem
+# odrzuca zadanie i je liczy (dropped) - zapis jest więc stratny przy trwałym przeciążeniu dysku, ale nie zatrzymuje
+# detekcji na dłużej niż ten limit. Liczba odrzuconych jest widoczna w stats() (pasek stanu, nakładka metryk).
+
+
+class DetectionWriter:
+    """Pula wątków kodujących i zapisujących detekcje z ograniczoną kolejką i metrykami przeciążenia.
+
+    Zapis jest stratny: przy pełnej kolejce (po submit_timeout) wycinek i jego metadane są odrzucane.
+    """
+
+    def __init__(self, worker_count=2, max_queue_size=32, store=None, metadata_format="sqlite", crop_output=None, submit_timeout=0.0):
+        self.store = store
+        self.submit_timeout = max(0.0, submit_timeout)
+        self.metadata_format = metadata_format
+        self.crop_output = crop_output if crop_output is not None else crop_archive.DirectoryCropOutput()
+        self._queue = queue.Queue(maxsize=max(1, max_queue_size))
+        self._stats_lock = threading.Lock()
+        self.submitted_count = 0
+        self.written_count = 0
+        self.dropped_count = 0
+        self.failed_count = 0
+        self.max_queue_depth = 0
+        self.total_write_time = 0.0
+        self._workers = []
+        for i in range(max(1, worker_count)):
+            worker = threading.Thread(target=self._worker_loop, name=f"DetectionWriter-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, png_filepath, image, json_filepath=None, json_data=None, encode_params=None):
+        """Dodaje zadanie zapisu, czekając na miejsce w kolejce najwyżej submit_timeout sekund.
+
+        Zwraca False, jeśli kolejka była pełna przez cały ten czas - zadanie (wycinek i metadane) jest wtedy odrzucane.
+
+        image może być tablicą obrazu (kodowaną tutaj w formacie wynikającym z rozszerzenia pliku,
+        z parametrami encode_params dla cv2.imencode) lub gotowymi bajtami pliku.
+        """
+        try:
+            self._queue.put((png_filepath, image, json_filepath, json_data, encode_params), timeout=self.submit_timeout or None,
+                            block=self.submit_timeout > 0)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped_count += 1
+            print(f"  Ostrzeżenie: Kolejka zapisu pełna - pominięto {png_filepath}")
+            return False
+        with self._stats_lock:
+            self.submitted_count += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return True
+
+    def _worker_loop(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                self._write(*task)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, png_filepath, image, json_filepath, json_data, encode_params):
+        start_time = time.time()
+        try:
+            if not isinstance(image, bytes):
+                image = detection_core.encode_crop(image, os.path.splitext(png_filepath)[1], encode_params or [])
+                if image is None:
+                    raise IOError(f"cv2.imencode nie zakodował wycinka {png_filepath}")
+            archive_location = self.crop_output.write(png_filepath, image)
+            if json_filepath is not None:
+                if archive_location is not None:
+                    json_data["saved_image_details"]["archive"] = archive_location
+                detection_store.write_detection_metadata(json_data, json_filepath, png_filepath, self.store, self.metadata_format)
+            with self._stats_lock:
+                self.written_count += 1
+                self.total_write_time += time.time() - start_time
+        except Exception as e:
+            with self._stats_lock:
+                self.failed_count += 1
+            print(f"  Błąd zapisu w tle {png_filepath}: {e}")
+
+    def flush(self):
+        """Czeka, aż wszystkie zlecone zapisy zostaną zakończone."""
+        self._queue.join()
+
+    def close(self):
+        """Opróżnia kolejkę i zatrzymuje wątki zapisujące."""
+        self.flush()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=2.0)
+        self._workers = []
+
+    def stats(self):
+        """Zwraca metryki: głębokość kolejki, liczniki zadań i średni czas zapisu."""
+        with self._stats_lock:
+            avg_write_ms = (self.total_write_time / self.written_count * 1000.0) if self.written_count else 0.0
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "max_queue_depth": self.max_queue_depth,
+                "submitted": self.submitted_count,
+                "written": self.written_count,
+                "dropped": self.dropped_count,
+                "failed": self.failed_count,
+                "avg_write_ms": avg_write_ms,
+            }
@@ -0,0 +1,329 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+import detection_core
+import detectors
+import batch_engine
+import detection_store
+import crop_archive
+import hot_folder
+
+# Tryb wsadowy bez GUI: python -m batch_cli images/ [plik.jpg film.mp4 ...] --output detekcje.jsonl
+# Nie importuje tkinter/PIL i nie sprawdza kamer. Każda detekcja trafia jako jedna linia JSON
+# na stdout (lub do pliku) od razu po otrzymaniu wyniku z procesu roboczego (dla filmów - odcinka).
+# Z --watch katalogi są obserwowane bez końca (Ctrl+C kończy), a nowe obrazy przetwarzane zaraz po zapisaniu.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _parse_size(value):
+    """Parsuje rozmiar w formacie 'szer,wys'."""
+    parts = value.split(',')
+    if len(parts) != 2:
+        raise argparse.ArgumentTypeError(f"Nieprawidłowy format rozmiaru '{value}'. Oczekiwano 'liczba,liczba'.")
+    return int(parts[0].strip()), int(parts[1].strip())
+
+
+def _parse_bool(value):
+    """Parsuje wartość logiczną: tak/nie, true/false, 1/0."""
+    normalized_value = value.strip().lower()
+    if normalized_value not in ("tak", "nie", "true", "false", "1", "0"):
+        raise argparse.ArgumentTypeError(f"Nieprawidłowa wartość logiczna '{value}'. Oczekiwano 'tak' lub 'nie'.")
+    return normalized_value in ("tak", "true", "1")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="batch_cli",
+        description="Detekcja twarzy i tablic rejestracyjnych w obrazach bez GUI (wynik JSONL).")
+    parser.add_argument("inputs", nargs="*", help="Pliki obrazów, pliki wideo lub katalogi (domyślnie: 'images').")
+    parser.add_argument("--file-list", help="Plik z listą ścieżek obrazów (jedna na linię, '-' = stdin).")
+    parser.add_argument("--config", default=detection_core.CONFIG_FILEPATH, help="Plik konfiguracyjny JSON (domyślnie: config.json).")
+    parser.add_argument("--output", "-o", default="-", help="Plik wyjściowy JSONL ('-' = stdout).")
+    parser.add_argument("--output-dir", default=".", help="Katalog, w którym powstaną podkatalogi wycinków ('faces', 'plates', ...).")
+    parser.add_argument("--no-save", action="store_true", help="Nie zapisuj wycinków PNG/JSON, tylko strumień JSONL.")
+    parser.add_argument("--watch", action="store_true",
+                        help="Obserwuj katalogi (lub hot_folder_paths) i przetwarzaj nowe obrazy na bieżąco (Ctrl+C kończy).")
+    parser.add_argument("--workers", type=int, default=None, help="Liczba procesów roboczych (0 = wszystkie rdzenie).")
+    parser.add_argument("--no-faces", action="store_true", help="Wyłącz detekcję twarzy.")
+    parser.add_argument("--no-plates", action="store_true", help="Wyłącz detekcję tablic rejestracyjnych.")
+    parser.add_argument("--face-cascade", default=None, help="Plik kaskady twarzy (domyślnie z rejestru detektorów).")
+    parser.add_argument("--plate-cascade", default=None, help="Plik kaskady tablic (domyślnie z rejestru detektorów).")
+
+    # Każdy parametr detekcji z config.json (także detektorów z rejestru) można nadpisać flagą,
+    # np. --face-detection-min-neighbors 4 albo --enabled-detectors face,plate,eye
+    overrides = parser.add_argument_group("parametry detekcji (nadpisują config.json)")
+    for key, default_value in detectors.with_detector_defaults(detection_core.DEFAULT_DETECTION_PARAMS).items():
+        if key == "batch_worker_processes":
+            continue
+        if isinstance(default_value, tuple):
+            arg_type = _parse_size
+        elif isinstance(default_value, bool):
+            arg_type = _parse_bool
+        else:
+            arg_type = type(default_value)
+        overrides.add_argument(f"--{key.replace('_', '-')}", dest=key, type=arg_type, default=None,
+                               help=f"(domyślnie: {default_value})")
+    return parser
+
+
+def collect_image_paths(inputs, file_list):
+    """Rozwija katalogi i listę plików do listy ścieżek obrazów i filmów."""
+    image_paths = []
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            image_paths.extend(os.path.join(input_path, f) for f in sorted(detection_core.list_image_files(input_path)))
+            image_paths.extend(os.path.join(input_path, f) for f in sorted(detection_core.list_video_files(input_path)))
+        else:
+            image_paths.append(input_path)
+    if file_list == "-":
+        image_paths.extend(line.strip() for line in sys.stdin if line.strip())
+    elif file_list:
+        with open(file_list, "r", encoding="utf-8") as f:
+            image_paths.extend(line.strip() for line in f if line.strip())
+    return image_paths
+
+
+def detection_records(result):
+    """Zamienia wynik procesu roboczego na rekordy JSONL (jeden na detekcję)."""
+    saved_paths = {(s["detection_type"], s["index"]): s.get("png_filepath") for s in result["saves"]}
+    for detection in result["detections"]:
+        x, y, w, h = detection["box"]
+        yield {
+            "source_type": "image_file",
+            "source_path": result["image_path"],
+            "original_filename": result["filename"],
+            "original_image_width": result["width"],
+            "original_image_height": result["height"],
+            "timestamp": int(result["timestamp"]),
+            "detection_type": detection["detection_type"],
+            "detection_index": detection["index"],
+            "box": {"x": x, "y": y, "width": w, "height": h},
+            "confidence_score": round(detection["confidence"], 4),
+            "saved_png": saved_paths.get((detection["detection_type"], detection["index"]))
+        }
+
+
+def video_detection_records(result):
+    """Zamienia wynik odcinka filmu na rekordy JSONL (jeden na detekcję w przetworzonej klatce)."""
+    for frame_result in result["frames"]:
+        saved_paths = {(s["detection_type"], s["index"]): s.get("png_filepath") for s in frame_result["saves"]}
+        for detection in frame_result["detections"]:
+            x, y, w, h = detection["box"]
+            yield {
+                "source_type": "video_file",
+                "source_path": result["video_path"],
+                "original_filename": result["filename"],
+                "original_image_width": frame_result["width"],
+                "original_image_height": frame_result["height"],
+                "frame_index": frame_result["frame_index"],
+                "stream_timestamp_ms": frame_result["stream_timestamp_ms"],
+                "detection_type": detection["detection_type"],
+                "detection_index": detection["index"],
+                "box": {"x": x, "y": y, "width": w, "height": h},
+                "confidence_score": round(detection["confidence"], 4),
+                "saved_png": saved_paths.get((detection["detection_type"], detection["index"]))
+            }
+
+
+def resolve_cascade_paths(args, params):
+    """Ścieżki kaskad {detektor: ścieżka} włączonych detektorów; --face-cascade/--plate-cascade zastępują ścieżki z rejestru."""
+    specs = detectors.configured_detectors(params)
+    if args.no_faces:
+        specs = [spec for spec in specs if spec.name != "face"]
+    if args.no_plates:
+        specs = [spec for spec in specs if spec.name != "plate"]
+    return detectors.cascade_paths(specs, SCRIPT_DIR, {"face": args.face_cascade, "plate": args.plate_cascade})
+
+
+def make_output_dirs(params, output_dir):
+    for spec in detectors.configured_detectors(params):
+        os.makedirs(os.path.join(output_dir, spec.save_dir), exist_ok=True)
+
+
+def run(args, jsonl_stream):
+    """Przetwarza obrazy i strumieniuje detekcje. Zwraca kod wyjścia."""
+    try:
+        params = detectors.load_detection_params(args.config)
+    except (ValueError, TypeError) as e:
+        print(f"Błąd wczytywania konfiguracji {args.config}: {e}")
+        return 2
+    for key in detectors.with_detector_defaults(detection_core.DEFAULT_DETECTION_PARAMS):
+        override = getattr(args, key, None)
+        if override is not None:
+            params[key] = override
+
+    try:
+        cascade_paths = resolve_cascade_paths(args, params)
+    except ValueError as e:
+        print(f"Błąd parametru enabled_detectors: {e}")
+        return 2
+    for cascade_path in cascade_paths.values():
+        if detection_core.load_cascade(cascade_path) is None:
+            print(f"Nie można załadować kaskady: {cascade_path}")
+            return 2
+
+    if args.watch:
+        return watch(args, params, cascade_paths, jsonl_stream)
+
+    input_paths = collect_image_paths(args.inputs or ["images"], args.file_list)
+    video_paths = [path for path in input_paths if detection_core.is_video_file(path)]
+    image_paths = [path for path in input_paths if not detection_core.is_video_file(path)]
+    if not input_paths:
+        print("Brak obrazów do przetworzenia.")
+        return 0
+
+    if not args.no_save:
+        make_output_dirs(params, args.output_dir)
+
+    requested_workers = args.workers if args.workers is not None else params["batch_worker_processes"]
+    start_time = time.time()
+    processed_files_count = 0
+    saved_detections_count = 0
+    detections_count = 0
+    detector_costs = detectors.DetectorCostReport()
+    # Bez zapisu wycinków nie ma czego wznawiać ani deduplikować - manifest i pamięć duplikatów dotyczą
+    # tylko przebiegów zapisujących wyniki (przebieg próbny nie może oznaczyć plików jako już przetworzonych)
+    dedup = None if args.no_save else batch_engine.open_dedup_cache(params)
+    manifest = None if args.no_save else batch_engine.open_batch_manifest(params)
+    store = None if args.no_save else detection_store.open_detection_store(params)
+    crop_output = None if args.no_save else crop_archive.open_crop_output(params, args.output_dir)
+    if manifest is not None and image_paths:
+        # Pliki niezmienione i przetworzone już z tymi parametrami nie trafiają do puli
+        image_paths = manifest.pending_tasks(image_paths)
+        if manifest.skipped_files_count:
+            print(f"Pominięto {manifest.skipped_files_count} plików przetworzonych wcześniej z tymi samymi parametrami.")
+
+    try:
+        image_results = ()
+        if image_paths:
+            worker_count = batch_engine.resolve_worker_count(requested_workers, len(image_paths))
+            image_results = batch_engine.process_files_in_pool(image_paths, params, cascade_paths,
+                                                               worker_count, should_continue=lambda: True, dedup=dedup)
+        for result in image_results:
+            processed_files_count += 1
+            batch_engine.record_detector_costs(detector_costs, result)
+            if result["error"]:
+                print(f"  !! Błąd podczas przetwarzania pliku {result['image_path']}: {result['error']}")
+                continue
+            if not args.no_save:
+                saved_detections_count += batch_engine.write_batch_result(result, params, args.output_dir, dedup, store, crop_output)
+            if manifest is not None:
+                manifest.mark_processed(result["image_path"], batch_engine.saved_counts_by_detector(result))
+            if result["duplicate"]:
+                continue
+            for record in detection_records(result):
+                jsonl_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+                detections_count += 1
+            jsonl_stream.flush()
+
+        processed_video_frames_count = 0
+        video_stream_seconds = 0.0
+        video_start_time = time.time()
+        for result in batch_engine.process_videos_in_pool(video_paths, params, cascade_paths,
+                                                          requested_workers, should_continue=lambda: True):
+            batch_engine.record_detector_costs(detector_costs, result)
+            if result["error"]:
+                print(f"  !! Błąd podczas przetwarzania odcinka {result['segment_index']} pliku {result['video_path']}: {result['error']}")
+            processed_video_frames_count += result["frames_processed"]
+            video_stream_seconds += result["frames_read"] / result["fps"]
+            if not args.no_save:
+                saved_detections_count += batch_engine.write_video_segment_result(result, params, args.output_dir, store, crop_output)
+            for record in video_detection_records(result):
+                jsonl_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+                detections_count += 1
+            jsonl_stream.flush()
+    finally:
+        # Także po Ctrl+C i błędach: manifest i pamięć duplikatów obejmują to, co już zapisano,
+        # magazyn zapisuje buforowane wiersze, a archiwum wycinków kończy bieżący fragment i indeks
+        if dedup is not None:
+            dedup.save()
+        if manifest is not None:
+            manifest.save()
+        if store is not None:
+            store.close()
+        if crop_output is not None:
+            crop_output.close()
+
+    elapsed = time.time() - start_time
+    print(f"Przetworzono plików: {processed_files_count}. Detekcji: {detections_count}. "
+          f"Zapisano detekcji: {saved_detections_count}. Czas: {elapsed:.1f} s.")
+    if video_paths:
+        video_elapsed = time.time() - video_start_time
+        print(f"Wideo: {len(video_paths)} plików, przeanalizowano {processed_video_frames_count} klatek z {video_stream_seconds:.1f} s nagrania "
+              f"w {video_elapsed:.1f} s ({video_stream_seconds / video_elapsed if video_elapsed > 0 else 0:.1f}x czasu rzeczywistego).")
+    if dedup is not None:
+        print(f"Pominięto duplikatów plików: {dedup.skipped_inputs_count}, wycinków: {dedup.skipped_crops_count}.")
+    cost_lines = detector_costs.lines()
+    if cost_lines:
+        print("Koszt detektorów:")
+        for line in cost_lines:
+            print(f"  {line}")
+    return 0
+
+
+def watch(args, params, cascade_paths, jsonl_stream):
+    """Tryb ciągły: obserwuje katalogi i strumieniuje detekcje z nowych obrazów aż do przerwania (Ctrl+C)."""
+    folders = [path for path in args.inputs if os.path.isdir(path)] or hot_folder.parse_folder_list(params["hot_folder_paths"])
+    if not args.no_save:
+        make_output_dirs(params, args.output_dir)
+    requested_workers = args.workers if args.workers is not None else params["batch_worker_processes"]
+    worker_count = batch_engine.resolve_worker_count(requested_workers, os.cpu_count() or 1)
+    dedup = None if args.no_save else batch_engine.open_dedup_cache(params)
+    manifest = None if args.no_save else batch_engine.open_batch_manifest(params)
+    store = None if args.no_save else detection_store.open_detection_store(params)
+    crop_output = None if args.no_save else crop_archive.open_crop_output(params, args.output_dir)
+
+    def handle_result(result):
+        saved_count = 0
+        if not args.no_save:
+            saved_count = batch_engine.write_batch_result(result, params, args.output_dir, dedup, store, crop_output)
+        if not result["duplicate"]:
+            for record in detection_records(result):
+                jsonl_stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            jsonl_stream.flush()
+        return saved_count
+
+    ingest = hot_folder.HotFolderIngest(folders, params, cascade_paths, worker_count,
+                                        handle_result, manifest, dedup)
+    print(f"Obserwowanie katalogów: {', '.join(folders)} (procesy: {worker_count}). Ctrl+C kończy.")
+    try:
+        ingest.start()
+        while ingest.is_running():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        print("Zatrzymywanie obserwacji...")
+    finally:
+        try:
+            ingest.stop()
+        finally:
+            if store is not None:
+                store.close()
+            if crop_output is not None:
+                crop_output.close()
+        stats = ingest.stats()
+        print(f"Przetworzono plików: {stats['processed']} (błędy: {stats['failed']}). Zapisano detekcji: {stats['saved']}.")
+    return 0
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    jsonl_stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        # Komunikaty diagnostyczne idą na stderr, aby nie mieszały się ze strumieniem JSONL.
+        with contextlib.redirect_stdout(sys.stderr):
+            return run(args, jsonl_stream)
+    except KeyboardInterrupt:
+        print("Przetwarzanie przerwane.", file=sys.stderr)
+        return 130
+    finally:
+        if jsonl_stream is not sys.stdout:
+            jsonl_stream.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,484 @@
+import cv2
+import os
+import time
+import traceback
+import multiprocessing
+import signal
+import numpy as np
+
+import detection_core
+import detectors
+import dedup_cache
+import batch_manifest
+import detection_store
+import crop_archive
+import tiled_detection
+
+# Wieloprocesowy silnik przetwarzania wsadowego folderu 'images' i plików wideo.
+# Każdy proces roboczy trzyma własne instancje CascadeClassifier, pobiera zadania (ścieżki obrazów
+# lub odcinki czasowe filmów) ze wspólnej kolejki zadań puli i zwraca gotowe (zakodowane) wycinki.
+# Zapis na dysk wykonuje jeden wątek piszący w procesie głównym, dzięki czemu liczniki zapisanych
+# detekcji pozostają spójne.
+
+_worker_state = {}
+
+
+def resolve_worker_count(requested_workers, total_files):
+    """Zwraca liczbę procesów roboczych (0 lub mniej = liczba rdzeni), nie większą niż liczba plików."""
+    cpu_count = os.cpu_count() or 1
+    worker_count = requested_workers if requested_workers > 0 else cpu_count
+    return max(1, min(worker_count, total_files))
+
+
+def opencv_threads_per_worker(worker_count):
+    """Dzieli rdzenie między procesy robocze, aby wewnętrzne wątki OpenCV nie powodowały nadsubskrypcji."""
+    cpu_count = os.cpu_count() or 1
+    return max(1, cpu_count // max(1, worker_count))
+
+
+def _init_worker(params, cascade_paths, opencv_threads, known_input_hashes, seen_input_hashes=None):
+    """Inicjalizator procesu roboczego: ustawia liczbę wątków OpenCV i ładuje własne kaskady ({detektor: ścieżka})."""
+    # Ctrl+C obsługuje proces główny (kończy pulę); procesy robocze nie wypisują własnych śladów stosu
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cv2.setNumThreads(opencv_threads)
+    _worker_state["params"] = detectors.with_detector_defaults(params)
+    _worker_state["known_input_hashes"] = known_input_hashes
+    _worker_state["seen_input_hashes"] = seen_input_hashes
+    _worker_state["cascades"] = detectors.load_cascades(cascade_paths)
+    # Kafelki dzielą ten sam przydział rdzeni co wewnętrzne wątki OpenCV procesu; gdy procesów jest tyle co rdzeni
+    # (jeden wątek na proces), kafelki nie mają wolnych rdzeni i tylko dokładałyby przebieg zgrubny
+    tile_threads = params["tiled_detection_threads"] or opencv_threads
+    _worker_state["tile_runner"] = tiled_detection.TiledCascadeRunner(
+        cascade_paths, tile_threads) if params["tiled_detection_enabled"] and tile_threads > 1 else None
+
+
+def _run_detectors(prepared_frame, params, detector_seconds, detector_types=None):
+    """Uruchamia kaskady procesu (lub tylko detector_types) na wspólnym PreprocessedFrame; czas każdej dolicza do detector_seconds.
+
+    Zwraca listę (typ, detekcje) w kolejności kaskad procesu.
+    """
+    results = []
+    for detection_type, cascade in _worker_state["cascades"].items():
+        if detector_types is not None and detection_type not in detector_types:
+            continue
+        start_time = time.perf_counter()
+        detections = detection_core.detect_objects(detection_type, cascade, prepared_frame, params,
+                                                   tile_runner=_worker_state["tile_runner"])
+        detector_seconds[detection_type] = detector_seconds.get(detection_type, 0.0) + time.perf_counter() - start_time
+        results.append((detection_type, detections))
+    return results
+
+
+def record_detector_costs(cost_report, result):
+    """Dolicza czasy detektorów z wyniku procesu roboczego (obrazu lub odcinka filmu) do raportu kosztów."""
+    frames = result["frames"] if "frames" in result else [result]
+    runs = result.get("frames_processed", 1)
+    for detection_type, seconds in result["detector_seconds"].items():
+        detections_count = sum(1 for frame in frames for detection in frame["detections"]
+                               if detection["detection_type"] == detection_type)
+        cost_report.record(detection_type, seconds, detections_count, runs)
+
+
+def _describe_detections(detection_type, detections):
+    """Zamienia krotki (x, y, w, h, pewność) na słowniki przekazywane do procesu głównego."""
+    return [{"detection_type": detection_type, "index": i, "box": (x, y, w, h), "confidence": confidence}
+            for i, (x, y, w, h, confidence) in enumerate(detections)]
+
+
+def _encode_first_saveable(detection_type, detections, frame, params):
+    """Koduje (format z crop_encoding) pierwszą detekcję spełniającą próg pewności (jeden zapis na typ obiektu i obraz)."""
+    threshold = params[f"{detection_type}_confidence_threshold"]
+    padding = params[f"{detection_type}_save_padding"]
+    target_width = params[f"target_{detection_type}_width"]
+    extension, encode_params, image_encoding = detection_core.crop_encoding(params, detection_type)
+    for i, (x, y, w, h, confidence) in enumerate(detections):
+        if confidence < threshold:
+            continue
+        normalized = detection_core.crop_and_normalize(frame, (x, y, w, h), padding, target_width)
+        if normalized is None:
+            continue
+        resized_img, saved_w, saved_h = normalized
+        encoded_image = detection_core.encode_crop(resized_img, extension, encode_params)
+        if encoded_image is None:
+            continue
+        return {
+            "detection_type": detection_type, "index": i, "box": (x, y, w, h), "confidence": confidence,
+            "encoded_image": encoded_image, "extension": extension, "image_encoding": image_encoding,
+            "saved_width": saved_w, "saved_height": saved_h,
+            "crop_hash": dedup_cache.perceptual_hash(resized_img) if params.get("dedup_enabled") else None
+        }
+    return None
+
+
+def _detect_image_file(task):
+    """Zadanie procesu roboczego: wczytuje obraz, uruchamia kaskady i zwraca wycinki do zapisu.
+
+    task to ścieżka (wszystkie kaskady procesu) albo (ścieżka, [detektory]) z BatchManifest.pending_task.
+    """
+    image_path, detector_types = task if isinstance(task, tuple) else (task, None)
+    if detector_types is None:
+        detector_types = list(_worker_state["cascades"])
+    result = {"image_path": image_path, "filename": os.path.basename(image_path), "detections": [], "saves": [],
+              "detector_types": [name for name in detector_types if name in _worker_state["cascades"]],
+              "detector_seconds": {}, "content_hash": None, "duplicate": False, "duplicate_of": None, "error": None}
+    try:
+        file_bytes = np.fromfile(image_path, dtype=np.uint8)
+        known_input_hashes = _worker_state["known_input_hashes"]
+        if known_input_hashes is not None:
+            result["content_hash"] = dedup_cache.content_hash(file_bytes)
+            if result["content_hash"] in known_input_hashes:
+                # Identyczna zawartość była już przetworzona z tymi samymi parametrami - bez dekodowania
+                result["duplicate"] = True
+                return result
+            # Ta sama zawartość w bieżącym przebiegu (np. zdjęcia seryjne, ponowne wgranie): pierwszy proces,
+            # który zgłosi skrót, przetwarza plik; pozostałe pomijają go bez dekodowania
+            first_path = _worker_state["seen_input_hashes"].setdefault(result["content_hash"], image_path)
+            if first_path != image_path:
+                result["duplicate"] = True
+                result["duplicate_of"] = os.path.basename(first_path)
+                return result
+        frame = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR) if file_bytes.size > 0 else None
+        if frame is None or frame.size == 0:
+            result["error"] = "Nie można wczytać obrazu lub obraz jest pusty"
+            return result
+
+        params = _worker_state["params"]
+        result["width"], result["height"] = frame.shape[1], frame.shape[0]
+        result["timestamp"] = time.time()
+
+        prepared_frame = detection_core.prepare_frame(frame)
+        for detection_type, detections in _run_detectors(prepared_frame, params, result["detector_seconds"], result["detector_types"]):
+            result["detections"].extend(_describe_detections(detection_type, detections))
+            saved = _encode_first_saveable(detection_type, detections, frame, params)
+            if saved:
+                result["saves"].append(saved)
+    except Exception as e:
+        result["error"] = f"{e}\n{traceback.format_exc()}"
+    return result
+
+
+def is_duplicate_input(result, dedup):
+    """Rejestruje plik w pamięci deduplikacji; zwraca True (i oznacza wynik), jeśli ta zawartość była już przetworzona."""
+    if dedup is None or not result["content_hash"]:
+        return result["duplicate"]
+    if result["duplicate_of"] is not None:
+        # Powtórzenie z tego przebiegu: skrót rejestruje wynik pliku, który został faktycznie przetworzony
+        dedup.skipped_inputs_count += 1
+        print(f"  Pominięto duplikat: {result['filename']} (ta sama zawartość co {result['duplicate_of']})")
+        return True
+    duplicate_of = dedup.register_input(result["content_hash"], result["filename"])
+    if duplicate_of is not None:
+        result["duplicate"] = True
+        print(f"  Pominięto duplikat: {result['filename']} (ta sama zawartość co {duplicate_of})")
+    return result["duplicate"]
+
+
+def saved_counts_by_detector(result):
+    """{detektor: liczba zapisanych detekcji} dla detektorów uruchomionych na pliku (do BatchManifest.mark_processed)."""
+    return {detection_type: sum(1 for save in result["saves"] if save["detection_type"] == detection_type and "png_filepath" in save)
+            for detection_type in result["detector_types"]}
+
+
+def write_batch_result(result, params, output_root=".", dedup=None, store=None, crop_output=None):
+    """Zapisuje wycinki i metadane (baza detekcji store i/lub JSON) zwrócone przez proces roboczy. Zwraca liczbę zapisanych detekcji.
+
+    Ścieżka zapisanego PNG trafia do klucza "png_filepath" odpowiedniego wpisu w result["saves"].
+    Z pamięcią deduplikacji pomijane są powtórzone pliki wejściowe i prawie identyczne wycinki.
+    crop_output (crop_archive) decyduje, czy wycinki trafiają do osobnych plików, czy do archiwum.
+    """
+    if is_duplicate_input(result, dedup):
+        return 0
+
+    crop_output = crop_output if crop_output is not None else crop_archive.DirectoryCropOutput()
+    saved_count = 0
+    base_name = os.path.splitext(result["filename"])[0]
+    for save in result["saves"]:
+        detection_type = save["detection_type"]
+        if dedup is not None and save["crop_hash"] is not None and dedup.is_near_duplicate_crop(detection_type, save["crop_hash"]):
+            print(f"  Pominięto prawie identyczny wycinek ({detection_type}) z obrazu {result['filename']}")
+            continue
+        spec = detectors.DETECTORS[detection_type]
+        output_dir = os.path.join(output_root, spec.save_dir)
+        png_filename = f"{base_name}_{detection_type}_{save['index']}_{int(result['timestamp'])}{save['extension']}"
+        png_filepath = os.path.join(output_dir, png_filename)
+        json_filepath = os.path.join(output_dir, os.path.splitext(png_filename)[0] + ".json")
+        try:
+            archive_location = crop_output.write(png_filepath, save["encoded_image"])
+            print(f"  Zapisano {spec.label}: {png_filepath} (pewność: {save['confidence']:.2f})")
+            save["png_filepath"] = png_filepath
+            saved_count += 1
+
+            source_info = {
+                "source_type": "image_file",
+                "original_filename": result["filename"],
+                "original_image_width": result["width"],
+                "original_image_height": result["height"],
+                "timestamp": int(result["timestamp"]),
+                "camera_index": -1
+            }
+            json_data = detection_core.build_detection_json(
+                detection_type, save["confidence"], save["box"], png_filename,
+                save["saved_width"], save["saved_height"], params[f"{detection_type}_save_padding"],
+                source_info, params[f"target_{detection_type}_width"], save["image_encoding"])
+            if archive_location is not None:
+                json_data["saved_image_details"]["archive"] = archive_location
+            detection_store.write_detection_metadata(json_data, json_filepath, png_filepath, store, params["detection_metadata_format"])
+        except Exception as e_save:
+            print(f"  Błąd zapisu ({detection_type}) z obrazu {result['filename']}: {e_save}")
+    return saved_count
+
+
+def open_dedup_cache(params):
+    """Tworzy i wczytuje pamięć deduplikacji, jeśli jest włączona w parametrach; w przeciwnym razie None."""
+    if not params.get("dedup_enabled"):
+        return None
+    dedup = dedup_cache.DedupCache(params["dedup_cache_path"], detectors.params_fingerprint(params),
+                                   params["dedup_max_entries"], params["dedup_crop_hamming_distance"])
+    dedup.load()
+    return dedup
+
+
+def open_batch_manifest(params):
+    """Tworzy i wczytuje manifest przetworzonych plików, jeśli wznawianie jest włączone; w przeciwnym razie None."""
+    if not params.get("batch_resume_enabled"):
+        return None
+    manifest = batch_manifest.BatchManifest(params["batch_manifest_path"], detectors.detector_fingerprints(params))
+    manifest.load()
+    return manifest
+
+
+def process_files_in_pool(image_paths, params, cascade_paths, worker_count, should_continue, dedup=None, opencv_threads=None):
+    """Generator zwracający wyniki z puli procesów w kolejności ukończenia. Przerywa pulę, gdy should_continue() zwróci False.
+
+    image_paths może być dowolnym iterowalnym obiektem, także nieskończonym generatorem (obserwowane katalogi);
+    elementem może być też zadanie (ścieżka, [detektory]) z BatchManifest.pending_tasks.
+    Z pamięcią deduplikacji procesy dzielą słownik skrótów plików z bieżącego przebiegu (menedżer multiprocessing),
+    więc powtórzona zawartość nie jest dekodowana ani skanowana drugi raz.
+    """
+    if dedup is None:
+        yield from _run_in_pool(_detect_image_file, image_paths, params, cascade_paths,
+                                worker_count, should_continue, None, opencv_threads)
+        return
+    with multiprocessing.get_context("spawn").Manager() as manager:
+        yield from _run_in_pool(_detect_image_file, image_paths, params, cascade_paths, worker_count, should_continue,
+                                dedup.known_input_hashes(), opencv_threads, manager.dict())
+
+
+def _run_in_pool(task_function, tasks, params, cascade_paths, worker_count, should_continue,
+                 known_input_hashes=None, opencv_threads=None, seen_input_hashes=None):
+    if opencv_threads is None:
+        opencv_threads = opencv_threads_per_worker(worker_count)
+    print(f"Uruchamianie puli {worker_count} procesów roboczych (wątki OpenCV na proces: {opencv_threads}).")
+    # 'spawn' zamiast 'fork': proces główny ma działające wątki i Tk, których nie wolno kopiować.
+    context = multiprocessing.get_context("spawn")
+    pool = context.Pool(processes=worker_count, initializer=_init_worker,
+                        initargs=(params, cascade_paths, opencv_threads, known_input_hashes, seen_input_hashes))
+    finished = False
+    try:
+        for result in pool.imap_unordered(task_function, tasks):
+            yield result
+            if not should_continue():
+                break
+        else:
+            finished = True
+    finally:
+        # Po przerwaniu (lub wyjątku po stronie konsumenta) nie czekamy na pozostałe zadania.
+        if finished:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+
+
+def probe_video(video_path):
+    """Zwraca (liczba klatek, FPS, szerokość, wysokość) pliku wideo lub None, jeśli nie da się go otworzyć.
+
+    Liczba klatek bywa nieznana (0) dla niektórych kontenerów - wtedy film jest przetwarzany jednym odcinkiem.
+    """
+    video = cv2.VideoCapture(video_path)
+    try:
+        if not video.isOpened():
+            return None
+        frame_count = max(0, int(video.get(cv2.CAP_PROP_FRAME_COUNT)))
+        fps = video.get(cv2.CAP_PROP_FPS)
+        if not fps or fps <= 0 or fps != fps:
+            fps = 25.0
+        return frame_count, fps, int(video.get(cv2.CAP_PROP_FRAME_WIDTH)), int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        video.release()
+
+
+def split_video_into_segments(video_path, params):
+    """Dzieli film na odcinki czasowe (zadania dla puli): listę (ścieżka, nr odcinka, klatka początkowa, końcowa, FPS)."""
+    video_info = probe_video(video_path)
+    if video_info is None:
+        return []
+    frame_count, fps = video_info[:2]
+    segment_frames = max(1, int(round(params["video_segment_seconds"] * fps))) if params["video_segment_seconds"] > 0 else 0
+    if frame_count <= 0 or segment_frames <= 0:
+        return [(video_path, 0, 0, None, fps)]
+    return [(video_path, segment_index, start_frame, min(frame_count, start_frame + segment_frames), fps)
+            for segment_index, start_frame in enumerate(range(0, frame_count, segment_frames))]
+
+
+def _detect_video_segment(segment):
+    """Zadanie procesu roboczego: przetwarza odcinek filmu [klatka początkowa, końcowa), co N-tą klatkę.
+
+    Analizowane są klatki o numerze podzielnym przez video_frame_step (liczonym od początku filmu, więc
+    podział na odcinki nie zmienia zestawu klatek); pominięte są tylko pobierane (grab) bez dekodowania.
+    Zapis wycinków jest ograniczony interwałem image_save_interval_seconds liczonym w czasie strumienia,
+    a nie zegara. Odcinek nie zna zapisów poprzedniego - zapisy z początku odcinka zbyt bliskie
+    ostatniemu zapisowi poprzedniego odrzuca dopiero _filter_boundary_saves.
+    """
+    video_path, segment_index, start_frame, end_frame, fps = segment
+    result = {"video_path": video_path, "filename": os.path.basename(video_path), "segment_index": segment_index,
+              "start_frame": start_frame, "end_frame": end_frame, "fps": fps, "frames_read": 0, "frames_processed": 0,
+              "frames": [], "detector_seconds": {}, "error": None}
+    video = cv2.VideoCapture(video_path)
+    try:
+        if not video.isOpened():
+            result["error"] = "Nie można otworzyć pliku wideo"
+            return result
+        if start_frame > 0:
+            video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        params = _worker_state["params"]
+        frame_step = max(1, params["video_frame_step"])
+        save_interval_ms = params["image_save_interval_seconds"] * 1000.0
+        last_save_ms = {}
+        frame_index = start_frame
+        while end_frame is None or frame_index < end_frame:
+            if frame_index % frame_step:
+                if not video.grab():
+                    break
+                frame_index += 1
+                result["frames_read"] += 1
+                continue
+            ok, frame = video.read()
+            if not ok or frame is None:
+                break
+            stream_timestamp_ms = video.get(cv2.CAP_PROP_POS_MSEC)
+            if not stream_timestamp_ms or stream_timestamp_ms <= 0:
+                stream_timestamp_ms = frame_index * 1000.0 / fps
+            result["frames_read"] += 1
+            result["frames_processed"] += 1
+
+            frame_result = {"frame_index": frame_index, "stream_timestamp_ms": round(stream_timestamp_ms, 1),
+                            "width": frame.shape[1], "height": frame.shape[0], "detections": [], "saves": []}
+            prepared_frame = detection_core.prepare_frame(frame)
+            for detection_type, detections in _run_detectors(prepared_frame, params, result["detector_seconds"]):
+                frame_result["detections"].extend(_describe_detections(detection_type, detections))
+                previous_save_ms = last_save_ms.get(detection_type)
+                if detections and (previous_save_ms is None or stream_timestamp_ms - previous_save_ms > save_interval_ms):
+                    saved = _encode_first_saveable(detection_type, detections, frame, params)
+                    if saved:
+                        frame_result["saves"].append(saved)
+                        last_save_ms[detection_type] = stream_timestamp_ms
+            if frame_result["detections"]:
+                result["frames"].append(frame_result)
+            frame_index += 1
+    except Exception as e:
+        result["error"] = f"{e}\n{traceback.format_exc()}"
+    finally:
+        video.release()
+    return result
+
+
+def _filter_boundary_saves(result, last_save_ms, save_interval_ms):
+    """Odrzuca zapisy z początku odcinka bliższe niż save_interval_ms ostatniemu zapisowi tego samego typu
+    z wcześniejszych odcinków (last_save_ms: {typ: znacznik czasu strumienia}) i aktualizuje last_save_ms.
+
+    Zapisy dalej w odcinku zostają, choć odcinek liczył od nich interwał od odrzuconego zapisu - wynik
+    może mieć na granicy odcinka mniej zapisów niż przetwarzanie filmu w jednym kawałku, ale nie więcej.
+    """
+    for frame_result in result["frames"]:
+        kept_saves = []
+        for save in frame_result["saves"]:
+            detection_type = save["detection_type"]
+            previous_save_ms = last_save_ms.get(detection_type)
+            if previous_save_ms is not None and frame_result["stream_timestamp_ms"] - previous_save_ms <= save_interval_ms:
+                continue
+            kept_saves.append(save)
+            last_save_ms[detection_type] = frame_result["stream_timestamp_ms"]
+        frame_result["saves"] = kept_saves
+
+
+def _in_stream_order(segment_results, save_interval_ms):
+    """Przekazuje wyniki odcinków każdego filmu w kolejności odcinków (wcześniej ukończone późniejsze czekają
+    w buforze), żeby interwał zapisu obowiązywał także na granicach odcinków.
+
+    Po przerwaniu puli zbuforowane odcinki są oddawane po kolei mimo luk - zapisują to, co już wykryto.
+    """
+    videos = {}  # ścieżka -> {"next_index", "pending": {nr odcinka: wynik}, "last_save_ms": {typ: ms}}
+    for result in segment_results:
+        state = videos.setdefault(result["video_path"], {"next_index": 0, "pending": {}, "last_save_ms": {}})
+        state["pending"][result["segment_index"]] = result
+        while state["next_index"] in state["pending"]:
+            ready_result = state["pending"].pop(state["next_index"])
+            state["next_index"] += 1
+            _filter_boundary_saves(ready_result, state["last_save_ms"], save_interval_ms)
+            yield ready_result
+    for state in videos.values():
+        for segment_index in sorted(state["pending"]):
+            ready_result = state["pending"][segment_index]
+            _filter_boundary_saves(ready_result, state["last_save_ms"], save_interval_ms)
+            yield ready_result
+
+
+def write_video_segment_result(result, params, output_root=".", store=None, crop_output=None):
+    """Zapisuje wycinki i metadane (baza detekcji store i/lub JSON) z odcinka filmu. Zwraca liczbę zapisanych detekcji.
+
+    source_info zawiera nazwę pliku, numer klatki i znacznik czasu strumienia (ms).
+    """
+    crop_output = crop_output if crop_output is not None else crop_archive.DirectoryCropOutput()
+    saved_count = 0
+    base_name = os.path.splitext(result["filename"])[0]
+    for frame_result in result["frames"]:
+        for save in frame_result["saves"]:
+            detection_type = save["detection_type"]
+            spec = detectors.DETECTORS[detection_type]
+            output_dir = os.path.join(output_root, spec.save_dir)
+            png_filename = f"{base_name}_f{frame_result['frame_index']:07d}_{detection_type}_{save['index']}{save['extension']}"
+            png_filepath = os.path.join(output_dir, png_filename)
+            json_filepath = os.path.join(output_dir, os.path.splitext(png_filename)[0] + ".json")
+            try:
+                archive_location = crop_output.write(png_filepath, save["encoded_image"])
+                print(f"  Zapisano {spec.label}: {png_filepath} (pewność: {save['confidence']:.2f})")
+                save["png_filepath"] = png_filepath
+                saved_count += 1
+
+                source_info = {
+                    "source_type": "video_file",
+                    "original_filename": result["filename"],
+                    "frame_index": frame_result["frame_index"],
+                    "stream_timestamp_ms": frame_result["stream_timestamp_ms"],
+                    "video_fps": result["fps"],
+                    "original_image_width": frame_result["width"],
+                    "original_image_height": frame_result["height"],
+                    "camera_index": -1
+                }
+                json_data = detection_core.build_detection_json(
+                    detection_type, save["confidence"], save["box"], png_filename,
+                    save["saved_width"], save["saved_height"], params[f"{detection_type}_save_padding"],
+                    source_info, params[f"target_{detection_type}_width"], save["image_encoding"])
+                if archive_location is not None:
+                    json_data["saved_image_details"]["archive"] = archive_location
+                detection_store.write_detection_metadata(json_data, json_filepath, png_filepath, store, params["detection_metadata_format"])
+            except Exception as e_save:
+                print(f"  Błąd zapisu ({detection_type}) z filmu {result['filename']}, klatka {frame_result['frame_index']}: {e_save}")
+    return saved_count
+
+
+def process_videos_in_pool(video_paths, params, cascade_paths, requested_workers, should_continue):
+    """Generator wyników odcinków filmów (w kolejności odcinków w obrębie filmu). Odcinki wszystkich plików dzielą jedną pulę."""
+    segments = []
+    for video_path in video_paths:
+        video_segments = split_video_into_segments(video_path, params)
+        if not video_segments:
+            print(f"  !! Nie można otworzyć pliku wideo: {video_path}")
+        segments.extend(video_segments)
+    if not segments:
+        return
+    print(f"Podzielono {len(video_paths)} plików wideo na {len(segments)} odcinków.")
+    segment_results = _run_in_pool(_detect_video_segment, segments, params, cascade_paths,
+                                   resolve_worker_count(requested_workers, len(segments)), should_continue)
+    yield from _in_stream_order(segment_results, params["image_save_interval_seconds"] * 1000.0)
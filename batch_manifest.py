@@ -0,0 +1,112 @@
+import json
+import os
+import time
+
+# Manifest przetworzonych plików dla trybu wsadowego (wznawianie i przetwarzanie przyrostowe).
+# Wpis jest kluczowany ścieżką pliku i zawiera jego rozmiar oraz czas modyfikacji, a także odciski
+# detektorów (detectors.detector_fingerprints), którymi plik został już przetworzony. Dla niezmienionego
+# pliku uruchamiane są tylko detektory, których odcisku jeszcze nie ma - zmiana parametrów tablic albo
+# dołożenie detektora nie powtarza twarzy (i nie zapisuje ich wycinków drugi raz). Powrót do poprzednich
+# ustawień znów wykorzystuje stare wpisy, a zmiana pliku unieważnia tylko jego wpis.
+# Sprawdzenie to jedno os.stat na plik, bez czytania zawartości (w przeciwieństwie do deduplikacji).
+
+BATCH_MANIFEST_VERSION = 1
+
+
+def file_signature(file_path):
+    """(rozmiar, czas modyfikacji w ns) pliku lub None, gdy pliku nie da się odczytać."""
+    try:
+        stat_result = os.stat(file_path)
+    except OSError:
+        return None
+    return stat_result.st_size, stat_result.st_mtime_ns
+
+
+class BatchManifest:
+    """Trwały manifest plików przetworzonych w trybie wsadowym, zapisywany okresowo i na końcu przebiegu."""
+
+    def __init__(self, manifest_filepath, detector_fingerprints, save_every=50):
+        """detector_fingerprints: {detektor: odcisk} włączonych detektorów."""
+        self.manifest_filepath = manifest_filepath
+        self.detector_fingerprints = dict(detector_fingerprints)
+        self.save_every = max(1, save_every)
+        self._entries = {}  # ścieżka bezwzględna -> {"size", "mtime_ns", "fingerprints": {odcisk detektora: {"saved", "processed_at"}}}
+        self._unsaved_changes = 0
+        self.skipped_files_count = 0
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.normcase(os.path.abspath(file_path))
+
+    def load(self):
+        """Wczytuje manifest z pliku; uszkodzony lub niezgodny plik jest ignorowany."""
+        if not os.path.exists(self.manifest_filepath):
+            return
+        try:
+            with open(self.manifest_filepath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != BATCH_MANIFEST_VERSION:
+                print(f"Manifest przetwarzania {self.manifest_filepath} ma inną wersję - zaczynam od pustego.")
+                return
+            self._entries = data.get("files", {})
+            print(f"Wczytano manifest przetwarzania: {len(self._entries)} plików.")
+        except (ValueError, TypeError, OSError) as e:
+            print(f"Błąd wczytywania manifestu przetwarzania {self.manifest_filepath}: {e}. Zaczynam od pustego.")
+
+    def save(self):
+        """Zapisuje manifest atomowo (plik tymczasowy + os.replace)."""
+        data = {"version": BATCH_MANIFEST_VERSION, "files": self._entries}
+        temp_filepath = self.manifest_filepath + ".tmp"
+        try:
+            with open(temp_filepath, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_filepath, self.manifest_filepath)
+            self._unsaved_changes = 0
+        except OSError as e:
+            print(f"Błąd zapisu manifestu przetwarzania {self.manifest_filepath}: {e}")
+
+    def pending_detectors(self, file_path):
+        """Detektory, których bieżących wyników pliku jeszcze nie ma (wszystkie, gdy plik jest nowy lub się zmienił)."""
+        entry = self._entries.get(self._key(file_path))
+        if entry is None or file_signature(file_path) != (entry["size"], entry["mtime_ns"]):
+            return list(self.detector_fingerprints)
+        return [name for name, fingerprint in self.detector_fingerprints.items() if fingerprint not in entry["fingerprints"]]
+
+    def is_processed(self, file_path):
+        """Czy plik (niezmieniony od ostatniego przetworzenia) był już przetworzony wszystkimi włączonymi detektorami."""
+        return not self.pending_detectors(file_path)
+
+    def pending_task(self, file_path):
+        """Zadanie dla puli: ścieżka (wszystkie detektory), (ścieżka, [detektory]) albo None, gdy nie ma nic do zrobienia."""
+        detector_names = self.pending_detectors(file_path)
+        if not detector_names:
+            return None
+        return file_path if len(detector_names) == len(self.detector_fingerprints) else (file_path, detector_names)
+
+    def pending_tasks(self, file_paths):
+        """Zadania dla plików, które trzeba (jeszcze) przetworzyć; pozostałe są liczone jako pominięte."""
+        tasks = [task for task in (self.pending_task(file_path) for file_path in file_paths) if task is not None]
+        self.skipped_files_count += len(file_paths) - len(tasks)
+        return tasks
+
+    def mark_processed(self, file_path, saved_counts):
+        """Zapamiętuje plik jako przetworzony detektorami z saved_counts ({detektor: liczba zapisanych detekcji}).
+
+        Zmieniony plik traci wpisy dla wcześniejszych parametrów.
+        """
+        signature = file_signature(file_path)
+        if signature is None:
+            return
+        key = self._key(file_path)
+        entry = self._entries.get(key)
+        if entry is None or (entry["size"], entry["mtime_ns"]) != signature:
+            entry = {"size": signature[0], "mtime_ns": signature[1], "fingerprints": {}}
+            self._entries[key] = entry
+        processed_at = int(time.time())
+        for detector_name, saved_count in saved_counts.items():
+            if detector_name in self.detector_fingerprints:
+                entry["fingerprints"][self.detector_fingerprints[detector_name]] = {"saved": saved_count, "processed_at": processed_at}
+        self._unsaved_changes += 1
+        # Zapis co save_every plików: nawet przerwany proces (np. zamknięty terminal) wznowi prawie od miejsca przerwania
+        if self._unsaved_changes >= self.save_every:
+            self.save()
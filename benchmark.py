@@ -0,0 +1,272 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import detection_core
+import detection_store
+import detectors
+import tiled_detection
+
+# Mikrobenchmark etapów przetwarzania na katalogu przykładowych obrazów (bez kamery i GUI):
+#   python -m benchmark images/ --repeat 5 --output bench.json
+# Każdy etap ścieżki detekcji jest mierzony osobno, a wynik (przepustowość i percentyle opóźnień)
+# trafia do pliku JSON, aby można było porównywać kolejne uruchomienia.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_FORMAT_VERSION = 3
+# Między "gray" a "draw" każdy włączony detektor ma własny etap "{detektor}_cascade"
+STAGES = ("decode", "gray", "draw", "crop_resize", "crop_encode", "metadata_write")
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+# Wygląd ramek taki sam jak domyślny w CameraApp (kolory detektorów z rejestru) - rysowanie kosztuje tyle samo co w podglądzie
+DRAW_ROI_COLOR = (0, 255, 0)
+DRAW_TEXT_COLOR = (255, 255, 0)
+
+
+class StageTimer:
+    """Zbiera czasy (w sekundach) kolejnych wywołań poszczególnych etapów."""
+
+    def __init__(self, detector_names=("face", "plate")):
+        stages = STAGES[:2] + tuple(f"{name}_cascade" for name in detector_names) + STAGES[2:]
+        self.samples = {stage: [] for stage in stages}
+        self.samples["total"] = []
+        self.encoded_bytes = {name: 0 for name in detector_names}
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[stage].append(time.perf_counter() - start_time)
+
+    def summary(self, wall_time):
+        """Zwraca statystyki etapów: liczba próbek, średnia, percentyle (ms) i przepustowość (wywołań/s)."""
+        stages = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                stages[stage] = {"count": 0}
+                continue
+            samples_ms = np.array(samples) * 1000.0
+            stage_stats = {
+                "count": len(samples),
+                "total_ms": round(float(samples_ms.sum()), 3),
+                "mean_ms": round(float(samples_ms.mean()), 3),
+                "min_ms": round(float(samples_ms.min()), 3),
+                "max_ms": round(float(samples_ms.max()), 3),
+            }
+            for percentile in LATENCY_PERCENTILES:
+                stage_stats[f"p{percentile}_ms"] = round(float(np.percentile(samples_ms, percentile)), 3)
+            stage_stats["throughput_per_s"] = round(len(samples) / (samples_ms.sum() / 1000.0), 2) if samples_ms.sum() > 0 else None
+            stages[stage] = stage_stats
+        stages["total"]["images_per_s_wall"] = round(len(self.samples["total"]) / wall_time, 2) if wall_time > 0 else None
+        return stages
+
+
+def _draw_detections(frame, detections_by_type, roi):
+    """Rysuje ramki, pewności i ROI tak jak _process_and_draw_detections w podglądzie."""
+    if roi is not None:
+        cv2.rectangle(frame, roi[:2], roi[2:], DRAW_ROI_COLOR, 2)
+    for detection_type, detections in detections_by_type.items():
+        color = detectors.DETECTORS[detection_type].color
+        for x, y, w, h, confidence in detections:
+            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+            cv2.putText(frame, f"{confidence:.2f}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, DRAW_TEXT_COLOR, 2)
+
+
+def _benchmark_save(timer, detection_type, detection, frame, params, source_info, output_dir, store=None):
+    """Mierzy ścieżkę zapisu jednej detekcji: wycinek + skalowanie, kodowanie i zapis metadanych (formaty z konfiguracji)."""
+    padding, target_width = params[f"{detection_type}_save_padding"], params[f"target_{detection_type}_width"]
+    extension, encode_params, image_encoding = detection_core.crop_encoding(params, detection_type)
+    with timer.measure("crop_resize"):
+        normalized = detection_core.crop_and_normalize(frame, detection, padding, target_width)
+    if normalized is None:
+        return
+    crop, saved_w, saved_h = normalized
+    with timer.measure("crop_encode"):
+        encoded_image = detection_core.encode_crop(crop, extension, encode_params)
+    timer.encoded_bytes[detection_type] += len(encoded_image or b"")
+    json_data = detection_core.build_detection_json(detection_type, detection[4], detection, f"bench_{detection_type}{extension}",
+                                                    saved_w, saved_h, padding, source_info, target_width, image_encoding)
+    # Jak w aplikacji: wiersz do bufora bazy detekcji i/lub plik JSON obok wycinka (detection_metadata_format)
+    with timer.measure("metadata_write"):
+        detection_store.write_detection_metadata(json_data, os.path.join(output_dir, f"bench_{detection_type}.json"),
+                                                 os.path.join(output_dir, f"bench_{detection_type}{extension}"), store,
+                                                 params["detection_metadata_format"])
+
+
+def benchmark_image(timer, file_bytes, filename, cascades, params, output_dir, tile_runner=None, store=None):
+    """Przepuszcza jeden obraz przez wszystkie etapy. Zwraca liczbę detekcji lub None, gdy dekodowanie zawiodło."""
+    total_start = time.perf_counter()
+    with timer.measure("decode"):
+        frame = cv2.imdecode(np.frombuffer(file_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return None
+    with timer.measure("gray"):
+        prepared_frame = detection_core.prepare_frame(frame)
+
+    frame_h, frame_w = frame.shape[:2]
+    roi = detection_core.compute_face_roi(frame_w, frame_h, params["roi_size_percentage"])
+    detections_by_type = {}
+    for detection_type, cascade in cascades.items():
+        # Detektory z centralnym ROI działają w nim, jak w podglądzie; pozostałe - na całej klatce
+        center_roi = detectors.DETECTORS[detection_type].roi_policy == detectors.ROI_CENTER
+        if center_roi and roi is None:
+            continue
+        with timer.measure(f"{detection_type}_cascade"):
+            detections_by_type[detection_type] = detection_core.detect_objects(
+                detection_type, cascade, prepared_frame, params, roi if center_roi else None, tile_runner)
+
+    # Zapisywane wycinki pochodzą z czystej klatki, więc rysujemy na kopii (jak w podglądzie)
+    display_frame = frame.copy()
+    with timer.measure("draw"):
+        _draw_detections(display_frame, detections_by_type, roi if any(
+            detectors.DETECTORS[detection_type].roi_policy == detectors.ROI_CENTER for detection_type in cascades) else None)
+
+    source_info = {"type": "image_file", "original_filename": filename, "original_image_width": frame_w, "original_image_height": frame_h}
+    for detection_type, detections in detections_by_type.items():
+        for detection in detections:
+            _benchmark_save(timer, detection_type, detection, frame, params, source_info, output_dir, store)
+    timer.samples["total"].append(time.perf_counter() - total_start)
+    return sum(len(detections) for detections in detections_by_type.values())
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog="benchmark",
+        description="Mikrobenchmark etapów detekcji (dekodowanie, szarość, kaskady, rysowanie, zapis) na katalogu obrazów.")
+    parser.add_argument("images", nargs="?", default="images", help="Katalog z przykładowymi obrazami (domyślnie: 'images').")
+    parser.add_argument("--config", default=detection_core.CONFIG_FILEPATH, help="Plik konfiguracyjny JSON (domyślnie: config.json).")
+    parser.add_argument("--output", "-o", default="-", help="Plik wynikowy JSON ('-' = stdout).")
+    parser.add_argument("--repeat", type=int, default=3, help="Liczba przebiegów po całym zbiorze (domyślnie: 3).")
+    parser.add_argument("--warmup", type=int, default=1, help="Przebiegi rozgrzewające, nieliczone w wynikach (domyślnie: 1).")
+    parser.add_argument("--opencv-threads", type=int, default=None, help="Liczba wątków OpenCV (domyślnie: ustawienie biblioteki).")
+    parser.add_argument("--label", default="", help="Dowolna etykieta zapisywana w wyniku (np. nazwa gałęzi).")
+    parser.add_argument("--face-cascade", default=None, help="Plik kaskady twarzy (domyślnie z rejestru detektorów).")
+    parser.add_argument("--plate-cascade", default=None, help="Plik kaskady tablic (domyślnie z rejestru detektorów).")
+    return parser
+
+
+def run(args):
+    """Wykonuje benchmark i zwraca słownik wyników (lub None przy błędzie)."""
+    try:
+        params = detectors.load_detection_params(args.config)
+        specs = detectors.configured_detectors(params)
+    except (ValueError, TypeError) as e:
+        print(f"Błąd wczytywania konfiguracji {args.config}: {e}")
+        return None
+    if args.opencv_threads is not None:
+        cv2.setNumThreads(args.opencv_threads)
+
+    cascade_paths = detectors.cascade_paths(specs, SCRIPT_DIR, {"face": args.face_cascade, "plate": args.plate_cascade})
+    cascades = detectors.load_cascades(cascade_paths)
+    if not cascades:
+        print("Nie można załadować żadnej kaskady.")
+        return None
+    if not os.path.isdir(args.images):
+        print(f"Katalog '{args.images}' nie istnieje.")
+        return None
+
+    # Pliki są wczytywane do pamięci z góry, żeby etap "decode" nie mierzył dysku
+    corpus = []
+    for filename in sorted(detection_core.list_image_files(args.images)):
+        with open(os.path.join(args.images, filename), "rb") as f:
+            corpus.append((filename, f.read()))
+    if not corpus:
+        print(f"Brak obrazów w katalogu '{args.images}'.")
+        return None
+
+    tile_runner = tiled_detection.TiledCascadeRunner(
+        cascade_paths, params["tiled_detection_threads"]) if params["tiled_detection_enabled"] else None
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as output_dir:
+        # Baza detekcji w katalogu tymczasowym - benchmark nie dopisuje wierszy do bazy aplikacji
+        store = detection_store.open_detection_store(dict(params, detection_store_path=os.path.join(output_dir, "detections.db")))
+        for _ in range(max(0, args.warmup)):
+            for filename, file_bytes in corpus:
+                benchmark_image(StageTimer(cascades), file_bytes, filename, cascades, params, output_dir, tile_runner, store)
+
+        timer = StageTimer(cascades)
+        failed_files = set()
+        detections_count = 0
+        wall_start = time.perf_counter()
+        for _ in range(max(1, args.repeat)):
+            for filename, file_bytes in corpus:
+                image_detections = benchmark_image(timer, file_bytes, filename, cascades, params, output_dir, tile_runner, store)
+                if image_detections is None:
+                    failed_files.add(filename)
+                else:
+                    detections_count += image_detections
+        wall_time = time.perf_counter() - wall_start
+        if store is not None:
+            store.close()
+    if tile_runner is not None:
+        tile_runner.close()
+
+    return {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "label": args.label,
+        "timestamp": int(time.time()),
+        "environment": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "opencv_threads": cv2.getNumThreads(),
+        },
+        "corpus": {
+            "directory": os.path.abspath(args.images),
+            "images": len(corpus),
+            "total_bytes": sum(len(file_bytes) for _, file_bytes in corpus),
+            "failed_to_decode": sorted(failed_files),
+        },
+        "repeat": max(1, args.repeat),
+        "params_fingerprint": detectors.params_fingerprint(params),
+        "params": {key: list(value) if isinstance(value, tuple) else value for key, value in params.items()},
+        "detections": detections_count,
+        "metadata_format": params["detection_metadata_format"] if store is not None else "json",
+        "encoded_crop_bytes": timer.encoded_bytes,
+        "wall_time_s": round(wall_time, 3),
+        "stages": timer.summary(wall_time),
+    }
+
+
+def print_summary(results):
+    """Krótka tabela etapów na stderr (pełny wynik jest w JSON)."""
+    print(f"Obrazów: {results['corpus']['images']} x {results['repeat']}, detekcji: {results['detections']}, "
+          f"czas: {results['wall_time_s']:.2f} s")
+    print(f"{'etap':<14}{'n':>7}{'śr. ms':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'/s':>10}")
+    for stage, stage_stats in results["stages"].items():
+        if not stage_stats["count"]:
+            print(f"{stage:<14}{0:>7}")
+            continue
+        print(f"{stage:<14}{stage_stats['count']:>7}{stage_stats['mean_ms']:>10.2f}{stage_stats['p50_ms']:>9.2f}"
+              f"{stage_stats['p95_ms']:>9.2f}{stage_stats['p99_ms']:>9.2f}{stage_stats['throughput_per_s'] or 0:>10.1f}")
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args)
+        if results is None:
+            return 2
+        print_summary(results)
+    output_text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(output_text)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output_text + "\n")
+        print(f"Zapisano wyniki benchmarku: {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import argparse
+import io
+import json
+import os
+import sys
+import tarfile
+import threading
+import time
+
+# Zapis wycinków do zbiorczych archiwów zamiast osobnego pliku na każdy wycinek.
+# Wycinki są dopisywane do rotowanych (po rozmiarze lub czasie) nieskompresowanych archiwów tar,
+# więc każdy fragment to zwykły tar czytelny standardowymi narzędziami (tar tf, kopie zapasowe).
+# Obok każdego archiwum powstaje indeks .idx (JSONL: nazwa, przesunięcie danych, długość) dopisywany
+# po każdym wycinku, a położenie trafia też do metadanych detekcji - odczyt pojedynczego wycinka
+# to jedno seek + read, bez przeglądania archiwum.
+#   python -m crop_archive list
+#   python -m crop_archive extract faces/live_face_0_1700000000.png --output wycinek.png
+
+CROP_OUTPUTS = ("files", "archive")
+ARCHIVE_INDEX_SUFFIX = ".idx"
+
+
+def archive_member_name(filepath):
+    """Nazwa wycinka w archiwum: katalog docelowy i nazwa pliku, np. 'faces/live_face_0_1700000000.png'."""
+    directory, filename = os.path.split(os.path.normpath(filepath))
+    directory_name = os.path.basename(directory)
+    return f"{directory_name}/{filename}" if directory_name else filename
+
+
+class DirectoryCropOutput:
+    """Dotychczasowy zapis: każdy wycinek jako osobny plik pod swoją ścieżką."""
+
+    def write(self, filepath, data):
+        """Zapisuje bajty wycinka. Zwraca położenie w archiwum (tu zawsze None - plik leży pod filepath)."""
+        with open(filepath, "wb") as f:
+            f.write(data)
+        return None
+
+    def close(self):
+        pass
+
+
+class CropArchive:
+    """Dopisuje wycinki do rotowanych archiwów tar z indeksem przesunięć. write() jest bezpieczne wątkowo."""
+
+    def __init__(self, archive_dir, shard_max_bytes=256 * 1024 * 1024, shard_max_seconds=3600.0):
+        self.archive_dir = archive_dir
+        self.shard_max_bytes = shard_max_bytes
+        self.shard_max_seconds = shard_max_seconds
+        self._lock = threading.Lock()
+        self._tar = None
+        self._index_file = None
+        self._shard_name = None
+        self._shard_started_at = 0.0
+        self._shard_counter = 0
+        self.written_count = 0
+        os.makedirs(archive_dir, exist_ok=True)
+
+    def write(self, filepath, data):
+        """Dopisuje wycinek jako element archiwum 'katalog/plik' (np. 'faces/x.png'). Zwraca położenie: {"shard", "offset", "length"}."""
+        member_name = archive_member_name(filepath)
+        tar_info = tarfile.TarInfo(member_name)
+        tar_info.size = len(data)
+        tar_info.mtime = int(time.time())
+        with self._lock:
+            self._rotate_if_needed()
+            self._tar.addfile(tar_info, io.BytesIO(data))
+            self._tar.fileobj.flush()
+            # addfile zapisuje kopię TarInfo, więc położenie danych wyliczamy z końca elementu (dane są dopełniane do bloku)
+            padded_size = -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            location = {"shard": self._shard_name, "offset": self._tar.offset - padded_size, "length": len(data)}
+            self._index_file.write(json.dumps(dict(location, name=member_name), ensure_ascii=False) + "\n")
+            self._index_file.flush()
+            self.written_count += 1
+        return location
+
+    def _rotate_if_needed(self):
+        if self._tar is not None:
+            too_big = self.shard_max_bytes > 0 and self._tar.fileobj.tell() >= self.shard_max_bytes
+            too_old = self.shard_max_seconds > 0 and time.time() - self._shard_started_at >= self.shard_max_seconds
+            if not (too_big or too_old):
+                return
+            self._close_shard()
+        # Znacznik czasu i PID w nazwie: kilka procesów (GUI, batch_cli) może pisać do jednego katalogu
+        self._shard_counter += 1
+        self._shard_name = f"crops_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{self._shard_counter:04d}.tar"
+        shard_path = os.path.join(self.archive_dir, self._shard_name)
+        self._tar = tarfile.open(shard_path, "w", format=tarfile.GNU_FORMAT)
+        self._index_file = open(shard_path + ARCHIVE_INDEX_SUFFIX, "a", encoding="utf-8")
+        self._shard_started_at = time.time()
+        print(f"Nowe archiwum wycinków: {shard_path}")
+
+    def _close_shard(self):
+        self._tar.close()
+        self._index_file.close()
+        self._tar = None
+        self._index_file = None
+
+    def close(self):
+        """Zamyka bieżące archiwum (dopisuje znacznik końca tar)."""
+        with self._lock:
+            if self._tar is not None:
+                self._close_shard()
+
+
+def open_crop_output(params, output_root="."):
+    """Tworzy wyjście wycinków zgodnie z parametrem crop_output ("files" lub "archive"; archiwa w output_root/crop_archive_dir)."""
+    if params.get("crop_output", "files") != "archive":
+        return DirectoryCropOutput()
+    return CropArchive(os.path.join(output_root, params["crop_archive_dir"]), int(params["crop_archive_shard_mb"] * 1024 * 1024),
+                       params["crop_archive_shard_seconds"])
+
+
+def read_crop_at(archive_dir, location):
+    """Odczytuje bajty wycinka z położenia zapisanego w metadanych ({"shard", "offset", "length"})."""
+    with open(os.path.join(archive_dir, location["shard"]), "rb") as f:
+        f.seek(location["offset"])
+        return f.read(location["length"])
+
+
+class CropArchiveReader:
+    """Odczyt wycinków po nazwie: indeksy .idx są wczytywane raz do słownika, potem każdy odczyt to seek + read."""
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self._locations = {}
+        for filename in sorted(os.listdir(archive_dir)):
+            if not filename.endswith(ARCHIVE_INDEX_SUFFIX):
+                continue
+            with open(os.path.join(archive_dir, filename), "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Niedokończona ostatnia linia po przerwanym zapisie
+                    self._locations[entry["name"]] = entry
+
+    def names(self):
+        return list(self._locations)
+
+    def location(self, name):
+        return self._locations.get(archive_member_name(name))
+
+    def read(self, name):
+        """Bajty wycinka o danej nazwie lub ścieżce zapisu (np. 'faces/live_face_0_1700000000.png') albo None."""
+        location = self.location(name)
+        return read_crop_at(self.archive_dir, location) if location is not None else None
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="crop_archive", description="Odczyt wycinków z archiwów crop_archive.")
+    parser.add_argument("--archive-dir", default="crop_archive", help="Katalog archiwów (domyślnie: crop_archive).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Wypisz wycinki i ich położenie jako JSONL (stdout).")
+    extract_parser = subparsers.add_parser("extract", help="Zapisz wybrane wycinki jako osobne pliki.")
+    extract_parser.add_argument("names", nargs="+", help="Nazwy wycinków, np. faces/live_face_0_1700000000.png.")
+    extract_parser.add_argument("--output", default=None, help="Plik docelowy (tylko dla jednego wycinka; domyślnie: nazwa pliku wycinka).")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if not os.path.isdir(args.archive_dir):
+        print(f"Katalog archiwów '{args.archive_dir}' nie istnieje.", file=sys.stderr)
+        return 2
+    reader = CropArchiveReader(args.archive_dir)
+    if args.command == "list":
+        for name in reader.names():
+            print(json.dumps(reader.location(name), ensure_ascii=False))
+        return 0
+    if args.output is not None and len(args.names) != 1:
+        print("--output można podać tylko dla jednego wycinka.", file=sys.stderr)
+        return 2
+    exit_code = 0
+    for name in args.names:
+        data = reader.read(name)
+        if data is None:
+            print(f"Brak wycinka '{name}' w archiwach {args.archive_dir}.", file=sys.stderr)
+            exit_code = 1
+            continue
+        output_filepath = args.output or os.path.basename(name)
+        with open(output_filepath, "wb") as f:
+            f.write(data)
+        print(f"Zapisano {output_filepath} ({len(data)} B).", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import cv2
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+# Pamięć podręczna deduplikacji dla przetwarzania wsadowego:
+#  - wejścia: skrót SHA-256 zawartości pliku + odcisk parametrów detekcji -> plik już przetworzony, pomijamy,
+#  - wyjścia: skrót percepcyjny (dHash) zapisanych wycinków -> prawie identyczny wycinek nie jest zapisywany.
+# Obie części mają ograniczony rozmiar (LRU) i są zapisywane do pliku JSON między uruchomieniami.
+# Wyszukiwanie podobnych wycinków nie przegląda wszystkich skrótów: 64 bity dzielimy na crop_hamming_distance + 1
+# pasm i indeksujemy każde pasmo osobno. Skróty różniące się na co najwyżej d bitach mają (z zasady szufladkowej)
+# co najmniej jedno pasmo identyczne, więc wystarczy porównać kandydatów z tych samych kubełków.
+
+DEDUP_CACHE_VERSION = 1
+
+
+def content_hash(file_bytes):
+    """Skrót SHA-256 zawartości pliku."""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def perceptual_hash(image):
+    """64-bitowy dHash obrazu: porównanie sąsiednich pikseli miniatury 9x8 w skali szarości."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(hash_a ^ hash_b).count("1")
+
+
+def _band_masks(band_count):
+    """Przesunięcia i maski band_count rozłącznych pasm pokrywających 64 bity skrótu."""
+    band_count = max(1, min(64, band_count))
+    masks, shift = [], 0
+    for band in range(band_count):
+        width = 64 // band_count + (1 if band < 64 % band_count else 0)
+        masks.append((shift, (1 << width) - 1))
+        shift += width
+    return masks
+
+
+class CropHashIndex:
+    """Skróty wycinków jednego typu w kolejności LRU, z indeksem pasm do wyszukiwania w promieniu Hamminga."""
+
+    def __init__(self, max_distance):
+        self.max_distance = max_distance
+        self.hashes = OrderedDict()
+        self._bands = _band_masks(max_distance + 1)
+        self._buckets = [{} for _ in self._bands]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, crop_hash):
+        self.hashes[crop_hash] = None
+        self.hashes.move_to_end(crop_hash)
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            buckets.setdefault((crop_hash >> shift) & mask, set()).add(crop_hash)
+
+    def pop_oldest(self):
+        crop_hash, _ = self.hashes.popitem(last=False)
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            key = (crop_hash >> shift) & mask
+            bucket = buckets[key]
+            bucket.discard(crop_hash)
+            if not bucket:
+                del buckets[key]
+
+    def find_similar(self, crop_hash):
+        """Zapamiętany skrót w odległości co najwyżej max_distance (przesuwany na koniec LRU) lub None."""
+        if self.max_distance < 0:
+            return None
+        checked = set()
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            for known_hash in buckets.get((crop_hash >> shift) & mask, ()):
+                if known_hash in checked:
+                    continue
+                checked.add(known_hash)
+                if hamming_distance(known_hash, crop_hash) <= self.max_distance:
+                    self.hashes.move_to_end(known_hash)
+                    return known_hash
+        return None
+
+
+class DedupCache:
+    """Ograniczona (LRU), trwała pamięć skrótów wejść i wycinków."""
+
+    def __init__(self, cache_filepath, params_fingerprint, max_entries=100000, crop_hamming_distance=4):
+        self.cache_filepath = cache_filepath
+        self.params_fingerprint = params_fingerprint
+        self.max_entries = max(1, max_entries)
+        self.crop_hamming_distance = crop_hamming_distance
+        self._inputs = OrderedDict()   # skrót zawartości -> (odcisk parametrów, nazwa pliku)
+        self._crops = {}               # typ detekcji -> CropHashIndex
+        self.skipped_inputs_count = 0
+        self.skipped_crops_count = 0
+
+    def load(self):
+        """Wczytuje pamięć z pliku; uszkodzony lub niezgodny plik jest ignorowany."""
+        if not os.path.exists(self.cache_filepath):
+            return
+        try:
+            with open(self.cache_filepath, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != DEDUP_CACHE_VERSION:
+                print(f"Pamięć deduplikacji {self.cache_filepath} ma inną wersję - zaczynam od pustej.")
+                return
+            for digest, fingerprint, filename in data.get("inputs", []):
+                self._inputs[digest] = (fingerprint, filename)
+            for detection_type, hashes in data.get("crops", {}).items():
+                crop_index = self._crops[detection_type] = CropHashIndex(self.crop_hamming_distance)
+                for crop_hash in hashes:
+                    crop_index.add(int(crop_hash))
+            self._evict()
+            print(f"Wczytano pamięć deduplikacji: {len(self._inputs)} wejść, {sum(len(c) for c in self._crops.values())} wycinków.")
+        except (ValueError, TypeError, OSError) as e:
+            print(f"Błąd wczytywania pamięci deduplikacji {self.cache_filepath}: {e}. Zaczynam od pustej.")
+
+    def save(self):
+        """Zapisuje pamięć atomowo (plik tymczasowy + os.replace)."""
+        data = {
+            "version": DEDUP_CACHE_VERSION,
+            "inputs": [[digest, fingerprint, filename] for digest, (fingerprint, filename) in self._inputs.items()],
+            "crops": {detection_type: list(crop_index.hashes) for detection_type, crop_index in self._crops.items()},
+        }
+        temp_filepath = self.cache_filepath + ".tmp"
+        try:
+            with open(temp_filepath, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_filepath, self.cache_filepath)
+        except OSError as e:
+            print(f"Błąd zapisu pamięci deduplikacji {self.cache_filepath}: {e}")
+
+    def known_input_hashes(self):
+        """Zbiór skrótów wejść przetworzonych już z bieżącymi parametrami (przekazywany procesom roboczym)."""
+        return frozenset(digest for digest, (fingerprint, _) in self._inputs.items() if fingerprint == self.params_fingerprint)
+
+    def register_input(self, digest, filename):
+        """Zwraca nazwę pliku, pod którą ta zawartość była już przetworzona z bieżącymi parametrami, lub None (i ją zapamiętuje)."""
+        entry = self._inputs.get(digest)
+        if entry is not None and entry[0] == self.params_fingerprint:
+            self._inputs.move_to_end(digest)
+            self.skipped_inputs_count += 1
+            return entry[1]
+        self._inputs[digest] = (self.params_fingerprint, filename)
+        self._inputs.move_to_end(digest)
+        self._evict()
+        return None
+
+    def is_near_duplicate_crop(self, detection_type, crop_hash):
+        """Sprawdza, czy podobny wycinek był już zapisany; jeśli nie - zapamiętuje jego skrót."""
+        crop_index = self._crops.get(detection_type)
+        if crop_index is None:
+            crop_index = self._crops[detection_type] = CropHashIndex(self.crop_hamming_distance)
+        if crop_index.find_similar(crop_hash) is not None:
+            self.skipped_crops_count += 1
+            return True
+        crop_index.add(crop_hash)
+        self._evict()
+        return False
+
+    def _evict(self):
+        while len(self._inputs) > self.max_entries:
+            self._inputs.popitem(last=False)
+        for crop_index in self._crops.values():
+            while len(crop_index) > self.max_entries:
+                crop_index.pop_oldest()
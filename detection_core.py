@@ -0,0 +1,356 @@
+import cv2
+import os
+import json
+import math
+import hashlib
+
+# Wspólna ścieżka detekcji używana przez GUI (CameraApp) i procesy robocze przetwarzania wsadowego.
+# Moduł celowo nie importuje tkinter ani PIL, aby można go było ładować w procesach bez wyświetlacza.
+
+FACE_CASCADE_PATH = 'haarcascade_frontalface_default.xml'
+PLATE_CASCADE_PATH = 'haarcascade_russian_plate_number.xml'
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+# Formaty zapisu wycinków (klucz w config.json -> rozszerzenie pliku)
+CROP_FORMATS = {"png": ".png", "jpg": ".jpg", "webp": ".webp"}
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.mpg', '.mpeg', '.wmv')
+CONFIG_FILEPATH = "config.json"
+
+# Domyślne parametry detekcji i zapisu (te same nazwy i wartości co atrybuty CameraApp i klucze config.json)
+DEFAULT_DETECTION_PARAMS = {
+    "target_face_width": 800,
+    "target_plate_width": 720,
+    "face_save_padding": 50,
+    "plate_save_padding": 1,
+    "min_face_size": (100, 100),
+    "min_plate_size": (50, 20),
+    "face_detection_scale_factor": 1.1,
+    "face_detection_min_neighbors": 5,
+    "plate_detection_scale_factor": 1.1,
+    "plate_detection_min_neighbors": 5,
+    "face_confidence_threshold": 5.0,
+    "plate_confidence_threshold": 1.0,
+    "roi_size_percentage": 0.9,
+    "image_save_interval_seconds": 1.0,
+    "batch_worker_processes": 0,
+    "shared_pyramid_enabled": False,
+    "face_detection_width": 0,
+    "plate_detection_width": 0,
+    "dedup_enabled": False,
+    "dedup_cache_path": "dedup_cache.json",
+    "dedup_max_entries": 100000,
+    "dedup_crop_hamming_distance": 4,
+    "video_frame_step": 1,
+    "video_segment_seconds": 60.0,
+    "batch_resume_enabled": True,
+    "batch_manifest_path": "batch_manifest.json",
+    "hot_folder_paths": "",
+    "hot_folder_poll_seconds": 1.0,
+    "hot_folder_settle_seconds": 1.0,
+    "hot_folder_queue_size": 64,
+    "detection_metadata_format": "sqlite",
+    "detection_store_path": "detections.db",
+    "face_crop_format": "png",
+    "face_crop_quality": 90,
+    "face_crop_png_compression": 1,
+    "plate_crop_format": "png",
+    "plate_crop_quality": 90,
+    "plate_crop_png_compression": 1,
+    "crop_output": "files",
+    "crop_archive_dir": "crop_archive",
+    "crop_archive_shard_mb": 256.0,
+    "crop_archive_shard_seconds": 3600.0,
+    "tiled_detection_enabled": False,
+    "tiled_detection_min_width": 1920,
+    "tiled_detection_object_factor": 2.0,
+    "tiled_detection_threads": 0,
+    "enabled_detectors": "face,plate",
+}
+
+# Parametry, które nie wpływają na wynik detekcji ani na zapisane wycinki
+_FINGERPRINT_EXCLUDED_PARAMS = ("batch_worker_processes", "dedup_enabled", "dedup_cache_path", "dedup_max_entries",
+                                "dedup_crop_hamming_distance", "video_segment_seconds", "batch_resume_enabled",
+                                "batch_manifest_path", "hot_folder_paths", "hot_folder_poll_seconds",
+                                "hot_folder_settle_seconds", "hot_folder_queue_size", "detection_metadata_format",
+                                "detection_store_path", "crop_output", "crop_archive_dir", "crop_archive_shard_mb",
+                                "crop_archive_shard_seconds", "tiled_detection_threads")
+# Parametry używane tylko przy filmach - odciski (manifest, deduplikacja, benchmark) dotyczą obrazów, więc ich nie obejmują
+VIDEO_ONLY_PARAMS = ("video_frame_step", "image_save_interval_seconds")
+
+
+def load_detection_params(config_filepath=CONFIG_FILEPATH, defaults=None):
+    """Zwraca parametry detekcji: wartości domyślne nadpisane tymi z pliku config.json (jeśli istnieje).
+
+    defaults zastępuje DEFAULT_DETECTION_PARAMS (np. uzupełnione o parametry detektorów z rejestru).
+    """
+    params = dict(DEFAULT_DETECTION_PARAMS if defaults is None else defaults)
+    if not os.path.exists(config_filepath):
+        return params
+    with open(config_filepath, "r", encoding="utf-8") as f:
+        loaded_params = json.load(f)
+    for key, value in loaded_params.items():
+        # Parametry GUI (kolory, czcionki) nie dotyczą detekcji - pomijamy je bez ostrzeżenia
+        if key not in params:
+            continue
+        default_value = params[key]
+        if isinstance(default_value, tuple):
+            params[key] = tuple(int(v) for v in value)
+        elif isinstance(default_value, bool):
+            params[key] = bool(value)
+        else:
+            params[key] = type(default_value)(value)
+    return params
+
+
+def params_fingerprint(params, defaults=None):
+    """Krótki skrót parametrów wpływających na wynik detekcji obrazu (do porównywania wyników między uruchomieniami).
+
+    Brane są pod uwagę klucze z defaults (domyślnie DEFAULT_DETECTION_PARAMS) - parametry GUI i parametry
+    dotyczące tylko filmów są pomijane.
+    """
+    known_params = DEFAULT_DETECTION_PARAMS if defaults is None else defaults
+    relevant = {key: list(value) if isinstance(value, tuple) else value
+                for key, value in params.items()
+                if key in known_params and key not in _FINGERPRINT_EXCLUDED_PARAMS and key not in VIDEO_ONLY_PARAMS}
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def load_cascade(cascade_path):
+    """Wczytuje kaskadę Haara. Zwraca None, jeśli plik nie istnieje lub nie da się go załadować."""
+    if not os.path.exists(cascade_path):
+        return None
+    cascade = cv2.CascadeClassifier(cascade_path)
+    if cascade.empty():
+        return None
+    return cascade
+
+
+def list_image_files(folder_path):
+    """Zwraca listę nazw plików obrazów (.png/.jpg/.jpeg) w podanym folderze."""
+    return [f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def list_video_files(folder_path):
+    """Zwraca listę nazw plików wideo w podanym folderze."""
+    return [f for f in os.listdir(folder_path) if f.lower().endswith(VIDEO_EXTENSIONS)]
+
+
+def is_video_file(path):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def compute_face_roi(frame_width, frame_height, roi_size_percentage):
+    """Zwraca centralny prostokąt ROI (x1, y1, x2, y2) lub None, jeśli ROI byłoby puste."""
+    roi_w = int(frame_width * roi_size_percentage)
+    roi_h = int(frame_height * roi_size_percentage)
+    if roi_w <= 0 or roi_h <= 0 or frame_width <= 0 or frame_height <= 0:
+        return None
+    roi_x1 = int((frame_width - roi_w) / 2)
+    roi_y1 = int((frame_height - roi_h) / 2)
+    return roi_x1, roi_y1, roi_x1 + roi_w, roi_y1 + roi_h
+
+
+def run_cascade(cascade, gray_image, scale_factor, min_neighbors, min_size, max_size=None):
+    """Uruchamia detectMultiScale3 i zwraca listę (x, y, w, h, pewność) we współrzędnych obrazu wejściowego.
+
+    max_size (opcjonalnie) pomija skale, w których okno kaskady jest większe niż podany rozmiar.
+    """
+    if gray_image.size == 0 or gray_image.shape[0] < min_size[1] or gray_image.shape[1] < min_size[0]:
+        return []
+    boxes, _, level_weights = cascade.detectMultiScale3(
+        gray_image,
+        scaleFactor=scale_factor,
+        minNeighbors=min_neighbors,
+        minSize=tuple(min_size),
+        maxSize=tuple(max_size) if max_size else (0, 0),
+        outputRejectLevels=True
+    )
+    detections = []
+    if boxes is None:
+        return detections
+    for i, (x, y, w, h) in enumerate(boxes):
+        confidence = 0.0
+        if level_weights is not None and i < len(level_weights):
+            confidence = float(level_weights[i])
+        detections.append((int(x), int(y), int(w), int(h), confidence))
+    return detections
+
+
+MAX_SHARED_PYRAMID_FACTOR = 8
+# Na pomniejszonym poziomie najmniejszy szukany obiekt musi mieć co najmniej tyle okien kaskady -
+# tuż przy rozmiarze okna kaskady Haara tracą pewność.
+PYRAMID_WINDOW_MARGIN = 2
+
+
+class PreprocessedFrame:
+    """Dane wejściowe kaskad liczone raz na klatkę: skala szarości i jej pomniejszone poziomy.
+
+    Wszystkie detektory korzystają z tej samej konwersji do szarości, a ROI to widoki (bez kopiowania).
+    Poziomy (rozdzielczość detekcji, piramida 2x/4x) powstają leniwie i są współdzielone przez detektory,
+    które pracują w tej samej skali.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self._levels = {1.0: self.gray}
+
+    def level(self, scale):
+        """Zwraca obraz szarości pomniejszony 'scale' razy, budowany z najbliższego dokładniejszego poziomu."""
+        key = round(scale, 4)
+        if key not in self._levels:
+            source = self._levels[max(s for s in self._levels if s <= key)]
+            gray_h, gray_w = self.gray.shape[:2]
+            level_size = (max(1, int(round(gray_w / scale))), max(1, int(round(gray_h / scale))))
+            self._levels[key] = cv2.resize(source, level_size, interpolation=cv2.INTER_AREA)
+        return self._levels[key]
+
+
+def prepare_frame(frame):
+    """Przygotowuje wspólne dane wejściowe dla wszystkich kaskad danej klatki."""
+    return PreprocessedFrame(frame)
+
+
+def shared_pyramid_factor(cascade, min_size, use_shared_pyramid=True):
+    """Największa potęga dwójki, przy której najmniejszy szukany obiekt wciąż mieści zapas okien kaskady."""
+    if not use_shared_pyramid:
+        return 1
+    window_w, window_h = cascade.getOriginalWindowSize()
+    factor = 1
+    while factor * 2 <= MAX_SHARED_PYRAMID_FACTOR and \
+            min_size[0] / (factor * 2) >= window_w * PYRAMID_WINDOW_MARGIN and \
+            min_size[1] / (factor * 2) >= window_h * PYRAMID_WINDOW_MARGIN:
+        factor *= 2
+    return factor
+
+
+def run_cascade_on_prepared(cascade, prepared_frame, roi, scale_factor, min_neighbors, min_size,
+                            use_shared_pyramid=False, detection_width=0, tile_runner=None, cascade_key=None, params=None):
+    """Uruchamia kaskadę na (opcjonalnym) ROI współdzielonego obrazu szarości; zwraca detekcje we współrzędnych klatki.
+
+    detection_width > 0 ogranicza szerokość obrazu, na którym działa kaskada (0 = pełna rozdzielczość).
+    Wyniki są przeliczane z powrotem na współrzędne pełnej rozdzielczości.
+    tile_runner (tiled_detection.TiledCascadeRunner) dzieli dostatecznie szeroki obszar na kafelki
+    przetwarzane równolegle kaskadą cascade_key.
+    """
+    frame_h, frame_w = prepared_frame.gray.shape[:2]
+    roi_x1, roi_y1, roi_x2, roi_y2 = roi if roi is not None else (0, 0, frame_w, frame_h)
+    roi_x1, roi_y1 = max(0, roi_x1), max(0, roi_y1)
+    roi_x2, roi_y2 = min(frame_w, roi_x2), min(frame_h, roi_y2)
+    if roi_x2 <= roi_x1 or roi_y2 <= roi_y1:
+        return []
+    if roi_y2 - roi_y1 < min_size[1] or roi_x2 - roi_x1 < min_size[0]:
+        return []
+
+    resolution_scale = frame_w / float(detection_width) if 0 < detection_width < frame_w else 1.0
+    resolution_min_size = (min_size[0] / resolution_scale, min_size[1] / resolution_scale)
+    scale = resolution_scale * shared_pyramid_factor(cascade, resolution_min_size, use_shared_pyramid)
+
+    level_image = prepared_frame.level(scale)
+    level_x1, level_y1 = int(roi_x1 / scale), int(roi_y1 / scale)
+    region = level_image[level_y1:int(roi_y2 / scale), level_x1:int(roi_x2 / scale)]
+    level_min_size = (max(1, int(math.ceil(min_size[0] / scale))), max(1, int(math.ceil(min_size[1] / scale))))
+    if tile_runner is not None and tile_runner.should_tile(cascade_key, region, params):
+        detections = tile_runner.detect(cascade_key, region, scale_factor, min_neighbors, level_min_size, params)
+    else:
+        detections = run_cascade(cascade, region, scale_factor, min_neighbors, level_min_size)
+    return [(int(round((level_x1 + x) * scale)), int(round((level_y1 + y) * scale)),
+             int(round(w * scale)), int(round(h * scale)), conf) for (x, y, w, h, conf) in detections]
+
+
+def _enabled_tile_runner(params, tile_runner):
+    return tile_runner if params.get("tiled_detection_enabled", False) else None
+
+
+def detect_objects(detection_type, cascade, prepared_frame, params, roi=None, tile_runner=None):
+    """Wykrywa obiekty danego typu w ROI (lub w całej klatce, gdy roi=None); współrzędne wyników są globalne.
+
+    Parametry kaskady pochodzą z kluczy według typu: {typ}_detection_scale_factor, {typ}_detection_min_neighbors,
+    min_{typ}_size i {typ}_detection_width (detectors.DETECTORS).
+    """
+    return run_cascade_on_prepared(cascade, prepared_frame, roi, params[f"{detection_type}_detection_scale_factor"],
+                                   params[f"{detection_type}_detection_min_neighbors"], params[f"min_{detection_type}_size"],
+                                   params.get("shared_pyramid_enabled", False), params.get(f"{detection_type}_detection_width", 0),
+                                   _enabled_tile_runner(params, tile_runner), detection_type, params)
+
+
+def detect_faces(face_cascade, prepared_frame, params, roi=None, tile_runner=None):
+    """Wykrywa twarze w ROI (lub w całej klatce, gdy roi=None); współrzędne wyników są globalne."""
+    return detect_objects("face", face_cascade, prepared_frame, params, roi, tile_runner)
+
+
+def detect_plates(plate_cascade, prepared_frame, params, roi=None, tile_runner=None):
+    """Wykrywa tablice rejestracyjne w ROI (lub w całej klatce, gdy roi=None); współrzędne wyników są globalne."""
+    return detect_objects("plate", plate_cascade, prepared_frame, params, roi, tile_runner)
+
+
+def crop_and_normalize(frame_for_saving, box, padding, target_width):
+    """Wycina obiekt z marginesem i skaluje do docelowej szerokości. Zwraca (obraz, szer., wys.) lub None."""
+    frame_h, frame_w = frame_for_saving.shape[:2]
+    x, y, w, h = box[:4]
+    x1 = max(0, x - padding)
+    y1 = max(0, y - padding)
+    x2 = min(frame_w, x + w + padding)
+    y2 = min(frame_h, y + h + padding)
+    crop = frame_for_saving[y1:y2, x1:x2]
+    if crop.size == 0:
+        return None
+
+    orig_h, orig_w = crop.shape[:2]
+    ratio = target_width / float(orig_w)
+    new_h = int(orig_h * ratio)
+    if new_h <= 0:
+        # Zawsze własna kopia - wycinek trafia do zapisu w tle, a bufor klatki wraca do puli
+        return crop.copy(), orig_w, orig_h
+    resized = cv2.resize(crop, (target_width, new_h), interpolation=cv2.INTER_AREA if ratio < 1.0 else cv2.INTER_LINEAR)
+    return resized, resized.shape[1], resized.shape[0]
+
+
+def crop_encoding(params, detection_type):
+    """Ustawienia kodowania wycinków danego typu: (rozszerzenie, parametry cv2.imencode, opis do metadanych).
+
+    PNG: poziom kompresji 0-9 (wyższy = mniejszy plik, wolniej); JPEG/WebP: jakość 0-100.
+    """
+    crop_format = params[f"{detection_type}_crop_format"]
+    if crop_format not in CROP_FORMATS:
+        raise ValueError(f"Nieznany format wycinków '{crop_format}' (dostępne: {', '.join(CROP_FORMATS)}).")
+    if crop_format == "png":
+        level = params[f"{detection_type}_crop_png_compression"]
+        return ".png", [cv2.IMWRITE_PNG_COMPRESSION, level], {"format": "png", "png_compression": level}
+    quality = params[f"{detection_type}_crop_quality"]
+    quality_flag = cv2.IMWRITE_JPEG_QUALITY if crop_format == "jpg" else cv2.IMWRITE_WEBP_QUALITY
+    return CROP_FORMATS[crop_format], [quality_flag, quality], {"format": crop_format, "quality": quality}
+
+
+def encode_crop(image, extension, encode_params):
+    """Koduje wycinek do bajtów pliku (cv2.imencode zwalnia GIL, więc wątki zapisu kodują równolegle). None przy błędzie."""
+    ok, encoded = cv2.imencode(extension, image, encode_params)
+    return encoded.tobytes() if ok else None
+
+
+def build_detection_json(detection_type, confidence, box, png_filename, saved_w, saved_h, padding, source_info, target_width,
+                         image_encoding=None):
+    """Buduje słownik metadanych detekcji zapisywany obok obrazu wycinka.
+
+    Klucz "png_filename" pozostaje dla zgodności ze starszymi odbiorcami także dla JPEG/WebP;
+    faktyczny format i jakość opisuje "encoding" (wynik crop_encoding).
+    """
+    saved_image_details = {"png_filename": png_filename, "saved_width": int(saved_w), "saved_height": int(saved_h), "padding_applied": padding}
+    if image_encoding is not None:
+        saved_image_details["encoding"] = image_encoding
+    return {
+        "detection_type": detection_type, "confidence_score": float(f"{confidence:.2f}"),
+        "original_detected_object": {"width": int(box[2]), "height": int(box[3])},
+        "saved_image_details": saved_image_details,
+        "source_info": source_info,
+        "normalization": {"target_width": target_width}
+    }
+
+
+def save_detection_json(data_dict, json_filepath):
+    """Zapisuje dane detekcji do pliku JSON."""
+    try:
+        with open(json_filepath, "w", encoding="utf-8") as f:
+            json.dump(data_dict, f, indent=2, ensure_ascii=False)
+        print(f"Zapisano metadane JSON: {json_filepath}")
+    except Exception as e:
+        print(f"Błąd zapisu pliku JSON {json_filepath}: {e}")
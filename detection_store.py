@@ -0,0 +1,287 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+
+import detection_core
+import detectors
+
+# Indeksowany magazyn metadanych detekcji (SQLite) zamiast osobnego pliku JSON dla każdego wycinka.
+# Wiersze są dopisywane przez jeden wątek zapisujący w transakcjach po wiele detekcji (executemany),
+# więc wątki detekcji i zapisu PNG tylko dokładają słownik do bufora. Kolumny z indeksami (czas, typ,
+# źródło, kamera, pewność) pozwalają szybko odpowiadać na zapytania, a pełne metadane w formacie
+# dotychczasowych plików JSON są przechowywane w kolumnie metadata - eksporter odtwarza z nich pliki .json.
+#   python -m detection_store query --type plate --camera 2 --min-confidence 3.0 --since 2026-10-17 --until 2026-10-18
+#   python -m detection_store export --output-dir eksport/
+
+DETECTION_STORE_SCHEMA_VERSION = 1
+METADATA_FORMATS = ("sqlite", "json", "both")
+# Maks. czas oczekiwania flush() na zapis bufora - wywołujący (zamknięcie aplikacji, zmiana kamery) nie mogą zawisnąć
+FLUSH_TIMEOUT_SECONDS = 10.0
+
+_SCHEMA_STATEMENTS = (
+    """CREATE TABLE IF NOT EXISTS detections (
+        id INTEGER PRIMARY KEY,
+        timestamp REAL NOT NULL,
+        detection_type TEXT NOT NULL,
+        confidence REAL NOT NULL,
+        source_type TEXT,
+        camera_index INTEGER,
+        source_name TEXT,
+        frame_index INTEGER,
+        stream_timestamp_ms REAL,
+        image_path TEXT,
+        metadata TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_detections_timestamp ON detections (timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_detections_type_timestamp ON detections (detection_type, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_detections_camera_timestamp ON detections (camera_index, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_detections_source ON detections (source_type, source_name)",
+    "CREATE INDEX IF NOT EXISTS idx_detections_confidence ON detections (detection_type, confidence)",
+)
+
+_INSERT_STATEMENT = ("INSERT INTO detections (timestamp, detection_type, confidence, source_type, camera_index, source_name, "
+                     "frame_index, stream_timestamp_ms, image_path, metadata) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+def _connect(db_path):
+    connection = sqlite3.connect(db_path, timeout=30.0)
+    # WAL: odczyty (zapytania, eksport) nie blokują dopisywania z działającej aplikacji
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+def _ensure_schema(connection):
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, DETECTION_STORE_SCHEMA_VERSION):
+        raise ValueError(f"Nieobsługiwana wersja bazy detekcji: {version}")
+    with connection:
+        for statement in _SCHEMA_STATEMENTS:
+            connection.execute(statement)
+        connection.execute(f"PRAGMA user_version = {DETECTION_STORE_SCHEMA_VERSION}")
+
+
+def _row_from_metadata(json_data, image_path):
+    source_info = json_data.get("source_info", {})
+    return (float(source_info.get("timestamp", time.time())), json_data["detection_type"], float(json_data["confidence_score"]),
+            source_info.get("source_type"), source_info.get("camera_index"), source_info.get("original_filename"),
+            source_info.get("frame_index"), source_info.get("stream_timestamp_ms"), image_path,
+            json.dumps(json_data, ensure_ascii=False))
+
+
+class DetectionStore:
+    """Magazyn detekcji z buforowanym zapisem w tle. add() jest bezpieczne wątkowo i nie czeka na dysk."""
+
+    def __init__(self, db_path, batch_size=256, flush_interval_seconds=1.0):
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval_seconds = flush_interval_seconds
+        connection = _connect(db_path)
+        try:
+            _ensure_schema(connection)
+        finally:
+            connection.close()
+        self._pending_rows = []
+        self._condition = threading.Condition()
+        self._written_generation = 0
+        self._submitted_generation = 0
+        self._closed = False
+        self.inserted_count = 0
+        self.failed_count = 0
+        self._writer_thread = threading.Thread(target=self._writer_loop, name="DetectionStore", daemon=True)
+        self._writer_thread.start()
+
+    def add(self, json_data, image_path=None):
+        """Dodaje detekcję (słownik w formacie build_detection_json) do bufora zapisu."""
+        row = _row_from_metadata(json_data, image_path)
+        with self._condition:
+            if self._closed:
+                self.failed_count += 1
+                return
+            self._pending_rows.append(row)
+            self._submitted_generation += 1
+            if len(self._pending_rows) >= self.batch_size:
+                self._condition.notify_all()
+
+    def flush(self, timeout=FLUSH_TIMEOUT_SECONDS):
+        """Czeka (najwyżej timeout sekund), aż dodane dotąd detekcje zostaną zapisane. Zwraca False, jeśli nie zdążyły."""
+        with self._condition:
+            target_generation = self._submitted_generation
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: self._written_generation >= target_generation or self._closed, timeout)
+            return self._written_generation >= target_generation
+
+    def close(self):
+        """Zapisuje bufor i zatrzymuje wątek zapisujący."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._writer_thread.join(timeout=10.0)
+
+    def _writer_loop(self):
+        try:
+            self._write_pending_rows()
+        except Exception as e:
+            print(f"Błąd wątku zapisu bazy detekcji {self.db_path}: {e}")
+            traceback.print_exc()
+        finally:
+            # Wątek nie działa: kolejne add() są liczone jako błędy, a flush() nie czeka na zapis, który nie nastąpi
+            with self._condition:
+                self._closed = True
+                self.failed_count += len(self._pending_rows)
+                self._pending_rows = []
+                self._condition.notify_all()
+
+    def _write_pending_rows(self):
+        connection = _connect(self.db_path)
+        try:
+            while True:
+                with self._condition:
+                    if not self._closed and len(self._pending_rows) < self.batch_size:
+                        self._condition.wait(self.flush_interval_seconds)
+                    rows, self._pending_rows = self._pending_rows, []
+                    generation = self._submitted_generation
+                    closed = self._closed
+                if rows:
+                    try:
+                        with connection:
+                            connection.executemany(_INSERT_STATEMENT, rows)
+                        self.inserted_count += len(rows)
+                    except sqlite3.Error as e:
+                        self.failed_count += len(rows)
+                        print(f"Błąd zapisu {len(rows)} detekcji do bazy {self.db_path}: {e}")
+                with self._condition:
+                    self._written_generation = generation
+                    self._condition.notify_all()
+                if closed:
+                    return
+        finally:
+            connection.close()
+
+
+def open_detection_store(params):
+    """Tworzy magazyn detekcji, jeśli format metadanych go używa ("sqlite" lub "both"); w przeciwnym razie None."""
+    if params.get("detection_metadata_format", "sqlite") == "json":
+        return None
+    try:
+        return DetectionStore(params["detection_store_path"])
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Nie można otworzyć bazy detekcji {params['detection_store_path']}: {e}. Metadane zostaną zapisane jako pliki JSON.")
+        return None
+
+
+def write_detection_metadata(json_data, json_filepath, image_path, store, metadata_format="sqlite"):
+    """Zapisuje metadane detekcji do bazy i/lub (format "json"/"both" albo brak bazy) do pliku JSON obok obrazu."""
+    if store is not None:
+        store.add(json_data, image_path)
+    if store is None or metadata_format == "both":
+        detection_core.save_detection_json(json_data, json_filepath)
+
+
+def query_detections(db_path, detection_type=None, camera_index=None, source_type=None, source_name=None,
+                     min_confidence=None, since=None, until=None, limit=None):
+    """Zwraca listę detekcji (słowniki z kolumnami i metadanymi) spełniających filtry; since/until to znaczniki czasu unix."""
+    conditions, arguments = [], []
+    for column, operator, value in (("detection_type", "=", detection_type), ("camera_index", "=", camera_index),
+                                    ("source_type", "=", source_type), ("source_name", "=", source_name),
+                                    ("confidence", ">=", min_confidence), ("timestamp", ">=", since), ("timestamp", "<", until)):
+        if value is not None:
+            conditions.append(f"{column} {operator} ?")
+            arguments.append(value)
+    sql = "SELECT id, timestamp, detection_type, confidence, source_type, camera_index, source_name, frame_index, " \
+          "stream_timestamp_ms, image_path, metadata FROM detections"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY timestamp, id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        arguments.append(int(limit))
+    connection = _connect(db_path)
+    try:
+        connection.row_factory = sqlite3.Row
+        detections = []
+        for row in connection.execute(sql, arguments):
+            detection = dict(row)
+            detection["metadata"] = json.loads(detection["metadata"])
+            detections.append(detection)
+        return detections
+    finally:
+        connection.close()
+
+
+def export_legacy_json(db_path, output_dir=None, overwrite=False, **filters):
+    """Odtwarza pliki JSON (jeden na detekcję, format sprzed bazy) obok obrazów lub w output_dir. Zwraca liczbę plików."""
+    exported_count = 0
+    for detection in query_detections(db_path, **filters):
+        metadata = detection["metadata"]
+        png_filename = metadata["saved_image_details"]["png_filename"]
+        target_dir = output_dir if output_dir else os.path.dirname(detection["image_path"] or "")
+        json_filepath = os.path.join(target_dir, os.path.splitext(png_filename)[0] + ".json")
+        if not overwrite and os.path.exists(json_filepath):
+            continue
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
+        with open(json_filepath, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        exported_count += 1
+    return exported_count
+
+
+def _parse_time(value):
+    """Parsuje czas: znacznik unix, data 'RRRR-MM-DD' lub 'RRRR-MM-DDTGG:MM[:SS]' (czas lokalny)."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Nieprawidłowy czas '{value}'. Oczekiwano RRRR-MM-DD[THH:MM[:SS]] lub znacznika unix.")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="detection_store", description="Zapytania i eksport z bazy detekcji (SQLite).")
+    parser.add_argument("--db", default="detections.db", help="Plik bazy detekcji (domyślnie: detections.db).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    query_parser = subparsers.add_parser("query", help="Wypisz detekcje jako JSONL (stdout).")
+    export_parser = subparsers.add_parser("export", help="Odtwórz pliki JSON w dotychczasowym formacie (jeden na detekcję).")
+    export_parser.add_argument("--output-dir", default=None, help="Katalog docelowy (domyślnie: obok zapisanych obrazów).")
+    export_parser.add_argument("--overwrite", action="store_true", help="Nadpisuj istniejące pliki JSON.")
+    for subparser in (query_parser, export_parser):
+        subparser.add_argument("--type", dest="detection_type", choices=tuple(detectors.DETECTORS), help="Typ detekcji.")
+        subparser.add_argument("--camera", dest="camera_index", type=int, help="Indeks kamery (-1 = pliki).")
+        subparser.add_argument("--source-type", choices=("live_camera", "image_file", "video_file"), help="Rodzaj źródła.")
+        subparser.add_argument("--source-name", help="Nazwa pliku źródłowego.")
+        subparser.add_argument("--min-confidence", type=float, help="Minimalna pewność.")
+        subparser.add_argument("--since", type=_parse_time, help="Od (włącznie), np. 2026-10-17.")
+        subparser.add_argument("--until", type=_parse_time, help="Do (wyłącznie), np. 2026-10-18.")
+        subparser.add_argument("--limit", type=int, help="Maks. liczba detekcji.")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if not os.path.exists(args.db):
+        print(f"Baza detekcji '{args.db}' nie istnieje.", file=sys.stderr)
+        return 2
+    filters = {key: getattr(args, key) for key in ("detection_type", "camera_index", "source_type", "source_name",
+                                                   "min_confidence", "since", "until", "limit")}
+    if args.command == "query":
+        for detection in query_detections(args.db, **filters):
+            print(json.dumps(detection, ensure_ascii=False))
+        return 0
+    with contextlib.redirect_stdout(sys.stderr):
+        exported_count = export_legacy_json(args.db, args.output_dir, args.overwrite, **filters)
+        print(f"Wyeksportowano plików JSON: {exported_count}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+import os
+import threading
+
+import cv2
+
+import detection_core
+
+# Rejestr detektorów. Każdy wpis deklaruje:
+#   - model: plik kaskady Haara,
+#   - wymagania wejściowe: parametry o nazwach według typu ({typ}_detection_scale_factor,
+#     {typ}_detection_min_neighbors, min_{typ}_size, {typ}_detection_width),
+#   - obszar: centralne ROI (roi_size_percentage) albo cała klatka; na żywo strefy z {typ}_detection_regions mają pierwszeństwo
+#     (twarze i tablice: atrybuty CameraApp, pozostałe detektory: klucze config.json o tej nazwie),
+#   - politykę zapisu: katalog wycinków, {typ}_confidence_threshold, {typ}_save_padding, target_{typ}_width
+#     i format wycinka ({typ}_crop_format ...).
+# Twarze i tablice mają parametry w DEFAULT_DETECTION_PARAMS (i atrybuty CameraApp); pozostałe detektory
+# wnoszą własne wartości domyślne, które można nadpisać w config.json kluczami o tych samych nazwach.
+# Silnik uruchamia zestaw z enabled_detectors na wspólnym PreprocessedFrame: szarość i pomniejszone poziomy
+# liczone są raz na klatkę, więc kolejny detektor to tylko jego kaskada, bez dodatkowego przygotowania klatki.
+
+ROI_CENTER = "center"
+ROI_FULL_FRAME = "full_frame"
+
+
+def _opencv_cascade_path(filename):
+    """Ścieżka kaskady dostarczanej z pakietem opencv-python (cv2.data); pusta, gdy pakiet jej nie zawiera."""
+    cascades_dir = getattr(getattr(cv2, "data", None), "haarcascades", "")
+    return os.path.join(cascades_dir, filename) if cascades_dir else filename
+
+
+# Parametry należące do jednego detektora; pozostałe (np. kafelki, wspólna piramida) dotyczą wszystkich detektorów
+DETECTOR_PARAM_TEMPLATES = ("{type}_detection_scale_factor", "{type}_detection_min_neighbors", "min_{type}_size",
+                            "{type}_detection_width", "{type}_confidence_threshold", "{type}_save_padding",
+                            "target_{type}_width", "{type}_crop_format", "{type}_crop_quality", "{type}_crop_png_compression")
+
+
+def detector_param_names(detection_type):
+    return tuple(template.format(type=detection_type) for template in DETECTOR_PARAM_TEMPLATES)
+
+
+def _type_params(detection_type, min_size, min_neighbors=5, confidence_threshold=1.0, save_padding=10, target_width=400):
+    """Komplet parametrów detektora według konwencji nazw typu."""
+    return {
+        f"{detection_type}_detection_scale_factor": 1.1,
+        f"{detection_type}_detection_min_neighbors": min_neighbors,
+        f"min_{detection_type}_size": min_size,
+        f"{detection_type}_detection_width": 0,
+        f"{detection_type}_confidence_threshold": confidence_threshold,
+        f"{detection_type}_save_padding": save_padding,
+        f"target_{detection_type}_width": target_width,
+        f"{detection_type}_crop_format": "png",
+        f"{detection_type}_crop_quality": 90,
+        f"{detection_type}_crop_png_compression": 1,
+    }
+
+
+class DetectorSpec:
+    """Opis detektora: model, obszar, polityka zapisu i domyślne parametry (gdy nie ma ich w DEFAULT_DETECTION_PARAMS)."""
+
+    def __init__(self, name, cascade_path, label, save_dir, roi_policy=ROI_FULL_FRAME, alert_text=None,
+                 color=(0, 255, 0), default_params=None):
+        self.name = name # Typ detekcji: prefiks parametrów, detection_type w metadanych i nazwach plików
+        self.cascade_path = cascade_path
+        self.label = label # Nazwa w komunikatach, np. "Zapisano twarz"
+        self.save_dir = save_dir
+        self.roi_policy = roi_policy # Obszar na żywo; wsad zawsze skanuje cały obraz
+        self.alert_text = alert_text or name.upper() # Komunikat nakładki (ASCII), gdy detektor coś znalazł
+        self.color = color # Kolor ramek, gdy CameraApp nie ma atrybutu rect_{name}_color
+        self.default_params = dict(default_params or {})
+
+
+DETECTORS = {}
+
+
+def register_detector(spec):
+    """Dodaje detektor do rejestru (lub zastępuje wpis o tej samej nazwie)."""
+    DETECTORS[spec.name] = spec
+    return spec
+
+
+register_detector(DetectorSpec("face", detection_core.FACE_CASCADE_PATH, "twarz", "faces", ROI_CENTER, "TWARZ W ROI", (0, 0, 255)))
+register_detector(DetectorSpec("plate", detection_core.PLATE_CASCADE_PATH, "tablicę", "plates", ROI_FULL_FRAME, "TABLICA REJ.", (0, 255, 255)))
+register_detector(DetectorSpec("eye", _opencv_cascade_path("haarcascade_eye.xml"), "oko", "eyes", ROI_CENTER, "OKO",
+                               (255, 0, 0), _type_params("eye", (20, 20), min_neighbors=10, save_padding=5, target_width=200)))
+register_detector(DetectorSpec("profile_face", _opencv_cascade_path("haarcascade_profileface.xml"), "twarz z profilu", "profile_faces",
+                               ROI_CENTER, "PROFIL W ROI", (0, 0, 160),
+                               _type_params("profile_face", (100, 100), confidence_threshold=3.0, save_padding=50, target_width=800)))
+register_detector(DetectorSpec("body", _opencv_cascade_path("haarcascade_fullbody.xml"), "sylwetkę", "bodies", ROI_FULL_FRAME, "SYLWETKA",
+                               (0, 255, 0), _type_params("body", (60, 120), min_neighbors=3, save_padding=20, target_width=400)))
+
+
+def parse_enabled_detectors(text):
+    """Nazwy detektorów z tekstu 'face,plate' (bez powtórzeń). Zgłasza ValueError dla nieznanych nazw."""
+    names = [name.strip() for name in text.split(",") if name.strip()]
+    unknown = [name for name in names if name not in DETECTORS]
+    if unknown:
+        raise ValueError(f"Nieznane detektory: {', '.join(unknown)}. Dostępne: {', '.join(DETECTORS)}.")
+    return list(dict.fromkeys(names))
+
+
+def configured_detectors(params):
+    """Specyfikacje detektorów z enabled_detectors, w podanej kolejności."""
+    return [DETECTORS[name] for name in parse_enabled_detectors(params["enabled_detectors"])]
+
+
+def with_detector_defaults(params):
+    """Parametry uzupełnione wartościami domyślnymi zarejestrowanych detektorów (wartości z params mają pierwszeństwo)."""
+    merged = {}
+    for spec in DETECTORS.values():
+        merged.update(spec.default_params)
+    merged.update(params)
+    return merged
+
+
+def load_detection_params(config_filepath=detection_core.CONFIG_FILEPATH):
+    """Jak detection_core.load_detection_params, ale z parametrami wszystkich zarejestrowanych detektorów."""
+    return detection_core.load_detection_params(config_filepath, with_detector_defaults(detection_core.DEFAULT_DETECTION_PARAMS))
+
+
+def params_fingerprint(params):
+    """Skrót parametrów wpływających na wynik: DEFAULT_DETECTION_PARAMS i parametry włączonych detektorów z rejestru."""
+    known_params = dict(detection_core.DEFAULT_DETECTION_PARAMS)
+    for spec in configured_detectors(params):
+        known_params.update(spec.default_params)
+    return detection_core.params_fingerprint(params, known_params)
+
+
+def detector_fingerprints(params):
+    """{detektor: odcisk} włączonych detektorów (manifest wsadowy).
+
+    Odcisk detektora obejmuje jego własne parametry i parametry wspólne, ale nie parametry innych detektorów
+    ani listę enabled_detectors - zmiana progu tablic albo dołożenie detektora nie unieważnia wyników twarzy.
+    """
+    own_params = {key for name in DETECTORS for key in detector_param_names(name)}
+    known_params = dict(detection_core.DEFAULT_DETECTION_PARAMS)
+    for spec in DETECTORS.values():
+        known_params.update(spec.default_params)
+    shared_params = {key: None for key in known_params if key not in own_params and key != "enabled_detectors"}
+    fingerprints = {}
+    for spec in configured_detectors(params):
+        detector_params = dict(shared_params, detector=None, **{key: None for key in detector_param_names(spec.name)})
+        fingerprints[spec.name] = detection_core.params_fingerprint(dict(params, detector=spec.name), detector_params)
+    return fingerprints
+
+
+def cascade_paths(specs, base_dir="", overrides=None):
+    """Ścieżki modeli {nazwa: ścieżka} dla listy specyfikacji.
+
+    Ścieżki względne są liczone od base_dir; overrides ({nazwa: ścieżka}, np. z flag CLI) zastępuje niepuste wpisy.
+    """
+    paths = {spec.name: os.path.join(base_dir, spec.cascade_path) for spec in specs}
+    for name, override in (overrides or {}).items():
+        if override and name in paths:
+            paths[name] = override
+    return paths
+
+
+def load_cascades(paths):
+    """Ładuje kaskady {nazwa: ścieżka}; pomija puste ścieżki i modele, których nie da się wczytać."""
+    cascades = {}
+    for name, path in paths.items():
+        cascade = detection_core.load_cascade(path) if path else None
+        if cascade is not None:
+            cascades[name] = cascade
+    return cascades
+
+
+class DetectorCostReport:
+    """Koszt każdego detektora: łączny czas kaskady, liczba uruchomień i detekcji. Bezpieczny dla wielu wątków."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def record(self, name, seconds, detections_count, runs=1):
+        with self._lock:
+            totals = self._totals.setdefault(name, [0.0, 0, 0])
+            totals[0] += seconds
+            totals[1] += runs
+            totals[2] += detections_count
+
+    def reset(self):
+        with self._lock:
+            self._totals = {}
+
+    def summary(self):
+        """{nazwa: {"runs", "total_s", "mean_ms", "share", "detections"}}; share to udział w łącznym czasie kaskad."""
+        with self._lock:
+            totals = {name: list(values) for name, values in self._totals.items()}
+        all_seconds = sum(values[0] for values in totals.values())
+        return {name: {"runs": runs, "total_s": round(seconds, 3), "mean_ms": round(seconds * 1000.0 / runs, 2) if runs else 0.0,
+                       "share": seconds / all_seconds if all_seconds else 0.0, "detections": detections_count}
+                for name, (seconds, runs, detections_count) in totals.items()}
+
+    def lines(self):
+        """Linie raportu (ASCII - także na nakładkę), od najdroższego detektora."""
+        summary = self.summary()
+        return [f"{name}: {stats['mean_ms']:.1f} ms/uruchomienie, {stats['share'] * 100:.0f}% czasu kaskad, "
+                f"uruchomienia {stats['runs']}, detekcje {stats['detections']}"
+                for name, stats in sorted(summary.items(), key=lambda item: item[1]["total_s"], reverse=True)]
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import numpy as np
+
+# Przekazywanie klatek między wątkiem przechwytywania kamery a etapem detekcji.
+# Slot mieści jedną klatkę, więc opóźnienie podglądu jest ograniczone czasem jednej detekcji,
+# a nie długością kolejki. Nadmiarowe klatki są odrzucane zgodnie z wybraną polityką.
+# Bufory klatek krążą w pulach (FrameBufferPool), więc w stanie ustalonym pętla nie alokuje pełnych klatek.
+
+FRAME_DROP_POLICIES = ("latest", "skip_if_busy")
+
+
+class LatestFrameSlot:
+    """Jednoelementowy, bezpieczny wątkowo slot na najnowszą klatkę z licznikiem odrzuconych klatek.
+
+    Polityki odrzucania:
+      - "latest": nowa klatka zastępuje nieodebraną (detekcja zawsze dostaje najświeższą),
+      - "skip_if_busy": nowa klatka jest odrzucana, dopóki poprzednia nie zostanie odebrana.
+    Dodatkowo klatki starsze niż max_frame_age_seconds (0 = bez limitu) są odrzucane przy odbiorze.
+    on_drop(klatka) jest wywoływane dla każdej odrzuconej klatki (np. zwrot bufora do puli).
+    """
+
+    def __init__(self, policy="latest", max_frame_age_seconds=0.0, on_drop=None):
+        if policy not in FRAME_DROP_POLICIES:
+            raise ValueError(f"Nieznana polityka odrzucania klatek: {policy}")
+        self.policy = policy
+        self.max_frame_age_seconds = max_frame_age_seconds
+        self.on_drop = on_drop
+        self._condition = threading.Condition()
+        self._frame = None
+        self._capture_time = 0.0
+        self._closed = False
+        self.captured_frames_count = 0
+        self.dropped_frames_count = 0
+
+    def put(self, frame, capture_time):
+        """Umieszcza klatkę w slocie (wywoływane przez wątek przechwytywania)."""
+        dropped_frame = None
+        with self._condition:
+            self.captured_frames_count += 1
+            if self._frame is not None:
+                self.dropped_frames_count += 1
+                if self.policy == "skip_if_busy":
+                    dropped_frame = frame
+                else:
+                    dropped_frame = self._frame
+            if dropped_frame is not frame:
+                self._frame = frame
+                self._capture_time = capture_time
+                self._condition.notify()
+        if dropped_frame is not None and self.on_drop is not None:
+            self.on_drop(dropped_frame)
+
+    def get(self, timeout=None):
+        """Zwraca (klatka, czas_przechwycenia) lub None, jeśli w czasie timeout nie pojawiła się świeża klatka."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                while self._frame is None and not self._closed:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+                if self._frame is None:
+                    return None
+                frame, capture_time = self._frame, self._capture_time
+                self._frame = None
+                if self.max_frame_age_seconds > 0 and time.time() - capture_time > self.max_frame_age_seconds:
+                    self.dropped_frames_count += 1
+                    if self.on_drop is not None:
+                        self.on_drop(frame)
+                    continue
+                return frame, capture_time
+
+    def has_frame(self):
+        """Czy w slocie czeka nieodebrana klatka."""
+        with self._condition:
+            return self._frame is not None
+
+    def close(self):
+        """Budzi oczekujący etap detekcji (np. przy zatrzymywaniu kamery)."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class FrameBufferPool:
+    """Pula buforów klatek do ponownego użycia: acquire() zwraca wolny bufor o danym kształcie lub alokuje nowy."""
+
+    def __init__(self, max_free_buffers=4):
+        self.max_free_buffers = max_free_buffers
+        self._free_buffers = []
+        self._lock = threading.Lock()
+        self.allocated_count = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        with self._lock:
+            while self._free_buffers:
+                buffer = self._free_buffers.pop()
+                if buffer.shape == shape and buffer.dtype == dtype:
+                    buffer.flags.writeable = True
+                    return buffer
+            self.allocated_count += 1
+        return np.empty(shape, dtype)
+
+    def release(self, buffer):
+        """Zwraca bufor do puli. Po zwrocie nie wolno już z niego korzystać."""
+        with self._lock:
+            if len(self._free_buffers) < self.max_free_buffers:
+                self._free_buffers.append(buffer)
@@ -0,0 +1,195 @@
+import os
+import queue
+import threading
+import time
+import traceback
+
+import detection_core
+import batch_engine
+
+# Ciągłe pobieranie obrazów z obserwowanych katalogów ("hot folder").
+# Wątek obserwatora co poll_seconds przegląda katalogi (os.scandir - jedno wywołanie systemowe na katalog,
+# rozmiar i czas modyfikacji bez dodatkowego os.stat) i zgłasza plik dopiero wtedy, gdy jego rozmiar
+# i czas modyfikacji nie zmieniły się przez settle_seconds, czyli gdy zapis pliku się zakończył.
+# Gotowe ścieżki trafiają do ograniczonej kolejki, z której korzysta stała pula procesów z batch_engine.
+# Liczba plików w puli jest dodatkowo ograniczona semaforem, więc przy zalewie plików pamięć nie rośnie:
+# obserwator czeka na miejsce w kolejce, a nieprzyjęte pliki zostaną znalezione przy kolejnym skanowaniu.
+
+
+def parse_folder_list(text, default_folder="images"):
+    """Parsuje listę katalogów oddzielonych ';' (puste = katalog domyślny)."""
+    folders = [part.strip() for part in text.split(';') if part.strip()]
+    return folders or [default_folder]
+
+
+class FolderWatcher:
+    """Wykrywa nowe lub zmienione obrazy w katalogach przez okresowe skanowanie."""
+
+    def __init__(self, folders, settle_seconds=1.0, should_skip=None):
+        self.folders = list(folders)
+        self.settle_seconds = settle_seconds
+        self.should_skip = should_skip  # np. manifest.is_processed - pliki przetworzone w poprzednich przebiegach
+        self._candidates = {}  # ścieżka -> (sygnatura, czas pierwszego zauważenia tej sygnatury)
+        self._reported = {}    # ścieżka -> sygnatura zgłoszona do przetworzenia
+
+    def poll(self, now=None):
+        """Jedno skanowanie katalogów. Zwraca ścieżki plików gotowych do przetworzenia (każda wersja pliku raz)."""
+        now = time.time() if now is None else now
+        ready_paths = []
+        present_paths = set()
+        for folder in self.folders:
+            try:
+                entries = list(os.scandir(folder))
+            except OSError:
+                continue
+            for entry in sorted(entries, key=lambda e: e.name):
+                if not entry.name.lower().endswith(detection_core.IMAGE_EXTENSIONS):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat_result = entry.stat()
+                except OSError:
+                    continue  # Plik zniknął między listowaniem a odczytem
+                path = entry.path
+                present_paths.add(path)
+                signature = (stat_result.st_size, stat_result.st_mtime_ns)
+                if self._reported.get(path) == signature:
+                    continue
+                candidate = self._candidates.get(path)
+                if candidate is None or candidate[0] != signature:
+                    self._candidates[path] = (signature, now)
+                    continue
+                if now - candidate[1] < self.settle_seconds or signature[0] == 0:
+                    continue
+                del self._candidates[path]
+                self._reported[path] = signature
+                if self.should_skip is not None and self.should_skip(path):
+                    continue
+                ready_paths.append(path)
+        # Zapominamy usunięte pliki, aby stan obserwatora nie rósł bez końca
+        for path in [p for p in self._reported if p not in present_paths]:
+            del self._reported[path]
+        for path in [p for p in self._candidates if p not in present_paths]:
+            del self._candidates[path]
+        return ready_paths
+
+    def forget(self, path):
+        """Pozwala zgłosić plik ponownie przy następnym skanowaniu (np. gdy nie zmieścił się w kolejce)."""
+        self._reported.pop(path, None)
+
+
+class HotFolderIngest:
+    """Obserwator katalogów + ograniczona kolejka + stała pula procesów detekcji.
+
+    on_result(result) jest wywoływane w wątku konsumenta dla każdego wyniku (zapis wycinków, liczniki)
+    i zwraca liczbę zapisanych detekcji; pliki bez błędu są następnie oznaczane w manifeście.
+    """
+
+    def __init__(self, folders, params, cascade_paths, worker_count, on_result,
+                 manifest=None, dedup=None, opencv_threads=None):
+        self.params = params
+        self.cascade_paths = cascade_paths
+        self.worker_count = max(1, worker_count)
+        self.on_result = on_result
+        self.manifest = manifest
+        self.dedup = dedup
+        self.opencv_threads = opencv_threads
+        self.watcher = FolderWatcher(folders, params["hot_folder_settle_seconds"],
+                                     manifest.is_processed if manifest is not None else None)
+        self._path_queue = queue.Queue(maxsize=max(1, params["hot_folder_queue_size"]))
+        self._in_flight = threading.BoundedSemaphore(self.worker_count * 2)
+        self._running = False
+        self._watcher_thread = None
+        self._consumer_thread = None
+        self.processed_files_count = 0
+        self.saved_detections_count = 0
+        self.failed_files_count = 0
+
+    def start(self):
+        self._running = True
+        self._watcher_thread = threading.Thread(target=self._watch_loop, name="HotFolderWatcher", daemon=True)
+        self._consumer_thread = threading.Thread(target=self._consume_loop, name="HotFolderIngest", daemon=True)
+        self._watcher_thread.start()
+        self._consumer_thread.start()
+
+    def stop(self, timeout=5.0):
+        """Zatrzymuje obserwację; pliki w trakcie przetwarzania są porzucane (nie trafiają do manifestu).
+
+        Manifest i pamięć duplikatów zapisuje wątek konsumenta przy wyjściu - jedyny wątek, który je zmienia.
+        """
+        self._running = False
+        for thread in (self._watcher_thread, self._consumer_thread):
+            if thread is not None:
+                thread.join(timeout=timeout)
+        if self._consumer_thread is not None and self._consumer_thread.is_alive():
+            print("Ostrzeżenie: Przetwarzanie obserwowanych katalogów nie zakończyło się w czasie - manifest zostanie zapisany po jego zakończeniu.")
+
+    def is_running(self):
+        return self._running
+
+    def stats(self):
+        return {"queued": self._path_queue.qsize(), "queue_capacity": self._path_queue.maxsize,
+                "processed": self.processed_files_count, "saved": self.saved_detections_count,
+                "failed": self.failed_files_count}
+
+    def _watch_loop(self):
+        poll_seconds = max(0.05, self.params["hot_folder_poll_seconds"])
+        try:
+            while self._running:
+                ready_paths = self.watcher.poll()
+                for position, path in enumerate(ready_paths):
+                    try:
+                        self._path_queue.put(path, timeout=poll_seconds)
+                    except queue.Full:
+                        # Kolejka pełna: resztę plików obserwator zgłosi ponownie przy kolejnym skanowaniu
+                        for skipped_path in ready_paths[position:]:
+                            self.watcher.forget(skipped_path)
+                        break
+                if self._running:
+                    time.sleep(poll_seconds)
+        except Exception as e:
+            print(f"Błąd obserwatora katalogów: {e}")
+            traceback.print_exc()
+
+    def _pending_paths(self):
+        """Nieskończony strumień zadań dla puli; kończy się po stop(). Wstrzymuje się, gdy w puli jest dość plików."""
+        while self._running:
+            try:
+                path = self._path_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # Z manifestem uruchamiane są tylko detektory, których wyników pliku jeszcze nie ma
+            task = self.manifest.pending_task(path) if self.manifest is not None else path
+            if task is None:
+                continue
+            while not self._in_flight.acquire(timeout=0.5):
+                if not self._running:
+                    return
+            yield task
+
+    def _consume_loop(self):
+        try:
+            results = batch_engine.process_files_in_pool(
+                self._pending_paths(), self.params, self.cascade_paths,
+                self.worker_count, should_continue=lambda: self._running, dedup=self.dedup,
+                opencv_threads=self.opencv_threads)
+            for result in results:
+                self._in_flight.release()
+                self.processed_files_count += 1
+                if result["error"]:
+                    self.failed_files_count += 1
+                    print(f"  !! Błąd podczas przetwarzania pliku {result['image_path']}: {result['error']}")
+                    continue
+                self.saved_detections_count += self.on_result(result)
+                if self.manifest is not None:
+                    self.manifest.mark_processed(result["image_path"], batch_engine.saved_counts_by_detector(result))
+        except Exception as e:
+            print(f"Błąd przetwarzania obserwowanych katalogów: {e}")
+            traceback.print_exc()
+        finally:
+            self._running = False
+            if self.manifest is not None:
+                self.manifest.save()
+            if self.dedup is not None:
+                self.dedup.save()
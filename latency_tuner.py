@@ -0,0 +1,119 @@
+import collections
+import json
+import threading
+import time
+
+import detectors
+
+# Automatyczne strojenie parametrów kaskad pod budżet czasu detekcji (podgląd na żywo).
+# Regulator ma poziomy 0..latency_tuner_steps: poziom 0 to wartości z konfiguracji, a każdy kolejny
+# przesuwa parametry liniowo w stronę skonfigurowanych granic - większy krok skali, większy minimalny
+# rozmiar obiektu i mniejsze ROI twarzy (mniej okien kaskady), a minNeighbors w dół do progu, bo przy
+# rzadszej siatce skal ten sam obiekt daje mniej trafień. Decyzja zapada na podstawie mediany czasu kaskad
+# z ostatnich klatek: powyżej budżetu - poziom w górę, poniżej latency_tuner_release_ratio budżetu - poziom
+# w dół (aż do wartości z konfiguracji). Każdy poziom jest utrzymywany co najmniej latency_tuner_hold_seconds,
+# a każda zmiana trafia do dziennika JSONL, aby można było ocenić koszt w dokładności.
+
+# Mediana z tylu klatek z detekcją decyduje o zmianie poziomu
+LATENCY_TUNER_WINDOW = 15
+
+_log_lock = threading.Lock()
+
+
+def target_latency_ms(params):
+    """Budżet czasu kaskad na klatkę (ms): z latency_tuner_target_fps, jeśli > 0, w przeciwnym razie latency_tuner_target_ms."""
+    target_fps = params["latency_tuner_target_fps"]
+    return 1000.0 / target_fps if target_fps > 0 else params["latency_tuner_target_ms"]
+
+
+def tuned_params(params, level):
+    """Kopia parametrów z wartościami kaskad dla danego poziomu regulatora (0 = bez zmian)."""
+    steps = max(1, params["latency_tuner_steps"])
+    fraction = min(max(level, 0), steps) / float(steps)
+    tuned = dict(params)
+    if fraction == 0:
+        return tuned
+    size_factor = 1.0 + (max(1.0, params["latency_tuner_max_min_size_factor"]) - 1.0) * fraction
+    for detection_type in detectors.parse_enabled_detectors(params["enabled_detectors"]):
+        scale_key, neighbors_key, size_key = (f"{detection_type}_detection_scale_factor", f"{detection_type}_detection_min_neighbors",
+                                              f"min_{detection_type}_size")
+        max_scale_factor = max(params[scale_key], params["latency_tuner_max_scale_factor"])
+        tuned[scale_key] = round(params[scale_key] + (max_scale_factor - params[scale_key]) * fraction, 3)
+        neighbors_floor = min(params[neighbors_key], params["latency_tuner_min_neighbors_floor"])
+        tuned[neighbors_key] = int(round(params[neighbors_key] - (params[neighbors_key] - neighbors_floor) * fraction))
+        tuned[size_key] = (int(round(params[size_key][0] * size_factor)), int(round(params[size_key][1] * size_factor)))
+    min_roi = min(params["roi_size_percentage"], params["latency_tuner_min_roi_percentage"])
+    tuned["roi_size_percentage"] = round(params["roi_size_percentage"] - (params["roi_size_percentage"] - min_roi) * fraction, 3)
+    return tuned
+
+
+class LatencyTuner:
+    """Stan regulatora dla jednej kamery. Granice i budżet są czytane z parametrów przy każdym wywołaniu."""
+
+    def __init__(self, camera_index=None, log_path=None):
+        self.camera_index = camera_index
+        self.log_path = log_path
+        self.level = 0
+        self._samples = collections.deque(maxlen=LATENCY_TUNER_WINDOW)
+        self._level_since = 0.0
+        self.last_median_ms = 0.0
+        self.changes_count = 0
+
+    def reset(self, params, now=None):
+        """Powrót do wartości z konfiguracji (np. po wyłączeniu regulatora); zmiana poziomu trafia do dziennika jak każda inna."""
+        if self.level > 0:
+            self._change_level(0, "disabled", target_latency_ms(params), params, time.time() if now is None else now)
+        self._samples.clear()
+
+    def apply(self, params):
+        """Parametry detekcji dla bieżącego poziomu."""
+        return tuned_params(params, self.level)
+
+    def record(self, detection_seconds, params, now=None):
+        """Dodaje czas kaskad jednej klatki; po zebraniu okna może zmienić poziom. Zwraca True przy zmianie."""
+        now = time.time() if now is None else now
+        self._samples.append(detection_seconds * 1000.0)
+        if len(self._samples) < self._samples.maxlen:
+            return False
+        self.last_median_ms = sorted(self._samples)[len(self._samples) // 2]
+        if now - self._level_since < params["latency_tuner_hold_seconds"]:
+            return False
+        target_ms = target_latency_ms(params)
+        if self.last_median_ms > target_ms and self.level < params["latency_tuner_steps"]:
+            new_level, reason = self.level + 1, "overload"
+        elif self.last_median_ms < target_ms * params["latency_tuner_release_ratio"] and self.level > 0:
+            new_level, reason = self.level - 1, "recovered"
+        else:
+            return False
+        self._change_level(new_level, reason, target_ms, params, now)
+        return True
+
+    def _change_level(self, new_level, reason, target_ms, params, now):
+        old_params, new_params = tuned_params(params, self.level), tuned_params(params, new_level)
+        changed = {key: [_json_value(old_params[key]), _json_value(new_params[key])]
+                   for key in new_params if new_params[key] != old_params[key]}
+        entry = {"timestamp": round(now, 3), "camera_index": self.camera_index, "reason": reason,
+                 "from_level": self.level, "to_level": new_level, "median_detection_ms": round(self.last_median_ms, 2),
+                 "target_ms": round(target_ms, 2), "changed": changed}
+        print(f"Autostrojenie (kamera {self.camera_index}): poziom {self.level} -> {new_level} "
+              f"(mediana kaskad {self.last_median_ms:.1f} ms, budżet {target_ms:.1f} ms): "
+              + ", ".join(f"{key} {values[0]} -> {values[1]}" for key, values in changed.items()))
+        self.level = new_level
+        self._level_since = now
+        self._samples.clear()
+        self.changes_count += 1
+        if self.log_path:
+            try:
+                with _log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"Błąd zapisu dziennika autostrojenia {self.log_path}: {e}")
+
+    def overlay_line(self, params):
+        """Linia nakładki (ASCII): poziom, ostatnia mediana i budżet."""
+        return (f"Autostrojenie: poziom {self.level}/{params['latency_tuner_steps']}, "
+                f"kaskady {self.last_median_ms:.0f} ms / cel {target_latency_ms(params):.0f} ms")
+
+
+def _json_value(value):
+    return list(value) if isinstance(value, tuple) else value
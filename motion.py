@@ -0,0 +1,168 @@
+import cv2
+
+import regions
+
+# Bramka ruchu przed detekcją: kaskady są uruchamiane tylko wtedy, gdy obraz zmienił się względem
+# klatki, dla której ostatnio policzono wynik. Porównanie odbywa się na małym, rozmytym obrazie szarości
+# (poziom współdzielonego PreprocessedFrame), więc kosztuje ułamek jednej detekcji.
+#
+# Propozycje obszarów z ruchu (MotionRegionProposer) idą krok dalej: zamiast decyzji "cała klatka albo nic"
+# kaskady skanują tylko prostokąty wokół plam zmienionych pikseli oraz wokół poprzednich detekcji.
+# Różnica liczona jest względem klatki poprzedniej detekcji, więc każdy obszar jest albo skanowany teraz,
+# albo nie zmienił się od ostatniego skanu. Kumulację drobnych zmian (oświetlenie) wyłapuje okresowy pełny skan.
+
+# Plamy mniejsze niż taki ułamek obrazu analizy to szum (pojedyncze piksele, kompresja)
+PROPOSAL_MIN_BLOB_FRACTION = 0.0005
+# Gdy propozycje pokrywają większą część klatki, taniej jest przeskanować ją w całości
+PROPOSAL_FULL_SCAN_COVERAGE = 0.6
+
+
+def _analysis_image(prepared_frame, analysis_width):
+    """Mały, rozmyty obraz szarości do porównań oraz jego skala względem pełnej klatki."""
+    gray_w = prepared_frame.gray.shape[1]
+    scale = gray_w / float(analysis_width) if 0 < analysis_width < gray_w else 1.0
+    return cv2.GaussianBlur(prepared_frame.level(scale), (5, 5), 0), scale
+
+
+class MotionGate:
+    """Decyduje, czy klatka różni się wystarczająco od klatki referencyjnej, by uruchomić kaskady."""
+
+    def __init__(self, changed_fraction_threshold=0.01, pixel_threshold=25, max_idle_seconds=10.0, analysis_width=320):
+        self.changed_fraction_threshold = changed_fraction_threshold
+        self.pixel_threshold = pixel_threshold
+        self.max_idle_seconds = max_idle_seconds
+        self.analysis_width = analysis_width
+        self._reference = None
+        self._reference_time = 0.0
+        self.last_changed_fraction = 1.0
+        self.gated_count = 0
+        self.ungated_count = 0
+
+    def reset(self):
+        """Zapomina klatkę referencyjną (np. po zmianie kamery) - następna klatka zawsze przejdzie."""
+        self._reference = None
+
+    def changed_mask(self, analysis_image):
+        """Maska pikseli (obraz analizy), które zmieniły się względem referencji; None, gdy brak referencji."""
+        if self._reference is None or self._reference.shape != analysis_image.shape:
+            return None
+        _, mask = cv2.threshold(cv2.absdiff(analysis_image, self._reference), self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        return mask
+
+    def check(self, prepared_frame, current_time):
+        """Zwraca True, gdy należy uruchomić detekcję (i ustawia tę klatkę jako referencję), False - gdy scena stoi."""
+        analysis_image, _ = _analysis_image(prepared_frame, self.analysis_width)
+        mask = self.changed_mask(analysis_image)
+        self.last_changed_fraction = 1.0 if mask is None else cv2.countNonZero(mask) / float(mask.size)
+        idle_too_long = self.max_idle_seconds > 0 and current_time - self._reference_time >= self.max_idle_seconds
+        if self.last_changed_fraction < self.changed_fraction_threshold and not idle_too_long:
+            self.gated_count += 1
+            return False
+        self.ungated_count += 1
+        self._reference = analysis_image
+        self._reference_time = current_time
+        return True
+
+    def stats(self):
+        """Liczniki klatek pominiętych (gated) i przepuszczonych do detekcji (ungated)."""
+        total = self.gated_count + self.ungated_count
+        return {
+            "gated": self.gated_count,
+            "ungated": self.ungated_count,
+            "gated_ratio": self.gated_count / float(total) if total else 0.0,
+            "last_changed_fraction": self.last_changed_fraction,
+        }
+
+
+class MotionRegionProposer:
+    """Wyznacza prostokąty do przeskanowania kaskadami na podstawie plam ruchu od poprzedniej detekcji."""
+
+    def __init__(self, pixel_threshold=25, padding=0.25, full_scan_seconds=5.0, analysis_width=320):
+        self.pixel_threshold = pixel_threshold
+        self.padding = padding
+        self.full_scan_seconds = full_scan_seconds
+        self.analysis_width = analysis_width
+        self._reference = None
+        self._last_full_scan_time = 0.0
+        self.last_skipped_fraction = 0.0
+        self.last_proposals_count = 0
+        self.full_scans_count = 0
+        self.proposal_scans_count = 0
+        self._scanned_pixels = 0
+        self._total_pixels = 0
+
+    def reset(self):
+        """Zapomina klatkę referencyjną - następna detekcja przeskanuje całą klatkę."""
+        self._reference = None
+
+    def _blob_boxes(self, analysis_image, reference, scale):
+        _, mask = cv2.threshold(cv2.absdiff(analysis_image, reference), self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        # Poszarpane plamy jednego obiektu (np. ruch tylko krawędzi) łączą się po dylatacji
+        mask = cv2.dilate(mask, None, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = PROPOSAL_MIN_BLOB_FRACTION * mask.size
+        return [(x * scale, y * scale, w * scale, h * scale)
+                for x, y, w, h in (cv2.boundingRect(contour) for contour in contours) if w * h >= min_area]
+
+    def propose(self, prepared_frame, current_time, keep_boxes=(), min_padding=0):
+        """Zwraca prostokąty (x1, y1, x2, y2) do przeskanowania lub None, gdy trzeba przeskanować całą klatkę.
+
+        keep_boxes to poprzednie detekcje (x, y, w, h, ...) - ich okolice są skanowane zawsze, aby nieruchomy
+        obiekt nie znikał z wyników. Każdy prostokąt jest poszerzany o padding x większy bok plamy, co najmniej
+        o min_padding pikseli (np. minimalny rozmiar obiektu - ruch często obejmuje tylko część twarzy).
+        """
+        frame_h, frame_w = prepared_frame.gray.shape[:2]
+        analysis_image, scale = _analysis_image(prepared_frame, self.analysis_width)
+        reference, self._reference = self._reference, analysis_image
+        full_scan = reference is None or reference.shape != analysis_image.shape or \
+            (self.full_scan_seconds > 0 and current_time - self._last_full_scan_time >= self.full_scan_seconds)
+        proposals = []
+        if not full_scan:
+            for box in self._blob_boxes(analysis_image, reference, scale) + [tuple(box[:4]) for box in keep_boxes]:
+                x, y, w, h = box
+                pad = max(self.padding * max(w, h), min_padding)
+                x1, y1 = max(0, int(x - pad)), max(0, int(y - pad))
+                x2, y2 = min(frame_w, int(x + w + pad + 1)), min(frame_h, int(y + h + pad + 1))
+                if x2 > x1 and y2 > y1:
+                    proposals.append((x1, y1, x2, y2))
+            proposals = regions.merge_rectangles(proposals)
+            scanned_pixels = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in proposals)
+            full_scan = scanned_pixels > PROPOSAL_FULL_SCAN_COVERAGE * frame_w * frame_h
+        if full_scan:
+            self._last_full_scan_time = current_time
+            self.full_scans_count += 1
+            scanned_pixels = frame_w * frame_h
+            proposals = None
+        else:
+            self.proposal_scans_count += 1
+        self._scanned_pixels += scanned_pixels
+        self._total_pixels += frame_w * frame_h
+        self.last_skipped_fraction = 1.0 - scanned_pixels / float(frame_w * frame_h)
+        self.last_proposals_count = 0 if proposals is None else len(proposals)
+        return proposals
+
+    def stats(self):
+        """Odsetek pominiętych pikseli (ostatnia detekcja i średnio) oraz liczniki skanów pełnych i z propozycji."""
+        return {
+            "last_skipped_fraction": self.last_skipped_fraction,
+            "skipped_fraction": 1.0 - self._scanned_pixels / float(self._total_pixels) if self._total_pixels else 0.0,
+            "last_proposals": self.last_proposals_count,
+            "full_scans": self.full_scans_count,
+            "proposal_scans": self.proposal_scans_count,
+        }
+
+
+def detect_in_proposals(detect, proposals, area=None):
+    """Uruchamia detect(roi) na częściach wspólnych propozycji z obszarem detektora (area=None - cała klatka).
+
+    proposals=None oznacza pełny skan: detect(area).
+    """
+    if proposals is None:
+        return detect(area)
+    detections = []
+    for x1, y1, x2, y2 in proposals:
+        if area is not None:
+            x1, y1, x2, y2 = max(x1, area[0]), max(y1, area[1]), min(x2, area[2]), min(y2, area[3])
+        if x2 > x1 and y2 > y1:
+            detections.extend(detect((x1, y1, x2, y2)))
+    return detections
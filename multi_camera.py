@@ -0,0 +1,205 @@
+import math
+import queue
+import threading
+import time
+import traceback
+
+import cv2
+import numpy as np
+
+import detectors
+import frame_pipeline
+
+# Jednoczesny podgląd i detekcja z wielu kamer w jednym procesie.
+# Każda kamera ma lekki wątek odczytu, który wrzuca najnowszą klatkę do własnego LatestFrameSlot.
+# Wspólna pula wątków detekcji (każdy z własnymi kaskadami - CascadeClassifier nie jest bezpieczny
+# przy równoległych wywołaniach na jednej instancji) obsługuje kamery po kolei, a jedna kamera jest
+# w danej chwili przetwarzana przez co najwyżej jeden wątek, więc jej stan nie wymaga blokad.
+
+
+def parse_camera_indices(text, available_cameras):
+    """Parsuje listę indeksów kamer 'a,b,c'; pusty tekst oznacza wszystkie dostępne kamery."""
+    if not text.strip():
+        return list(available_cameras)
+    return [int(part) for part in text.split(',') if part.strip()]
+
+
+def parse_camera_save_intervals(text):
+    """Parsuje interwały zapisu per kamera w formacie 'indeks:sekundy,indeks:sekundy'."""
+    intervals = {}
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        camera_index, seconds = part.split(':')
+        intervals[int(camera_index)] = float(seconds)
+    return intervals
+
+
+def compose_tiled_preview(frames, canvas_width, canvas_height):
+    """Układa klatki kamer w siatkę mieszczącą się w płótnie (proporcje każdej klatki zachowane)."""
+    tiled = np.zeros((canvas_height, canvas_width, 3), dtype=np.uint8)
+    if not frames:
+        return tiled
+    columns = int(math.ceil(math.sqrt(len(frames))))
+    rows = int(math.ceil(len(frames) / float(columns)))
+    tile_w, tile_h = canvas_width // columns, canvas_height // rows
+    for position, frame in enumerate(frames):
+        if frame is None or tile_w <= 0 or tile_h <= 0:
+            continue
+        frame_h, frame_w = frame.shape[:2]
+        ratio = min(tile_w / float(frame_w), tile_h / float(frame_h))
+        fitted_w, fitted_h = max(1, int(frame_w * ratio)), max(1, int(frame_h * ratio))
+        fitted = cv2.resize(frame, (fitted_w, fitted_h), interpolation=cv2.INTER_AREA)
+        x = (position % columns) * tile_w + (tile_w - fitted_w) // 2
+        y = (position // columns) * tile_h + (tile_h - fitted_h) // 2
+        tiled[y:y + fitted_h, x:x + fitted_w] = fitted
+    return tiled
+
+
+class CameraStream:
+    """Stan jednej kamery: źródło, slot najnowszej klatki, czasy zapisów i ostatnia klatka podglądu."""
+
+    def __init__(self, camera_index, frame_drop_policy="latest", max_frame_age_seconds=0.0):
+        self.camera_index = camera_index
+        self.video = None
+        self.width = 0
+        self.height = 0
+        self.frame_slot = frame_pipeline.LatestFrameSlot(frame_drop_policy, max_frame_age_seconds)
+        self.grab_thread = None
+        self.last_save_times = {} # {detektor: czas ostatniego zapisu}
+        self.display_frame = None
+        self.processed_frames_count = 0
+        self.current_fps = 0.0
+        self._fps_start_time = time.time()
+        self._fps_counter = 0
+        self._queued = False
+        self._lock = threading.Lock()
+
+    def open(self):
+        self.video = cv2.VideoCapture(self.camera_index)
+        if not self.video.isOpened():
+            self.video.release()
+            self.video = None
+            return False
+        self.video.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Nie wszystkie backendy to obsługują - wtedy ignorowane
+        self.width = int(self.video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return True
+
+    def count_processed_frame(self):
+        self.processed_frames_count += 1
+        self._fps_counter += 1
+        elapsed_time = time.time() - self._fps_start_time
+        if elapsed_time >= 1.0:
+            self.current_fps = self._fps_counter / elapsed_time
+            self._fps_counter = 0
+            self._fps_start_time = time.time()
+
+
+class MultiCameraPipeline:
+    """Wątki odczytu dla wielu kamer i wspólna pula wątków detekcji.
+
+    frame_handler(stream, frame, capture_time, cascades) jest wywoływany w wątku detekcji z kaskadami
+    tego wątku ({detektor: CascadeClassifier}) i zwraca klatkę podglądu (z nakładkami) dla danej kamery.
+    """
+
+    def __init__(self, camera_indices, cascade_paths, worker_count, frame_handler,
+                 frame_drop_policy="latest", max_frame_age_seconds=0.0):
+        self.streams = [CameraStream(camera_index, frame_drop_policy, max_frame_age_seconds) for camera_index in camera_indices]
+        self.cascade_paths = cascade_paths
+        self.worker_count = max(1, worker_count if worker_count > 0 else len(self.streams))
+        self.frame_handler = frame_handler
+        self._ready_streams = queue.Queue()
+        self._running = False
+        self._workers = []
+
+    def start(self):
+        """Otwiera kamery i uruchamia wątki. Zwraca listę indeksów kamer, których nie udało się otworzyć."""
+        failed_indices = [stream.camera_index for stream in self.streams if not stream.open()]
+        self.streams = [stream for stream in self.streams if stream.video is not None]
+        self._running = True
+        for stream in self.streams:
+            stream.grab_thread = threading.Thread(target=self._grab_loop, args=(stream,), name=f"CameraGrab-{stream.camera_index}", daemon=True)
+            stream.grab_thread.start()
+        for i in range(min(self.worker_count, max(1, len(self.streams)))):
+            worker = threading.Thread(target=self._detection_loop, name=f"CameraDetection-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return failed_indices
+
+    def stop(self):
+        """Zatrzymuje wątki i zwalnia kamery."""
+        self._running = False
+        for stream in self.streams:
+            stream.frame_slot.close()
+        for _ in self._workers:
+            self._ready_streams.put(None)
+        for thread in self._workers + [stream.grab_thread for stream in self.streams if stream.grab_thread]:
+            thread.join(timeout=2.0)
+        self._workers = []
+        for stream in self.streams:
+            if stream.video is not None:
+                stream.video.release()
+                stream.video = None
+
+    def _schedule(self, stream):
+        """Dodaje kamerę do kolejki detekcji, jeśli nie czeka już w kolejce ani nie jest przetwarzana."""
+        with stream._lock:
+            if stream._queued:
+                return
+            stream._queued = True
+        self._ready_streams.put(stream)
+
+    def _grab_loop(self, stream):
+        print(f"Rozpoczęto wątek odczytu klatek dla kamery {stream.camera_index}.")
+        try:
+            while self._running:
+                ret, frame = stream.video.read()
+                if not ret:
+                    time.sleep(0.1)
+                    continue
+                frame.flags.writeable = False # Surowa klatka tylko do odczytu - nakładki rysuje frame_handler na kopii
+                stream.frame_slot.put(frame, time.time())
+                self._schedule(stream)
+        except Exception as e:
+            print(f"Błąd w wątku odczytu klatek kamery {stream.camera_index}: {e}")
+            traceback.print_exc()
+
+    def _detection_loop(self):
+        cascades = detectors.load_cascades(self.cascade_paths)
+        while self._running:
+            stream = self._ready_streams.get()
+            if stream is None:
+                return
+            try:
+                slot_item = stream.frame_slot.get(timeout=0)
+                if slot_item is not None:
+                    frame, capture_time = slot_item
+                    stream.count_processed_frame()
+                    stream.display_frame = self.frame_handler(stream, frame, capture_time, cascades)
+            except Exception as e:
+                print(f"Błąd detekcji dla kamery {stream.camera_index}: {e}")
+                traceback.print_exc()
+            finally:
+                with stream._lock:
+                    stream._queued = False
+            # Klatka mogła przyjść w trakcie detekcji - wtedy kamera wraca do kolejki
+            if stream.frame_slot.has_frame():
+                self._schedule(stream)
+
+    def display_frames(self):
+        """Ostatnie klatki podglądu wszystkich kamer (None dla kamer bez przetworzonej klatki)."""
+        return [stream.display_frame for stream in self.streams]
+
+    def stream_for_camera(self, camera_index):
+        for stream in self.streams:
+            if stream.camera_index == camera_index:
+                return stream
+        return None
+
+    def stats(self):
+        """Liczniki per kamera: przetworzone i odrzucone klatki oraz FPS detekcji."""
+        return {stream.camera_index: {"processed": stream.processed_frames_count,
+                                      "dropped": stream.frame_slot.dropped_frames_count,
+                                      "fps": stream.current_fps}
+                for stream in self.streams}
@@ -0,0 +1,93 @@
+import collections
+import threading
+import time
+
+import numpy as np
+
+# Pomiary etapów pętli na żywo (odczyt kamery, kaskady, rysowanie, konwersja do RGB, odświeżenie Tk).
+# Zapis próbki to jedno dopisanie do deque o stałej długości - bez blokad i bez alokacji histogramów,
+# więc pomiary mogą być włączone na stałe. Percentyle liczone są dopiero przy odczycie (snapshot).
+
+DEFAULT_WINDOW_SIZE = 512
+METRICS_PERCENTILES = (50, 95, 99)
+# Kolejność etapów pętli na żywo (nakładka): od odczytu kamery do wyświetlenia w Tk; etapy "{detektor}_cascade"
+# włączonych detektorów są wstawiane po motion_proposals (live_stage_order)
+LIVE_STAGE_ORDER = ("capture_read", "frame_age", "preprocess", "motion_gate", "tracking", "motion_proposals",
+                    "save_submit", "draw", "ui_delay", "to_rgb", "ui_update", "end_to_end")
+_CASCADE_STAGES_POSITION = LIVE_STAGE_ORDER.index("save_submit")
+
+
+def live_stage_order(detector_names=("face", "plate")):
+    """Kolejność etapów pętli na żywo z etapami kaskad podanych detektorów (w kolejności ich uruchamiania)."""
+    return (LIVE_STAGE_ORDER[:_CASCADE_STAGES_POSITION] + tuple(f"{name}_cascade" for name in detector_names)
+            + LIVE_STAGE_ORDER[_CASCADE_STAGES_POSITION:])
+
+
+class PipelineMetrics:
+    """Okna ostatnich czasów poszczególnych etapów oraz wskaźniki chwilowe (np. głębokości kolejek)."""
+
+    def __init__(self, window_size=DEFAULT_WINDOW_SIZE, enabled=True):
+        self.window_size = max(1, window_size)
+        self.enabled = enabled
+        self._samples = {}
+        self._counts = collections.Counter()
+        self._gauges = {}
+        self._gauge_maxima = {}
+        self._create_lock = threading.Lock()
+        self.started_at = time.time()
+
+    def record(self, stage, seconds):
+        """Dodaje czas etapu (w sekundach). Wywoływane z dowolnego wątku; deque.append jest atomowe."""
+        if not self.enabled:
+            return
+        samples = self._samples.get(stage)
+        if samples is None:
+            with self._create_lock:
+                samples = self._samples.setdefault(stage, collections.deque(maxlen=self.window_size))
+        samples.append(seconds)
+        self._counts[stage] += 1
+
+    def set_gauge(self, name, value):
+        """Ustawia bieżącą wartość wskaźnika (np. głębokość kolejki) i zapamiętuje maksimum."""
+        if not self.enabled:
+            return
+        self._gauges[name] = value
+        if value > self._gauge_maxima.get(name, value - 1):
+            self._gauge_maxima[name] = value
+
+    def reset(self):
+        """Czyści wszystkie próbki i wskaźniki (np. po zmianie kamery)."""
+        with self._create_lock:
+            self._samples = {}
+            self._counts = collections.Counter()
+            self._gauges = {}
+            self._gauge_maxima = {}
+            self.started_at = time.time()
+
+    def snapshot(self):
+        """Zwraca słownik: etapy (liczba, ostatni, średni i percentyle w ms z okna) oraz wskaźniki."""
+        stages = {}
+        for stage, samples in list(self._samples.items()):
+            window = np.array(list(samples), dtype=np.float64) * 1000.0
+            if window.size == 0:
+                continue
+            stage_stats = {
+                "count": self._counts[stage],
+                "last_ms": round(float(window[-1]), 3),
+                "mean_ms": round(float(window.mean()), 3),
+            }
+            for percentile, value in zip(METRICS_PERCENTILES, np.percentile(window, METRICS_PERCENTILES)):
+                stage_stats[f"p{percentile}_ms"] = round(float(value), 3)
+            stages[stage] = stage_stats
+        gauges = {name: {"value": value, "max": self._gauge_maxima.get(name, value)} for name, value in list(self._gauges.items())}
+        return {"uptime_s": round(time.time() - self.started_at, 1), "window_size": self.window_size, "stages": stages, "gauges": gauges}
+
+
+def format_overlay_lines(snapshot, stage_order=None):
+    """Krótkie linie tekstu (ASCII) do nakładki na podglądzie: etap p50/p95/p99 oraz wskaźniki."""
+    stages = snapshot["stages"]
+    names = [name for name in (stage_order or sorted(stages)) if name in stages]
+    lines = [f"{name}: {stages[name]['p50_ms']:.1f}/{stages[name]['p95_ms']:.1f}/{stages[name]['p99_ms']:.1f} ms" for name in names]
+    if snapshot["gauges"]:
+        lines.append(" ".join(f"{name}={gauge['value']}(max {gauge['max']})" for name, gauge in sorted(snapshot["gauges"].items())))
+    return lines
@@ -0,0 +1,161 @@
+import functools
+
+import cv2
+import numpy as np
+
+# Obszary detekcji per kamera i per detektor (zamiast jednego centralnego ROI twarzy i pełnej klatki dla tablic).
+# Specyfikacja to tekst (config.json / okno parametrów) z wpisami oddzielonymi ';':
+#   [kamera:]{+|-}x1,y1,x2,y2            prostokąt
+#   [kamera:]{+|-}x1,y1,x2,y2,x3,y3,...  wielokąt (co najmniej 3 punkty)
+# Współrzędne to ułamki szerokości i wysokości klatki (0-1), więc strefy nie zależą od rozdzielczości.
+# '+' (lub brak znaku) to obszar skanowany, '-' to strefa wykluczona. Kamera to indeks lub '*' (domyślnie):
+# kamera z własnymi wpisami używa tylko ich, pozostałe - wpisów '*'. Same wykluczenia oznaczają całą klatkę bez nich.
+#   np. "*:+0,0.55,1,1; 2:+0.2,0.5,0.8,1; 2:-0.45,0.8,0.55,1"
+# Kaskada skanuje tylko prostokąty otaczające obszary (nakładające się są łączone), a wynik jest zachowywany,
+# gdy środek ramki leży w obszarze i poza strefami wykluczonymi. Współrzędne wyników pozostają globalne.
+
+DEFAULT_CAMERA_KEY = "*"
+_WHOLE_FRAME = ((0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0))
+
+
+def _rectangles_overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def merge_rectangles(rectangles):
+    """Łączy nakładające się prostokąty (x1, y1, x2, y2) w prostokąty otaczające, aby żaden piksel nie był skanowany dwa razy."""
+    merged = list(rectangles)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            for j in range(i + 1, len(merged)):
+                if _rectangles_overlap(merged[i], merged[j]):
+                    a, b = merged[i], merged.pop(j)
+                    merged[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+class DetectionRegions:
+    """Obszary skanowane i strefy wykluczone jednego detektora dla jednej kamery (wielokąty we współrzędnych 0-1)."""
+
+    def __init__(self, include_shapes, exclude_shapes):
+        self.include_shapes = list(include_shapes) or [_WHOLE_FRAME]
+        self.exclude_shapes = list(exclude_shapes)
+        self._pixel_cache = {}
+
+    def _pixel_shapes(self, frame_width, frame_height):
+        key = (frame_width, frame_height)
+        cached = self._pixel_cache.get(key)
+        if cached is None:
+            scale = np.array([frame_width, frame_height], dtype=np.float32)
+            include = [np.round(np.array(shape, dtype=np.float32) * scale).astype(np.int32) for shape in self.include_shapes]
+            exclude = [np.round(np.array(shape, dtype=np.float32) * scale).astype(np.int32) for shape in self.exclude_shapes]
+            bounding = []
+            for polygon in include:
+                x, y, w, h = cv2.boundingRect(polygon)
+                x1, y1, x2, y2 = max(0, x), max(0, y), min(frame_width, x + w), min(frame_height, y + h)
+                if x2 > x1 and y2 > y1:
+                    bounding.append((x1, y1, x2, y2))
+            cached = (include, exclude, merge_rectangles(bounding))
+            self._pixel_cache[key] = cached
+        return cached
+
+    def scan_rectangles(self, frame_width, frame_height):
+        """Prostokąty (x1, y1, x2, y2) w pikselach, które musi przeskanować kaskada."""
+        return self._pixel_shapes(frame_width, frame_height)[2]
+
+    def accepts(self, box, frame_width, frame_height):
+        """Czy środek ramki (x, y, w, h, ...) leży w obszarze skanowanym i poza strefami wykluczonymi."""
+        include, exclude, _ = self._pixel_shapes(frame_width, frame_height)
+        center = (float(box[0] + box[2] / 2.0), float(box[1] + box[3] / 2.0))
+        if not any(cv2.pointPolygonTest(polygon, center, False) >= 0 for polygon in include):
+            return False
+        return not any(cv2.pointPolygonTest(polygon, center, False) >= 0 for polygon in exclude)
+
+    def outlines(self, frame_width, frame_height):
+        """Wielokąty w pikselach do rysowania: (obszary skanowane, strefy wykluczone)."""
+        include, exclude, _ = self._pixel_shapes(frame_width, frame_height)
+        return include, exclude
+
+
+def _parse_entry(entry):
+    camera_key = DEFAULT_CAMERA_KEY
+    if ":" in entry:
+        camera_text, entry = entry.split(":", 1)
+        camera_text = camera_text.strip()
+        camera_key = DEFAULT_CAMERA_KEY if camera_text == DEFAULT_CAMERA_KEY else int(camera_text)
+    entry = entry.strip()
+    is_exclusion = entry.startswith("-")
+    if entry[:1] in ("+", "-"):
+        entry = entry[1:]
+    values = [float(value) for value in entry.split(",")]
+    if any(not 0.0 <= value <= 1.0 for value in values):
+        raise ValueError(f"Współrzędne strefy muszą być ułamkami klatki (0-1): '{entry}'")
+    if len(values) == 4:
+        x1, y1, x2, y2 = values
+        if x2 <= x1 or y2 <= y1:
+            raise ValueError(f"Prostokąt strefy musi mieć x1 < x2 i y1 < y2: '{entry}'")
+        shape = ((x1, y1), (x2, y1), (x2, y2), (x1, y2))
+    elif len(values) >= 6 and len(values) % 2 == 0:
+        shape = tuple(zip(values[0::2], values[1::2]))
+    else:
+        raise ValueError(f"Strefa to prostokąt (4 liczby) lub wielokąt (co najmniej 3 pary liczb): '{entry}'")
+    return camera_key, shape, is_exclusion
+
+
+@functools.lru_cache(maxsize=32)
+def parse_region_spec(text):
+    """Parsuje specyfikację stref. Zwraca {kamera lub '*': DetectionRegions}; zgłasza ValueError przy błędzie."""
+    shapes_by_camera = {}
+    for entry in text.split(";"):
+        if not entry.strip():
+            continue
+        camera_key, shape, is_exclusion = _parse_entry(entry)
+        include, exclude = shapes_by_camera.setdefault(camera_key, ([], []))
+        (exclude if is_exclusion else include).append(shape)
+    return {camera_key: DetectionRegions(include, exclude) for camera_key, (include, exclude) in shapes_by_camera.items()}
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_region_spec_or_empty(text):
+    try:
+        return parse_region_spec(text)
+    except ValueError as e:
+        # Błędna specyfikacja (np. ręcznie edytowany config.json) jest zgłaszana raz i ignorowana
+        print(f"Ostrzeżenie: nieprawidłowa specyfikacja stref '{text}': {e}. Używanie domyślnego obszaru.")
+        return {}
+
+
+def regions_for_camera(text, camera_index):
+    """Strefy detektora dla kamery lub None, gdy specyfikacja jej nie obejmuje (wtedy obowiązuje dotychczasowe zachowanie)."""
+    if not text.strip():
+        return None
+    spec = _parse_region_spec_or_empty(text)
+    return spec.get(camera_index, spec.get(DEFAULT_CAMERA_KEY))
+
+
+def detect_in_regions(detect, prepared_frame, detection_regions):
+    """Uruchamia detect(roi) dla każdego prostokąta do skanowania i zwraca detekcje zaakceptowane przez strefy."""
+    frame_height, frame_width = prepared_frame.gray.shape[:2]
+    detections = []
+    for rectangle in detection_regions.scan_rectangles(frame_width, frame_height):
+        detections.extend(detect(rectangle))
+    return [detection for detection in detections if detection_regions.accepts(detection, frame_width, frame_height)]
+
+
+def append_region_entry(text, camera_index, rectangle, is_exclusion=False):
+    """Dopisuje prostokąt (ułamki x1, y1, x2, y2) dla kamery do specyfikacji stref."""
+    entry = f"{camera_index}:{'-' if is_exclusion else '+'}" + ",".join(f"{value:.3f}" for value in rectangle)
+    return "; ".join(part for part in (text.strip(), entry) if part)
+
+
+def remove_camera_entries(text, camera_index):
+    """Usuwa ze specyfikacji wszystkie wpisy danej kamery (wpisy '*' pozostają)."""
+    kept = [entry.strip() for entry in text.split(";")
+            if entry.strip() and not (":" in entry and entry.split(":", 1)[0].strip() == str(camera_index))]
+    return "; ".join(kept)
@@ -0,0 +1,125 @@
+import concurrent.futures
+import math
+import os
+import threading
+
+import detection_core
+
+# Równoległa detekcja kaskadą na zachodzących na siebie kafelkach dużych klatek (4K, duże zdjęcia).
+# Pojedyncze detectMultiScale3 na całej klatce jest ścieżką krytyczną i w dużej części działa w jednym wątku.
+# Obszar jest dzielony na siatkę kafelków (tyle, ile wątków), które zachodzą na siebie o zakładkę równą
+# największemu obiektowi szukanemu w kafelkach: object_factor x minimalny rozmiar obiektu. Dzięki temu każdy
+# taki obiekt mieści się w całości w co najmniej jednym kafelku. Większe obiekty szuka jeden przebieg po całym
+# obszarze zaczynający od tej granicy - od mocno pomniejszonych skal, więc jest tani. Zakresy rozmiarów obu
+# przebiegów zachodzą na siebie o kilka kroków skali, aby trafienia obiektu z pogranicza nie rozdzieliły się
+# między przebiegi (każdy miałby za mało sąsiadów dla minNeighbors).
+# Kafelki i przebieg zgrubny działają w puli wątków (cv2 zwalnia GIL), każdy wątek ma własne instancje
+# CascadeClassifier. Duplikaty z pasów zakładek (ta sama twarz w dwóch kafelkach) i ramki zagnieżdżone z drugiego
+# przebiegu są łączone - podobnie jak groupRectangles w OpenCV odrzuca ramki leżące wewnątrz innych.
+
+# Ramki o IoU co najmniej tyle uznajemy za ten sam obiekt wykryty w sąsiednich kafelkach
+DUPLICATE_IOU_THRESHOLD = 0.5
+# ...albo gdy mniejsza ramka leży w co najmniej takiej części wewnątrz większej
+DUPLICATE_CONTAINMENT_THRESHOLD = 0.8
+# O tyle kroków skali przebieg zgrubny zaczyna poniżej największego obiektu szukanego w kafelkach
+SIZE_BAND_OVERLAP_STEPS = 3
+
+
+def plan_tiles(width, height, overlap_w, overlap_h, tile_count):
+    """Siatka kafelków (x1, y1, x2, y2) pokrywająca obszar, sąsiednie kafelki zachodzą o (overlap_w, overlap_h).
+
+    Krok kafelka nie jest mniejszy niż zakładka - drobniejszy podział liczyłby te same piksele wielokrotnie.
+    """
+    columns = max(1, int(round(math.sqrt(tile_count * width / float(max(1, height))))))
+    rows = max(1, int(math.ceil(tile_count / float(columns))))
+    columns = max(1, min(columns, (width - overlap_w) // max(1, overlap_w)))
+    rows = max(1, min(rows, (height - overlap_h) // max(1, overlap_h)))
+    step_w = int(math.ceil(max(1, width - overlap_w) / float(columns)))
+    step_h = int(math.ceil(max(1, height - overlap_h) / float(rows)))
+    return [(column * step_w, row * step_h, min(width, (column + 1) * step_w + overlap_w), min(height, (row + 1) * step_h + overlap_h))
+            for row in range(rows) for column in range(columns)]
+
+
+def _is_duplicate(a, b):
+    intersection_w = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    intersection_h = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if intersection_w <= 0 or intersection_h <= 0:
+        return False
+    intersection = float(intersection_w * intersection_h)
+    area_a, area_b = a[2] * a[3], b[2] * b[3]
+    return (intersection / (area_a + area_b - intersection) >= DUPLICATE_IOU_THRESHOLD or
+            intersection / min(area_a, area_b) >= DUPLICATE_CONTAINMENT_THRESHOLD)
+
+
+def merge_duplicate_detections(detections):
+    """Usuwa duplikaty i ramki zagnieżdżone, zostawiając większą ramkę (przy równych - o wyższej pewności)."""
+    kept = []
+    for detection in sorted(detections, key=lambda d: (d[2] * d[3], d[4]), reverse=True):
+        if not any(_is_duplicate(detection, other) for other in kept):
+            kept.append(detection)
+    return kept
+
+
+class TiledCascadeRunner:
+    """Pula wątków z kaskadami per wątek, wykonująca detekcję na kafelkach. Bezpieczna przy wywołaniach z wielu wątków."""
+
+    def __init__(self, cascade_paths, thread_count=0):
+        """cascade_paths: {"face": ścieżka, "plate": ścieżka} - klucze przekazywane potem do detect()."""
+        self.cascade_paths = {key: path for key, path in cascade_paths.items() if path}
+        self.thread_count = thread_count if thread_count > 0 else (os.cpu_count() or 1)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.thread_count, thread_name_prefix="CascadeTile")
+        self._local = threading.local()
+        self._window_sizes = {}
+        for key, path in self.cascade_paths.items():
+            cascade = detection_core.load_cascade(path)
+            if cascade is not None:
+                self._window_sizes[key] = cascade.getOriginalWindowSize()
+
+    def _cascade(self, cascade_key):
+        cascades = getattr(self._local, "cascades", None)
+        if cascades is None:
+            cascades = self._local.cascades = {}
+        if cascade_key not in cascades:
+            cascades[cascade_key] = detection_core.load_cascade(self.cascade_paths[cascade_key])
+        return cascades[cascade_key]
+
+    def tile_object_limit(self, cascade_key, min_size, params):
+        """Największy rozmiar obiektu szukanego w kafelkach (okno kaskady przeskalowane do object_factor x min_size)."""
+        window_w, window_h = self._window_sizes[cascade_key]
+        factor = max(1.0, params["tiled_detection_object_factor"])
+        scale = min(factor * min_size[0] / float(window_w), factor * min_size[1] / float(window_h))
+        return max(min_size[0], int(window_w * scale)), max(min_size[1], int(window_h * scale))
+
+    def should_tile(self, cascade_key, gray_region, params):
+        """Czy obszar jest na tyle duży, by opłacał się podział (i czy detektor ma kaskadę do kafelków).
+
+        Z jednym wątkiem podział nic nie zrównolegla, a przebieg zgrubny tylko dokłada pracy - wtedy zawsze False.
+        """
+        return (self.thread_count > 1 and cascade_key in self._window_sizes and
+                gray_region.shape[1] >= params["tiled_detection_min_width"])
+
+    def _run(self, cascade_key, gray_region, tile, scale_factor, min_neighbors, min_size, max_size):
+        x1, y1, x2, y2 = tile
+        detections = detection_core.run_cascade(self._cascade(cascade_key), gray_region[y1:y2, x1:x2], scale_factor,
+                                                min_neighbors, min_size, max_size)
+        return [(x + x1, y + y1, w, h, confidence) for (x, y, w, h, confidence) in detections]
+
+    def detect(self, cascade_key, gray_region, scale_factor, min_neighbors, min_size, params):
+        """Detekcja na kafelkach obszaru; zwraca listę (x, y, w, h, pewność) we współrzędnych obszaru."""
+        region_h, region_w = gray_region.shape[:2]
+        object_limit = self.tile_object_limit(cascade_key, min_size, params)
+        tiles = plan_tiles(region_w, region_h, object_limit[0], object_limit[1], self.thread_count)
+        futures = [self._executor.submit(self._run, cascade_key, gray_region, tile, scale_factor, min_neighbors, min_size, object_limit)
+                   for tile in tiles]
+        # Obiekty większe od zakładki: jeden przebieg po całym obszarze od (nieco poniżej) granicy rozmiaru w górę
+        band = scale_factor ** SIZE_BAND_OVERLAP_STEPS
+        coarse_min_size = (max(min_size[0], int(object_limit[0] / band)), max(min_size[1], int(object_limit[1] / band)))
+        futures.append(self._executor.submit(self._run, cascade_key, gray_region, (0, 0, region_w, region_h),
+                                             scale_factor, min_neighbors, coarse_min_size, None))
+        detections = []
+        for future in futures:
+            detections.extend(future.result())
+        return merge_duplicate_detections(detections)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,80 @@
+import cv2
+import numpy as np
+
+# Tani tracker do trybu "wykryj, potem śledź": między klatkami kluczowymi (pełne kaskady) ramki
+# z ostatniej detekcji są przesuwane na podstawie przepływu optycznego Lucasa-Kanade punktów
+# wewnątrz ramki. Trackery KCF/MOSSE wymagają opencv-contrib, więc korzystamy tylko z bazowego cv2.
+
+LK_PARAMS = dict(winSize=(15, 15), maxLevel=2,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+
+
+class DetectionTracker:
+    """Propaguje ramki detekcji między klatkami kluczowymi; zgłasza utratę śledzenia, gdy ramka dryfuje."""
+
+    def __init__(self, max_points_per_box=20, min_tracked_ratio=0.5, max_forward_backward_error=1.0):
+        self.max_points_per_box = max_points_per_box
+        self.min_tracked_ratio = min_tracked_ratio
+        self.max_forward_backward_error = max_forward_backward_error
+        self._previous_gray = None
+        self._tracks = []
+
+    def reset(self, gray, detections_by_type):
+        """Zaczyna śledzenie od wyników pełnej detekcji: {"face": [(x, y, w, h, pewność), ...], "plate": [...]}."""
+        self._previous_gray = gray
+        self._tracks = [(detection_type, tuple(detection))
+                        for detection_type, detections in detections_by_type.items() for detection in detections]
+
+    def update(self, gray):
+        """Przesuwa ramki na nową klatkę. Zwraca słownik detekcji jak w reset() lub None, gdy śledzenie zawiodło."""
+        if self._previous_gray is None or self._previous_gray.shape != gray.shape:
+            return None
+        frame_h, frame_w = gray.shape[:2]
+        tracked_by_type = {}
+        new_tracks = []
+        for detection_type, (x, y, w, h, confidence) in self._tracks:
+            moved_box = self._track_box(gray, (x, y, w, h))
+            if moved_box is None:
+                return None
+            nx, ny, nw, nh = moved_box
+            if nx < 0 or ny < 0 or nx + nw > frame_w or ny + nh > frame_h or nw <= 0 or nh <= 0:
+                return None
+            tracked = (nx, ny, nw, nh, confidence)
+            new_tracks.append((detection_type, tracked))
+            tracked_by_type.setdefault(detection_type, []).append(tracked)
+        self._previous_gray = gray
+        self._tracks = new_tracks
+        return tracked_by_type
+
+    def _track_box(self, gray, box):
+        """Zwraca przesuniętą i przeskalowaną ramkę (x, y, w, h) lub None, gdy zbyt mało punktów przetrwało."""
+        x, y, w, h = box
+        box_region = self._previous_gray[y:y + h, x:x + w]
+        if box_region.size == 0:
+            return None
+        points = cv2.goodFeaturesToTrack(box_region, maxCorners=self.max_points_per_box, qualityLevel=0.01, minDistance=3)
+        if points is None or len(points) < 3:
+            return None
+        points = points.reshape(-1, 1, 2) + np.array([x, y], dtype=np.float32)
+
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(self._previous_gray, gray, points, None, **LK_PARAMS)
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self._previous_gray, next_points, None, **LK_PARAMS)
+        forward_backward_error = np.linalg.norm((points - back_points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (forward_backward_error < self.max_forward_backward_error)
+        if good.sum() < max(3, self.min_tracked_ratio * len(points)):
+            return None
+
+        old_good = points.reshape(-1, 2)[good]
+        new_good = next_points.reshape(-1, 2)[good]
+        dx, dy = np.median(new_good - old_good, axis=0)
+
+        # Zmiana skali: mediana stosunku odległości punktów od ich środka
+        old_spread = np.linalg.norm(old_good - old_good.mean(axis=0), axis=1)
+        new_spread = np.linalg.norm(new_good - new_good.mean(axis=0), axis=1)
+        valid = old_spread > 1e-3
+        scale = float(np.median(new_spread[valid] / old_spread[valid])) if valid.any() else 1.0
+
+        center_x = x + w / 2.0 + dx
+        center_y = y + h / 2.0 + dy
+        new_w, new_h = w * scale, h * scale
+        return int(round(center_x - new_w / 2.0)), int(round(center_y - new_h / 2.0)), int(round(new_w)), int(round(new_h))